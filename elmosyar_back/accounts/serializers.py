@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
+from core.images import thumbnail_url, srcset
 from .models import User
 
 
@@ -23,12 +24,14 @@ class UserSerializer(serializers.ModelSerializer):
     posts_count = serializers.ReadOnlyField()
     is_following = serializers.SerializerMethodField()
     is_me = serializers.SerializerMethodField()
+    profile_picture_thumbnail = serializers.SerializerMethodField()
+    profile_picture_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = [
             'id', 'username', 'email', 'first_name', 'last_name', 
-            'profile_picture', 'bio', 'student_id', 'is_email_verified',
+            'profile_picture', 'profile_picture_thumbnail', 'profile_picture_srcset', 'bio', 'student_id', 'is_email_verified',
             'followers_count', 'following_count', 'posts_count',
             'is_following', 'is_me', 'created_at', 'info', 'phone_number'
         ]
@@ -39,11 +42,24 @@ class UserSerializer(serializers.ModelSerializer):
 
     def get_is_following(self, obj):
         from social.models import UserFollow
+        viewer = self.context.get('viewer')
+        if viewer and viewer.knows_user(obj.id):
+            return viewer.is_following(obj.id)
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return UserFollow.objects.filter(follower=request.user, following=obj).exists()
         return False
 
+    def get_profile_picture_thumbnail(self, obj):
+        if not obj.profile_picture:
+            return None
+        return thumbnail_url(obj.profile_picture, obj.profile_picture_variants)
+
+    def get_profile_picture_srcset(self, obj):
+        if not obj.profile_picture:
+            return ''
+        return srcset(obj.profile_picture, obj.profile_picture_variants)
+
     def get_is_me(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
@@ -2,4 +2,14 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "settings")
-application = get_asgi_application()
\ No newline at end of file
+django_application = get_asgi_application()
+
+# بعد از setup جنگو import می‌شود
+from notifications.stream import STREAM_PATH, stream_application
+
+
+async def application(scope, receive, send):
+    """Django, plus the Server-Sent Events stream for connected clients"""
+    if scope['type'] == 'http' and scope['path'] == STREAM_PATH:
+        return await stream_application(scope, receive, send)
+    return await django_application(scope, receive, send)
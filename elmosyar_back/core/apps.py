@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'core'
+
+    def ready(self):
+        # ثبت سیگنال‌های بی‌اعتبارسازی شمارش‌های کش‌شده
+        import core.counts
+        # ساخت thumbnail و نسخه‌های WebP بعد از آپلود تصویر
+        import core.images
+        # هشدار کش غیرمشترک در production
+        import core.checks
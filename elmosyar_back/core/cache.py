@@ -0,0 +1,168 @@
+import threading
+import time
+from collections import defaultdict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+
+_MISSING = object()
+
+
+class CacheMetrics:
+    """
+    شمارنده‌های hit/miss هر namespace در همین پروسس
+
+    Counters are per worker process and reset on restart. They are meant
+    for spotting a cold or useless cache, not for exact accounting.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(lambda: defaultdict(int))
+
+    def record(self, namespace, event, amount=1):
+        with self._lock:
+            self._counters[namespace][event] += amount
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for namespace, counters in self._counters.items():
+                counters = dict(counters)
+                lookups = counters.get('hits', 0) + counters.get('misses', 0)
+                counters['hit_rate'] = round(counters.get('hits', 0) / lookups, 3) if lookups else None
+                result[namespace] = counters
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+metrics = CacheMetrics()
+
+
+def _scope_str(scope):
+    if isinstance(scope, (tuple, list)):
+        return ':'.join(str(part) for part in scope)
+    return str(scope)
+
+
+class NamespacedCache:
+    """
+    A thin wrapper around a Django cache that keeps every key under
+    ``<namespace>:``. It adds versioned invalidation through scopes and
+    records hits and misses in ``metrics``.
+
+    A scope is any value or tuple naming a group of entries, such as
+    ``('category', 'textbooks')``. ``versioned_key`` folds the current
+    versions of some scopes into a key. ``bump`` moves a scope to a new
+    version, so every entry built under the old one stops being reachable
+    and expires on its own.
+    """
+
+    def __init__(self, namespace, timeout=DEFAULT_TIMEOUT, alias='default'):
+        self.namespace = namespace
+        self.timeout = timeout
+        self.alias = alias
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def key(self, key):
+        return f'{self.namespace}:{key}'
+
+    def get(self, key, default=None):
+        value = self.backend.get(self.key(key), _MISSING)
+        if value is _MISSING:
+            metrics.record(self.namespace, 'misses')
+            return default
+        metrics.record(self.namespace, 'hits')
+        return value
+
+    def get_many(self, keys):
+        """Return ``{key: value}`` for the keys found in the cache"""
+        full_keys = {self.key(key): key for key in keys}
+        found = self.backend.get_many(list(full_keys))
+        metrics.record(self.namespace, 'hits', len(found))
+        metrics.record(self.namespace, 'misses', len(full_keys) - len(found))
+        return {full_keys[full_key]: value for full_key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.timeout
+        self.backend.set(self.key(key), value, timeout)
+        metrics.record(self.namespace, 'sets')
+
+    def set_many(self, mapping, timeout=DEFAULT_TIMEOUT):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.timeout
+        self.backend.set_many({self.key(key): value for key, value in mapping.items()}, timeout)
+        metrics.record(self.namespace, 'sets', len(mapping))
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT):
+        """Like ``cache.get_or_set``; ``default`` may be a callable computing the value"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = default() if callable(default) else default
+            self.set(key, value, timeout)
+        return value
+
+    def delete(self, key):
+        self.backend.delete(self.key(key))
+
+    def delete_many(self, keys):
+        self.backend.delete_many([self.key(key) for key in keys])
+
+    # ─── Versioned invalidation ───
+
+    def _version_key(self, scope):
+        return self.key(f'v:{_scope_str(scope)}')
+
+    @staticmethod
+    def _new_version():
+        # نسخه‌ی تازه هیچ‌وقت تکرار نمی‌شود؛ اگر کلید نسخه evict شود، ورودی‌های
+        # ساخته‌شده با نسخه‌ی قبلی دوباره معتبر نمی‌شوند
+        return time.time_ns()
+
+    def versions(self, scopes):
+        """Current versions of ``scopes``, in order (one round trip when all are present)"""
+        version_keys = [self._version_key(scope) for scope in scopes]
+        found = self.backend.get_many(version_keys)
+        missing = [key for key in version_keys if key not in found]
+        if missing:
+            for key in missing:
+                # add: اگر پروسس دیگری همزمان نسخه گذاشته، همان برنده است
+                self.backend.add(key, self._new_version(), None)
+            found.update(self.backend.get_many(missing))
+        return [found[key] if key in found else self._new_version() for key in version_keys]
+
+    def versioned_key(self, key, scopes):
+        return self.versioned_keys({key: scopes})[key]
+
+    def versioned_keys(self, scoped_keys):
+        """``{key: scopes}`` -> ``{key: versioned key}``, reading every version in one round trip"""
+        unique_scopes = list(dict.fromkeys(
+            scope for scopes in scoped_keys.values() for scope in scopes
+        ))
+        versions = dict(zip(unique_scopes, self.versions(unique_scopes)))
+        return {
+            key: f"{key}@{'.'.join(str(versions[scope]) for scope in scopes)}"
+            for key, scopes in scoped_keys.items()
+        }
+
+    def bump(self, *scopes):
+        """Invalidate everything cached under any of ``scopes``"""
+        for scope in scopes:
+            version_key = self._version_key(scope)
+            try:
+                self.backend.incr(version_key)
+            except ValueError:
+                self.backend.set(version_key, self._new_version(), None)
+        metrics.record(self.namespace, 'invalidations', len(scopes))
+
+
+def namespace(name, timeout=DEFAULT_TIMEOUT, alias='default'):
+    return NamespacedCache(name, timeout=timeout, alias=alias)
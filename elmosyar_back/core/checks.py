@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.checks import Warning, register, Tags
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    نسخه‌های scope در core.cache فقط وقتی بین workerها معتبرند که کش مشترک باشد
+    """
+    if settings.DEBUG or getattr(settings, 'CACHE_BACKEND', None) != 'locmem':
+        return []
+    return [Warning(
+        'CACHE_BACKEND is locmem: every worker keeps its own cache, so cached '
+        'counts and invalidations are not shared between processes.',
+        hint='Set REDIS_URL (or CACHE_BACKEND=file) in production.',
+        id='core.W001',
+    )]
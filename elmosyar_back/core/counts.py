@@ -0,0 +1,113 @@
+import hashlib
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.core.exceptions import EmptyResultSet
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils.functional import cached_property
+
+from .cache import namespace
+
+
+# هر total_count در کش به یک یا چند scope وابسته است، مثل
+# ('category', 'textbooks') یا ('notifications', user_id). هر نوشتن روی آن
+# scope نسخه‌اش را یکی بالا می‌برد و همه‌ی countهای وابسته بی‌اعتبار می‌شوند.
+count_cache = namespace('count')
+
+
+def bump_count_scopes(*scopes):
+    """
+    Invalidate every cached count that depends on one of ``scopes`` once
+    the current transaction commits (immediately outside a transaction),
+    so a concurrent reader cannot cache the pre-commit COUNT under the new
+    version.
+    """
+    if scopes:
+        transaction.on_commit(lambda: count_cache.bump(*scopes))
+
+
+class CachedCountPaginator(Paginator):
+    """
+    A ``Paginator`` whose ``count`` is cached per filter.
+
+    The cache key combines a hash of the filtered query with the current
+    versions of ``scopes``. Any write that bumps one of those scopes
+    therefore forces a fresh count. With ``exact=False``, the last known
+    total is returned even if it is stale, and ``estimated`` is set. That
+    value lives under an unversioned key with a longer timeout.
+    """
+
+    def __init__(self, object_list, per_page, scopes, exact=True, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.scopes = tuple(scopes)
+        self.exact = exact
+        self.estimated = False
+
+    def _signature(self):
+        try:
+            sql = str(self.object_list.order_by().query)
+        except EmptyResultSet:
+            return None
+        return hashlib.sha1(sql.encode()).hexdigest()
+
+    @cached_property
+    def count(self):
+        signature = self._signature()
+        if signature is None:
+            return 0
+
+        estimate_key = f'estimate:{signature}'
+        if not self.exact:
+            estimate = count_cache.get(estimate_key)
+            if estimate is not None:
+                self.estimated = True
+                return estimate
+
+        exact_key = count_cache.versioned_key(signature, self.scopes)
+        total = count_cache.get(exact_key)
+        if total is None:
+            total = super().count
+            count_cache.set(exact_key, total, getattr(settings, 'COUNT_CACHE_TIMEOUT', 60))
+        count_cache.set(estimate_key, total, getattr(settings, 'COUNT_ESTIMATE_TIMEOUT', 900))
+        return total
+
+
+# ════════════════════════════════════════════════════════════
+# Invalidation
+# ════════════════════════════════════════════════════════════
+
+@receiver([post_save, post_delete], sender='posts.Post')
+def _post_changed(sender, instance, **kwargs):
+    scopes = [('posts', 'all'), ('user', instance.author_id)]
+    category = getattr(instance, 'category', None)
+    if category is not None:
+        scopes.append(('category', category.name))
+    bump_count_scopes(*scopes)
+
+
+@receiver(m2m_changed, sender='posts.Post_saved_by')
+def _saved_posts_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # instance یک کاربر است
+        bump_count_scopes(('saved', instance.pk))
+    else:
+        bump_count_scopes(*[('saved', user_id) for user_id in (pk_set or ())])
+
+
+@receiver([post_save, post_delete], sender='notifications.Notification')
+def _notification_changed(sender, instance, **kwargs):
+    bump_count_scopes(('notifications', instance.recipient_id))
+
+
+@receiver([post_save, post_delete], sender='messaging.Message')
+def _message_changed(sender, instance, **kwargs):
+    bump_count_scopes(('conversation', instance.conversation_id))
+
+
+@receiver([post_save, post_delete], sender='social.UserFollow')
+def _follow_changed(sender, instance, **kwargs):
+    bump_count_scopes(('followers', instance.following_id), ('following', instance.follower_id))
@@ -0,0 +1,132 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpResponse, FileResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+
+STREAM_BLOCK_SIZE = 64 * 1024
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def _parse_range(header, size):
+    """
+    ``(start, end)`` for a single ``bytes=`` range, ``None`` to send the
+    whole file (no header, or one we do not handle), or ``False`` when the
+    range cannot be satisfied.
+    """
+    match = _RANGE.match(header.strip()) if header else None
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # bytes=-500 یعنی ۵۰۰ بایت آخر
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def _if_range_matches(request, etag, mtime):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == int(mtime)
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            block = f.read(min(STREAM_BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def serve_file(request, root, name, content_type=None, as_attachment=False, filename=None,
+               accel_prefix=None, cache_control=None):
+    """
+    ارسال فایل ``name`` از پوشه‌ی ``root`` بدون خواندن کامل آن در حافظه
+
+    With ``FILE_DELIVERY_BACKEND = 'nginx'`` the response only carries an
+    ``X-Accel-Redirect`` to ``accel_prefix + name``, and with ``'sendfile'``
+    an ``X-Sendfile`` with the absolute path; the front server sends the
+    bytes. Otherwise the file is streamed from Django, honouring a single
+    ``Range`` (and ``If-Range``). Every backend answers ``If-None-Match`` /
+    ``If-Modified-Since`` with 304 from the file's ETag and mtime.
+
+    Raises ``Http404`` for a missing file or a name escaping ``root``.
+    """
+    try:
+        path = safe_join(os.path.abspath(root), name)
+        stat = os.stat(path)
+    except (SuspiciousFileOperation, ValueError, OSError):
+        raise Http404('File not found')
+    if not os.path.isfile(path):
+        raise Http404('File not found')
+
+    etag = _etag(stat)
+    last_modified = http_date(stat.st_mtime)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if not_modified is not None:
+        return not_modified
+
+    content_type = content_type or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    backend = settings.FILE_DELIVERY_BACKEND
+
+    if backend == 'nginx' and accel_prefix:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + quote(name.replace(os.sep, '/'))
+    elif backend == 'sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+    else:
+        byte_range = _parse_range(request.META.get('HTTP_RANGE'), stat.st_size)
+        if byte_range is not None and not _if_range_matches(request, etag, stat.st_mtime):
+            byte_range = None
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+
+        if byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                _read_range(path, start, length), status=206, content_type=content_type
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+            response['Content-Length'] = str(length)
+        else:
+            # FileResponse از wsgi.file_wrapper (sendfile سیستم‌عامل) استفاده می‌کند
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+        response['Accept-Ranges'] = 'bytes'
+
+    response['ETag'] = etag
+    response['Last-Modified'] = last_modified
+    if cache_control:
+        response['Cache-Control'] = cache_control
+    if as_attachment:
+        download_name = filename or os.path.basename(path)
+        response['Content-Disposition'] = f'attachment; filename="{download_name}"'
+    return response
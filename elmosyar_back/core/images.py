@@ -0,0 +1,250 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from PIL import Image, ImageOps
+
+from log_manager.log_config import log_error, log_warning
+
+
+# فیلد تصویر و فیلد variants هر مدل؛ کلید همان sender سیگنال‌هاست
+IMAGE_FIELDS = {
+    'posts.PostMedia': ('file', 'variants'),
+    'accounts.User': ('profile_picture', 'profile_picture_variants'),
+}
+
+
+# ════════════════════════════════════════════════════════════
+# Rendering
+# ════════════════════════════════════════════════════════════
+
+def _variant_name(source_name, label):
+    stem, _ = os.path.splitext(source_name)
+    return f'derivatives/{stem}_{label}.webp'
+
+
+def _save_webp(image, name):
+    buffer = BytesIO()
+    image.save(buffer, format='WEBP', quality=settings.IMAGE_VARIANT_QUALITY, method=4)
+    stored = default_storage.save(name, ContentFile(buffer.getvalue()))
+    return {'name': stored, 'width': image.width, 'height': image.height}
+
+
+def render_variants(field_file):
+    """
+    یک thumbnail مربعی و نسخه‌های WebP با عرض‌های IMAGE_VARIANT_WIDTHS
+
+    Widths at or above the original are skipped; an image narrower than
+    every configured width still gets one WebP copy at its own size.
+    Variants are written to the default storage, even when the original
+    lives in the blob store. Returns the ``variants`` dict stored on the
+    model.
+    """
+    with field_file.open('rb') as f, Image.open(f) as original:
+        image = ImageOps.exif_transpose(original)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+
+        size = settings.IMAGE_THUMBNAIL_SIZE
+        thumbnail = _save_webp(ImageOps.fit(image, (size, size)), _variant_name(field_file.name, f'thumb{size}'))
+
+        widths = sorted(w for w in settings.IMAGE_VARIANT_WIDTHS if w < image.width) or [image.width]
+        sources = []
+        for width in widths:
+            resized = image.copy()
+            resized.thumbnail((width, image.height))
+            sources.append(_save_webp(resized, _variant_name(field_file.name, f'w{width}')))
+
+    return {'source': field_file.name, 'thumbnail': thumbnail, 'widths': sources}
+
+
+def variant_names(variants):
+    if not variants:
+        return []
+    names = [variants['thumbnail']['name']] if variants.get('thumbnail') else []
+    names.extend(item['name'] for item in variants.get('widths', []))
+    return names
+
+
+def delete_variants(variants):
+    for name in variant_names(variants):
+        try:
+            default_storage.delete(name)
+        except OSError:
+            pass
+
+
+def thumbnail_url(field_file, variants):
+    if variants and variants.get('source') == field_file.name and variants.get('thumbnail'):
+        return default_storage.url(variants['thumbnail']['name'])
+    return None
+
+
+def srcset(field_file, variants):
+    """``"<url> 320w, <url> 640w"`` for ``<img srcset>``, or empty until variants exist"""
+    if not variants or variants.get('source') != field_file.name:
+        return ''
+    return ', '.join(
+        f"{default_storage.url(item['name'])} {item['width']}w" for item in variants.get('widths', [])
+    )
+
+
+def build_variants(model_label, pk, source_name):
+    """
+    Render the variants of one row and store them, unless its image
+    changed in the meantime. Saving fires ``post_save``, so cached
+    representations of the row are invalidated as usual.
+    """
+    image_field, variants_field = IMAGE_FIELDS[model_label]
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or getattr(instance, image_field).name != source_name:
+        return None
+
+    field_file = getattr(instance, image_field)
+    old = getattr(instance, variants_field)
+    try:
+        new = render_variants(field_file)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        # فایل تصویر قابل خواندن نیست؛ source ثبت می‌شود تا دوباره تلاش نشود
+        log_warning(f"Could not render image variants: {str(e)}", None, {
+            'model': model_label, 'pk': pk, 'source': source_name
+        })
+        new = {'source': source_name}
+
+    setattr(instance, variants_field, new)
+    instance.save(update_fields=[variants_field])
+
+    stale = set(variant_names(old)) - set(variant_names(new))
+    delete_variants({'widths': [{'name': name} for name in stale]})
+    return new
+
+
+# ════════════════════════════════════════════════════════════
+# Worker pool
+# ════════════════════════════════════════════════════════════
+
+class DerivativePool:
+    """
+    A bounded ``ThreadPoolExecutor`` for variant rendering.
+
+    At most ``IMAGE_DERIVATIVE_WORKERS`` images are rendered at once and
+    at most ``IMAGE_DERIVATIVE_QUEUE_SIZE`` jobs are pending or running.
+    Jobs beyond that are dropped and counted; ``generate_image_variants``
+    picks them up later. With zero workers, jobs run inline.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = set()
+        self.counters = {'submitted': 0, 'dropped': 0, 'completed': 0, 'failed': 0}
+
+    def submit(self, model_label, pk, source_name):
+        workers = settings.IMAGE_DERIVATIVE_WORKERS
+        if workers <= 0:
+            return self._run((model_label, pk, source_name), close_connection=False)
+
+        job = (model_label, pk, source_name)
+        with self._lock:
+            if job in self._pending:
+                return None
+            if len(self._pending) >= settings.IMAGE_DERIVATIVE_QUEUE_SIZE:
+                self.counters['dropped'] += 1
+                log_warning("Image derivative queue full, job dropped", None, {
+                    'model': model_label, 'pk': pk
+                })
+                return None
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-derivatives')
+            self._pending.add(job)
+            self.counters['submitted'] += 1
+        return self._executor.submit(self._run, job)
+
+    def _run(self, job, close_connection=True):
+        try:
+            result = build_variants(*job)
+            self._count('completed')
+            return result
+        except Exception as e:
+            self._count('failed')
+            log_error(f"Image derivative generation failed: {str(e)}", None, {
+                'model': job[0], 'pk': job[1], 'source': job[2]
+            })
+        finally:
+            with self._lock:
+                self._pending.discard(job)
+            if close_connection:
+                # هر thread اتصال دیتابیس خودش را دارد
+                connection.close()
+
+    def _count(self, event):
+        with self._lock:
+            self.counters[event] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counters, pending=len(self._pending))
+
+
+derivative_pool = DerivativePool()
+
+
+# ════════════════════════════════════════════════════════════
+# Signals
+# ════════════════════════════════════════════════════════════
+
+def schedule_variants(model_label, instance, update_fields=None):
+    image_field, variants_field = IMAGE_FIELDS[model_label]
+    if update_fields and image_field not in update_fields:
+        return
+    if getattr(instance, 'media_type', 'image') != 'image':
+        return
+
+    field_file = getattr(instance, image_field)
+    variants = getattr(instance, variants_field) or {}
+    if not field_file:
+        if variants:
+            # تصویر حذف شده؛ نسخه‌های قبلی هم پاک می‌شوند
+            type(instance).objects.filter(pk=instance.pk).update(**{variants_field: {}})
+            transaction.on_commit(lambda: delete_variants(variants))
+        return
+
+    if variants.get('source') != field_file.name:
+        pk, name = instance.pk, field_file.name
+        # بعد از commit تا worker ردیف و فایل نهایی را ببیند
+        transaction.on_commit(lambda: derivative_pool.submit(model_label, pk, name))
+
+
+def cleanup_variants(model_label, instance):
+    variants_field = IMAGE_FIELDS[model_label][1]
+    variants = getattr(instance, variants_field)
+    if variants:
+        transaction.on_commit(lambda: delete_variants(variants))
+
+
+@receiver(post_save, sender='posts.PostMedia')
+def _media_saved(sender, instance, update_fields=None, **kwargs):
+    schedule_variants('posts.PostMedia', instance, update_fields)
+
+
+@receiver(post_delete, sender='posts.PostMedia')
+def _media_deleted(sender, instance, **kwargs):
+    cleanup_variants('posts.PostMedia', instance)
+
+
+@receiver(post_save, sender='accounts.User')
+def _user_saved(sender, instance, update_fields=None, **kwargs):
+    schedule_variants('accounts.User', instance, update_fields)
+
+
+@receiver(post_delete, sender='accounts.User')
+def _user_deleted(sender, instance, **kwargs):
+    cleanup_variants('accounts.User', instance)
@@ -0,0 +1,42 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from core.images import IMAGE_FIELDS, build_variants
+
+
+class Command(BaseCommand):
+    help = 'Render thumbnails and WebP variants for post images and profile pictures'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=list(IMAGE_FIELDS), action='append',
+                            help='Only process this model (may be repeated)')
+        parser.add_argument('--all', action='store_true',
+                            help='Re-render rows whose variants are already up to date')
+        parser.add_argument('--chunk-size', type=int, default=200,
+                            help='Number of rows read per batch')
+
+    def handle(self, *args, **options):
+        for model_label in options['model'] or IMAGE_FIELDS:
+            image_field, variants_field = IMAGE_FIELDS[model_label]
+            rows = apps.get_model(model_label).objects.exclude(**{image_field: ''}).exclude(
+                **{f'{image_field}__isnull': True}
+            )
+            if model_label == 'posts.PostMedia':
+                rows = rows.filter(media_type='image')
+
+            last_id = 0
+            rendered = 0
+            while True:
+                chunk = list(
+                    rows.filter(pk__gt=last_id).order_by('pk')
+                    .values_list('pk', image_field, variants_field)[:options['chunk_size']]
+                )
+                if not chunk:
+                    break
+                for pk, name, variants in chunk:
+                    if options['all'] or (variants or {}).get('source') != name:
+                        if build_variants(model_label, pk, name) is not None:
+                            rendered += 1
+                last_id = chunk[-1][0]
+
+            self.stdout.write(self.style.SUCCESS(f'{model_label}: rendered variants for {rendered} images'))
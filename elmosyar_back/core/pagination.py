@@ -0,0 +1,166 @@
+import base64
+import json
+from datetime import datetime
+
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.db.models import Q
+
+from .counts import CachedCountPaginator
+
+
+class InvalidPagination(Exception):
+    """Raised for pagination parameters that cannot be served; views answer 400"""
+
+
+class InvalidCursor(InvalidPagination):
+    """Raised when a cursor cannot be decoded or does not fit the ordering"""
+
+
+class CursorPage:
+    def __init__(self, items, next_cursor, previous_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator:
+    """
+    صفحه‌بندی keyset روی (timestamp, id) بدون COUNT و OFFSET
+
+    ``ordering`` is a pair such as ``('-created_at', '-id')``. Both fields
+    must sort in the same direction and the pair must be unique. Each page
+    is a single range query that can walk a ``(..., created_at)`` index, so
+    a page deep in the feed costs the same as the first one. Cursors are
+    opaque url-safe strings that hold the position of the page's boundary
+    row and the direction to move in.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-created_at', '-id')):
+        descending = {field.startswith('-') for field in ordering}
+        if len(ordering) != 2 or len(descending) != 1:
+            raise ValueError('ordering must be two fields sorted in the same direction')
+
+        self.queryset = queryset
+        self.per_page = per_page
+        self.descending = descending.pop()
+        self.fields = tuple(field.lstrip('-') for field in ordering)
+
+    def _order(self, forward):
+        prefix = '-' if self.descending == forward else ''
+        return [prefix + field for field in self.fields]
+
+    def _after(self, position, forward):
+        """Rows strictly after ``position`` when walking forward or backward"""
+        lookup = 'lt' if self.descending == forward else 'gt'
+        time_field, id_field = self.fields
+        timestamp, pk = position
+        return (
+            Q(**{f'{time_field}__{lookup}': timestamp})
+            | Q(**{time_field: timestamp, f'{id_field}__{lookup}': pk})
+        )
+
+    def encode_cursor(self, item, forward):
+        time_field, id_field = self.fields
+        payload = {
+            't': getattr(item, time_field).isoformat(),
+            'i': getattr(item, id_field),
+            'd': 'n' if forward else 'p',
+        }
+        raw = json.dumps(payload, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            position = (datetime.fromisoformat(payload['t']), int(payload['i']))
+            forward = {'n': True, 'p': False}[payload['d']]
+        except (ValueError, TypeError, KeyError, AttributeError):
+            raise InvalidCursor('Invalid cursor')
+        return position, forward
+
+    def page(self, cursor=None):
+        forward = True
+        queryset = self.queryset
+        if cursor:
+            position, forward = self.decode_cursor(cursor)
+            queryset = queryset.filter(self._after(position, forward))
+
+        # یک ردیف اضافه برای فهمیدن اینکه صفحه‌ی بعدی وجود دارد یا نه
+        rows = list(queryset.order_by(*self._order(forward))[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        items = rows[:self.per_page]
+
+        if forward:
+            has_next, has_previous = has_more, bool(cursor)
+        else:
+            items.reverse()
+            has_next, has_previous = True, has_more
+
+        next_cursor = self.encode_cursor(items[-1], True) if has_next and items else None
+        previous_cursor = self.encode_cursor(items[0], False) if has_previous and items else None
+        return CursorPage(items, next_cursor, previous_cursor)
+
+
+def paginate(request, queryset, page, per_page, ordering=('-created_at', '-id'), count_scopes=None):
+    """
+    Paginate a feed queryset and return ``(items, pagination)``.
+
+    Requests carrying a ``cursor`` parameter use keyset pagination. Pass an
+    empty cursor for the first page, then follow ``next``/``previous`` from
+    the response. Those pages skip the COUNT query and raise
+    ``InvalidCursor`` for a malformed cursor. All other requests keep the
+    page-number pagination with ``total_count`` / ``total_pages``; ``page``
+    is the raw query value, a non-integer raises ``InvalidPagination`` and
+    a page out of range falls back to the first page.
+
+    With ``count_scopes``, the total comes from ``CachedCountPaginator``.
+    ``?exact=false`` then accepts a possibly stale total, which is flagged
+    with ``count_estimated``.
+    """
+    if 'cursor' in request.GET:
+        cursor_page = CursorPaginator(queryset, per_page, ordering).page(request.GET.get('cursor'))
+        return cursor_page.items, {
+            'mode': 'cursor',
+            'per_page': per_page,
+            'next': cursor_page.next_cursor,
+            'previous': cursor_page.previous_cursor,
+            'has_next': cursor_page.has_next(),
+            'has_previous': cursor_page.has_previous(),
+        }
+
+    if count_scopes is None:
+        paginator = Paginator(queryset.order_by(*ordering), per_page)
+    else:
+        exact = request.GET.get('exact', 'true').lower() != 'false'
+        paginator = CachedCountPaginator(queryset.order_by(*ordering), per_page, count_scopes, exact=exact)
+    try:
+        items_page = paginator.page(page)
+    except PageNotAnInteger:
+        raise InvalidPagination('Invalid page number')
+    except EmptyPage:
+        items_page = paginator.page(1)
+
+    pagination = {
+        'page': items_page.number,
+        'per_page': per_page,
+        'total_pages': paginator.num_pages,
+        'total_count': paginator.count,
+        'has_next': items_page.has_next(),
+        'has_previous': items_page.has_previous(),
+    }
+    if count_scopes is not None:
+        pagination['count_estimated'] = paginator.estimated
+    return items_page, pagination
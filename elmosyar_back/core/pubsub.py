@@ -0,0 +1,187 @@
+"""
+Pub/sub برای ارسال رویدادها به کاربران متصل (stream)
+
+Views publish small events ("notification", "message", "read") to a
+user's channel; ``notifications.stream`` holds one subscription per open
+connection and writes them out as Server-Sent Events.
+
+``PUSH_BROKER`` picks the transport:
+
+* ``inprocess``: subscribers live in this worker's memory. Events only
+  reach connections served by the same process, so it suits a single
+  ASGI worker (and tests).
+* ``redis``: Redis PUBLISH/SUBSCRIBE, shared by every worker. Needs the
+  ``redis`` package.
+
+Events are published after the surrounding transaction commits, so a
+client never hears about a row it cannot read yet.
+"""
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from log_manager.log_config import log_warning
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+class InProcessSubscription:
+    def __init__(self, broker, channel, maxsize):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        # صف پر شده و رویدادی از دست رفته؛ کلاینت باید از API دوباره بخواند
+        self.overflowed = False
+
+    def _put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def deliver(self, message):
+        """Called from any thread"""
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # loop اتصال بسته شده؛ اشتراک در حال حذف است
+            pass
+
+    async def get(self, timeout):
+        """The next message, or None after ``timeout`` seconds"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self):
+        self.broker._unsubscribe(self)
+
+
+class InProcessBroker:
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.deliver(message)
+
+    async def subscribe(self, channel):
+        subscription = InProcessSubscription(self, channel, self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+class RedisSubscription:
+    overflowed = False
+
+    def __init__(self, client, pubsub):
+        self.client = client
+        self.pubsub = pubsub
+
+    async def get(self, timeout):
+        message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        if message is None:
+            return None
+        data = message['data']
+        return data.decode('utf-8') if isinstance(data, bytes) else data
+
+    async def close(self):
+        await self.pubsub.aclose()
+        # کلاینت و connection pool آن هم مال همین اتصال است
+        await self.client.aclose()
+
+
+class RedisBroker:
+    def __init__(self, url, prefix='elmosyar:push:'):
+        try:
+            import redis
+            import redis.asyncio
+        except ImportError:
+            raise ImproperlyConfigured("PUSH_BROKER='redis' requires the redis package")
+        self.url = url
+        self.prefix = prefix
+        self._async = redis.asyncio
+        self._client = redis.Redis.from_url(url)
+
+    def publish(self, channel, message):
+        self._client.publish(self.prefix + channel, message)
+
+    async def subscribe(self, channel):
+        # هر اتصال pubsub خودش را دارد؛ کلاینت async به loop همان اتصال بسته است
+        client = self._async.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        try:
+            await pubsub.subscribe(self.prefix + channel)
+        except Exception:
+            await pubsub.aclose()
+            await client.aclose()
+            raise
+        return RedisSubscription(client, pubsub)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                if settings.PUSH_BROKER == 'redis':
+                    _broker = RedisBroker(settings.PUSH_BROKER_URL)
+                else:
+                    _broker = InProcessBroker(settings.PUSH_QUEUE_SIZE)
+    return _broker
+
+
+def encode_event(event_type, data):
+    return json.dumps({'type': event_type, 'data': data}, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+def publish_to_users(user_ids, event_type, data):
+    """
+    Send one event to each user in ``user_ids`` once the current
+    transaction commits (immediately outside a transaction)
+    """
+    user_ids = list(user_ids)
+    if not user_ids or not settings.PUSH_ENABLED:
+        return
+
+    def _publish():
+        broker = get_broker()
+        message = encode_event(event_type, data)
+        for user_id in user_ids:
+            try:
+                broker.publish(user_channel(user_id), message)
+            except Exception as e:
+                # push بهترین تلاش است؛ کلاینت با API به روز می‌شود
+                log_warning(f"Push publish failed: {str(e)}", None, {'event': event_type, 'user_id': user_id})
+
+    transaction.on_commit(_publish)
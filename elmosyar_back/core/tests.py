@@ -0,0 +1,248 @@
+from django.test import TestCase, SimpleTestCase, RequestFactory, override_settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from django.core.cache import cache
+from django.http import Http404
+from rest_framework.test import APIClient
+from posts.models import Post
+import os
+import shutil
+import tempfile
+from .pagination import CursorPaginator, InvalidCursor, paginate
+from .cache import namespace, metrics
+from .files import serve_file
+from .pubsub import RedisSubscription
+
+
+User = get_user_model()
+
+class CursorPaginatorTest(TestCase):
+
+    def setUp(self):
+        author = User.objects.create_user(username="author", email="author@example.com", password="1234")
+        same_time = timezone.now()
+        self.posts = [Post.objects.create(author=author) for _ in range(5)]
+        # دو پست با زمان یکسان تا ترتیب روی id هم بررسی شود
+        Post.objects.filter(id__in=[self.posts[1].id, self.posts[2].id]).update(created_at=same_time)
+        self.expected = list(Post.objects.order_by('-created_at', '-id'))
+
+    def test_walks_forward_and_back(self):
+        paginator = CursorPaginator(Post.objects.all(), 2)
+
+        first = paginator.page()
+        self.assertEqual(first.items, self.expected[:2])
+        self.assertFalse(first.has_previous())
+
+        second = paginator.page(first.next_cursor)
+        third = paginator.page(second.next_cursor)
+        self.assertEqual(second.items, self.expected[2:4])
+        self.assertEqual(third.items, self.expected[4:])
+        self.assertFalse(third.has_next())
+
+        back = paginator.page(third.previous_cursor)
+        self.assertEqual(back.items, self.expected[2:4])
+        self.assertEqual(paginator.page(back.previous_cursor).items, self.expected[:2])
+
+    def test_cursor_mode_skips_count(self):
+        request = RequestFactory().get('/api/posts/', {'cursor': ''})
+        with self.assertNumQueries(1):
+            items, pagination = paginate(request, Post.objects.all(), 1, 3)
+        self.assertEqual(items, self.expected[:3])
+        self.assertNotIn('total_count', pagination)
+        self.assertTrue(pagination['has_next'])
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            CursorPaginator(Post.objects.all(), 2).page('not-a-cursor')
+
+
+class CachedCountTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="author", email="author@example.com", password="1234")
+        for _ in range(3):
+            Post.objects.create(author=self.author)
+
+    def _count(self, exact=True):
+        params = {} if exact else {'exact': 'false'}
+        request = RequestFactory().get('/api/posts/', params)
+        return paginate(request, Post.objects.filter(author=self.author), 1, 2,
+                        count_scopes=[('user', self.author.id)])[1]
+
+    def test_count_cached_until_scope_write(self):
+        self.assertEqual(self._count()['total_count'], 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(self._count()['total_count'], 3)
+
+        # نسخه بعد از commit بالا می‌رود
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(author=self.author)
+            self.assertEqual(self._count()['total_count'], 3)
+        self.assertEqual(self._count()['total_count'], 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+        estimate = self._count(exact=False)
+        self.assertEqual(estimate['total_count'], 4)
+        self.assertTrue(estimate['count_estimated'])
+        self.assertEqual(self._count()['total_count'], 3)
+
+    def test_page_number_validation(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.get(f'/api/posts/users/{self.author.username}/?page=abc')
+        self.assertEqual((response.status_code, response.data['message']), (400, 'Invalid page number'))
+
+        # صفحه‌ی خارج از محدوده صفحه‌ی اول را برمی‌گرداند
+        response = client.get(f'/api/posts/users/{self.author.username}/?page=9&per_page=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['pagination']['page'], 1)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'core-tests'}})
+class NamespacedCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.feed = namespace('feed')
+        self.profile = namespace('profile')
+
+    def test_namespaces_do_not_collide(self):
+        self.feed.set('1', 'post')
+        self.profile.set('1', 'user')
+        self.assertEqual(self.feed.get('1'), 'post')
+        self.assertEqual(self.profile.get('1'), 'user')
+        self.assertEqual(self.feed.get_or_set('2', lambda: 'computed'), 'computed')
+        self.assertEqual(self.feed.get_many(['1', '2', '3']), {'1': 'post', '2': 'computed'})
+
+    def test_bump_invalidates_versioned_keys(self):
+        key = self.feed.versioned_key('page', [('category', 'textbooks'), ('user', 7)])
+        self.feed.set(key, 'cached')
+        self.profile.bump(('category', 'textbooks'))
+        self.assertEqual(self.feed.get(self.feed.versioned_key('page', [('category', 'textbooks'), ('user', 7)])), 'cached')
+
+        self.feed.bump(('category', 'textbooks'))
+        self.assertIsNone(self.feed.get(self.feed.versioned_key('page', [('category', 'textbooks'), ('user', 7)])))
+
+    def test_evicted_version_does_not_revive_old_entries(self):
+        scopes = [('category', 'textbooks')]
+        version_key = self.feed._version_key(scopes[0])
+        self.feed.set(self.feed.versioned_key('page', scopes), 'old')
+
+        # کلید نسخه evict شده ولی ورودی قدیمی هنوز در کش است
+        cache.delete(version_key)
+        self.assertIsNone(self.feed.get(self.feed.versioned_key('page', scopes)))
+
+        self.feed.set(self.feed.versioned_key('page', scopes), 'current')
+        cache.delete(version_key)
+        # bump روی کلید گم‌شده هم نسخه‌ی قبلی را تکرار نمی‌کند
+        self.feed.bump(scopes[0])
+        self.assertIsNone(self.feed.get(self.feed.versioned_key('page', scopes)))
+
+    def test_metrics(self):
+        self.feed.get('missing')
+        self.feed.set('present', 1)
+        self.feed.get('present')
+        snapshot = metrics.snapshot()['feed']
+        self.assertEqual((snapshot['hits'], snapshot['misses'], snapshot['hit_rate']), (1, 1, 0.5))
+
+
+class SharedCacheTest(SimpleTestCase):
+    """دو worker با دو اتصال جدا به یک کش مشترک (فایل‌محور، بین پروسس‌ها مشترک است)"""
+
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        backend = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+        cache_override = override_settings(CACHES={'default': backend, 'worker2': dict(backend)})
+        cache_override.enable()
+        self.addCleanup(cache_override.disable)
+        self.worker1 = namespace('feed')
+        self.worker2 = namespace('feed', alias='worker2')
+
+    def test_bump_reaches_other_workers(self):
+        scopes = [('category', 'textbooks')]
+        self.worker1.set(self.worker1.versioned_key('page', scopes), 'cached')
+        self.assertEqual(self.worker2.get(self.worker2.versioned_key('page', scopes)), 'cached')
+
+        self.worker2.bump(scopes[0])
+        self.assertIsNone(self.worker1.get(self.worker1.versioned_key('page', scopes)))
+
+    def test_evicted_version_is_not_reused_by_other_workers(self):
+        scopes = [('category', 'textbooks')]
+        self.worker1.set(self.worker1.versioned_key('page', scopes), 'old')
+        self.worker1.backend.delete(self.worker1._version_key(scopes[0]))
+
+        # worker دوم نسخه‌ی تازه می‌سازد و worker اول همان را می‌بیند
+        key = self.worker2.versioned_key('page', scopes)
+        self.assertIsNone(self.worker2.get(key))
+        self.assertEqual(self.worker1.versioned_key('page', scopes), key)
+
+
+class RedisSubscriptionTest(SimpleTestCase):
+
+    async def test_close_releases_client(self):
+        closed = []
+
+        class Closable:
+            def __init__(self, name):
+                self.name = name
+
+            async def aclose(self):
+                closed.append(self.name)
+
+        await RedisSubscription(Closable('client'), Closable('pubsub')).close()
+        self.assertEqual(closed, ['pubsub', 'client'])
+
+
+class FileDeliveryTest(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        with open(os.path.join(self.root, 'notes.txt'), 'wb') as f:
+            f.write(b'0123456789')
+        self.factory = RequestFactory()
+
+    def _get(self, **headers):
+        return serve_file(self.factory.get('/', headers=headers), self.root, 'notes.txt')
+
+    def test_streams_full_file_and_ranges(self):
+        response = self._get()
+        self.assertEqual((response.status_code, b''.join(response.streaming_content)), (200, b'0123456789'))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        response = self._get(Range='bytes=2-4')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'234')
+        self.assertEqual(response['Content-Range'], 'bytes 2-4/10')
+
+        response = self._get(Range='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+
+        self.assertEqual(self._get(Range='bytes=20-').status_code, 416)
+        # If-Range قدیمی: کل فایل
+        self.assertEqual(self._get(Range='bytes=2-4', If_Range='"stale"').status_code, 200)
+
+    def test_conditional_requests(self):
+        response = self._get()
+        response.close()
+        self.assertEqual(self._get(If_None_Match=response['ETag']).status_code, 304)
+        self.assertEqual(self._get(If_Modified_Since=response['Last-Modified']).status_code, 304)
+
+    def test_rejects_paths_outside_root(self):
+        with self.assertRaises(Http404):
+            serve_file(self.factory.get('/'), self.root, '../etc/passwd')
+
+    @override_settings(FILE_DELIVERY_BACKEND='nginx')
+    def test_accel_redirect(self):
+        response = serve_file(self.factory.get('/'), self.root, 'notes.txt', accel_prefix='/protected/media/')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/media/notes.txt')
+        self.assertEqual(response.content, b'')
+
+    @override_settings(FILE_DELIVERY_BACKEND='sendfile')
+    def test_sendfile(self):
+        response = self._get()
+        self.assertEqual(response['X-Sendfile'], os.path.join(os.path.abspath(self.root), 'notes.txt'))
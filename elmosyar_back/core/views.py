@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.views.decorators.http import require_safe
+
+from .files import serve_file
+
+
+@require_safe
+def serve_media(request, path):
+    """Files under MEDIA_ROOT, through the file-delivery layer"""
+    # نام blobها (posts.storage) از محتوا ساخته می‌شود و هرگز تغییر نمی‌کند
+    cache_control = 'public, max-age=31536000, immutable' if path.startswith('blobs/') else None
+    return serve_file(
+        request, settings.MEDIA_ROOT, path,
+        accel_prefix=settings.MEDIA_ACCEL_PREFIX,
+        cache_control=cache_control,
+    )
@@ -6,9 +6,10 @@ from django.shortcuts import get_object_or_404
 from django.db import transaction
 
 from posts.models import Post
+from posts.counters import adjust_counters
 from .models import Reaction, Comment
 from .serializers import CommentSerializer
-from notifications.models import Notification
+from notifications.dispatch import NotificationBatch, notify
 
 import settings
 
@@ -36,28 +37,29 @@ def _handle_post_reaction(request, post_id, reaction_type):
             
             existing_reaction = Reaction.objects.filter(user=request.user, post=post).first()
             
+            counter_field = f'{reaction_type}s_count'
+            
             if existing_reaction and existing_reaction.reaction == reaction_type:
                 # Remove reaction
                 existing_reaction.delete()
+                adjust_counters(post.id, **{counter_field: -1})
                 action = f'un{reaction_type}d'
                 user_reaction = None
                 log_info(f"User removed {reaction_type} from post {post_id}", request)
             else:
                 # Add/change reaction
+                deltas = {counter_field: 1}
                 if existing_reaction:
                     existing_reaction.delete()
+                    deltas[f'{existing_reaction.reaction}s_count'] = -1
                 
                 Reaction.objects.create(user=request.user, post=post, reaction=reaction_type)
+                adjust_counters(post.id, **deltas)
                 
                 # Create notification for like (not for dislike)
-                if reaction_type == 'like' and post.author != request.user:
-                    Notification.objects.create(
-                        recipient=post.author,
-                        sender=request.user,
-                        notif_type='like',
-                        post=post,
-                        message=f'{request.user.username} liked your post'
-                    )
+                if reaction_type == 'like':
+                    notify(request.user, post.author, 'like', post=post,
+                           message=f'{request.user.username} liked your post')
                 
                 action = f'{reaction_type}d'
                 user_reaction = reaction_type
@@ -66,14 +68,13 @@ def _handle_post_reaction(request, post_id, reaction_type):
                 })
             
             # Get updated counts
-            likes_count = post.reactions.filter(reaction='like').count()
-            dislikes_count = post.reactions.filter(reaction='dislike').count()
+            post.refresh_from_db(fields=['likes_count', 'dislikes_count'])
             
             return {
                 'success': True,
                 'message': action.capitalize(),
-                'likes_count': likes_count,
-                'dislikes_count': dislikes_count,
+                'likes_count': post.likes_count,
+                'dislikes_count': post.dislikes_count,
                 'user_reaction': user_reaction
             }, status.HTTP_200_OK
             
@@ -139,28 +140,17 @@ def post_comment(request, post_id):
                 content=content,
                 parent=parent
             )
+            adjust_counters(post.id, comments_count=1)
             
-            # Create notification
-            if post.author != request.user:
-                Notification.objects.create(
-                    recipient=post.author,
-                    sender=request.user,
-                    notif_type='comment',
-                    post=post,
-                    comment=comment,
-                    message=f'{request.user.username} commented on your post'
-                )
-            
-            # If comment is a reply to another comment
-            if parent and parent.user != request.user:
-                Notification.objects.create(
-                    recipient=parent.user,
-                    sender=request.user,
-                    notif_type='reply',
-                    post=post,
-                    comment=comment,
-                    message=f'{request.user.username} replied to your comment'
-                )
+            # Create notifications (author and replied-to user, one INSERT)
+            with NotificationBatch(request.user) as notifications:
+                notifications.add(post.author, 'comment', post=post, comment=comment,
+                                  message=f'{request.user.username} commented on your post')
+                
+                # If comment is a reply to another comment
+                if parent:
+                    notifications.add(parent.user, 'reply', post=post, comment=comment,
+                                      message=f'{request.user.username} replied to your comment')
             
             log_info(f"User commented on post {post_id}", request, {
                 'post_id': post_id,
@@ -170,11 +160,12 @@ def post_comment(request, post_id):
             })
             
             serializer = CommentSerializer(comment, context={'request': request})
+            post.refresh_from_db(fields=['comments_count'])
             
             return Response({
                 'success': True,
                 'comment': serializer.data,
-                'comments_count': post.comments.count()
+                'comments_count': post.comments_count
             }, status=status.HTTP_201_CREATED)
     except Exception as e:
         log_error(f"Comment creation failed: {str(e)}", request, {'post_id': post_id})
@@ -218,15 +209,9 @@ def _handle_comment_reaction(request, comment_id, reaction_type):
                 action = f'{reaction_type}d'
                 
                 # Create notification
-                if comment.user != request.user:
-                    notif_type = 'like_comment' if reaction_type == 'like' else 'dislike_comment'
-                    Notification.objects.create(
-                        recipient=comment.user,
-                        sender=request.user,
-                        notif_type=notif_type,
-                        comment=comment,
-                        message=f'{request.user.username} {reaction_type}d your comment'
-                    )
+                notif_type = 'like_comment' if reaction_type == 'like' else 'dislike_comment'
+                notify(request.user, comment.user, notif_type, comment=comment,
+                       message=f'{request.user.username} {reaction_type}d your comment')
                 log_info(f"User {reaction_type}d comment {comment_id}", request, {
                     'comment_author': comment.user.username
                 })
@@ -289,8 +274,10 @@ def delete_comment(request, comment_id):
                     'message': 'You can only delete your own comments'
                 }, status=status.HTTP_403_FORBIDDEN)
             
-            post_id = comment.post.id
-            comment.delete()
+            post_id = comment.post_id
+            # حذف کامنت پاسخ‌هایش را هم cascade می‌کند
+            _, deleted = comment.delete()
+            adjust_counters(post_id, comments_count=-deleted.get(Comment._meta.label, 0))
             
             log_audit(f"User deleted comment {comment_id}", request, {
                 'comment_id': comment_id,
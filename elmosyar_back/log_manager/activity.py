@@ -0,0 +1,155 @@
+"""
+ایندکس فعالیت هر کاربر در application.log
+
+While the ``app`` file handler writes a line for an authenticated request,
+it appends a fixed-size ``(timestamp, inode, offset)`` record to the
+user's own index file. ``get_my_activity_logs`` then pages through that
+file from the end and seeks straight to the referenced lines, instead of
+scanning the whole log for the username.
+"""
+import os
+import shutil
+import struct
+from datetime import datetime
+
+from django.conf import settings
+
+from .reader import line_timestamp
+
+
+RECORD = struct.Struct('<dQQ')
+
+
+def _first_timestamp(path, max_lines=10):
+    """Epoch seconds of the first timestamped line of a log file, 0 if none is found"""
+    with open(path, 'rb') as f:
+        for _ in range(max_lines):
+            raw = f.readline()
+            if not raw:
+                break
+            timestamp = line_timestamp(raw[:60].decode('utf-8', errors='replace'))
+            if timestamp:
+                return datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S').timestamp()
+    return 0
+
+
+def log_files(path):
+    """
+    ``{inode: (path, first timestamp)}`` for a log file and its rotated
+    backups (``.1``, ``.2``, ...)
+    """
+    files = {}
+    candidates = [path]
+    n = 1
+    while os.path.exists(f'{path}.{n}'):
+        candidates.append(f'{path}.{n}')
+        n += 1
+    for candidate in candidates:
+        try:
+            files[os.stat(candidate).st_ino] = (candidate, _first_timestamp(candidate))
+        except FileNotFoundError:
+            pass
+    return files
+
+
+def _is_live(files, timestamp, inode):
+    # فایل حذف‌شده ممکن است inodeش را به فایل جدید داده باشد؛ رکوردی که
+    # از اولین سطر فایل فعلی قدیمی‌تر است به نسل قبلی آن inode تعلق دارد
+    return inode in files and int(timestamp) >= files[inode][1]
+
+
+class ActivityIndex:
+    """
+    One append-only file of ``RECORD`` entries per user, sharded by user id
+    under ``root``. Entries are written in log order, so the newest are at
+    the end and entries pointing into rotated-away files form a prefix.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def path_for(self, user_id):
+        return os.path.join(self.root, f'{user_id % 256:02x}', f'{user_id}.bin')
+
+    def append(self, entries):
+        """``entries``: iterable of ``(user_id, timestamp, inode, offset)``"""
+        by_user = {}
+        for user_id, timestamp, inode, offset in entries:
+            by_user.setdefault(user_id, []).append(RECORD.pack(timestamp, inode, offset))
+
+        for user_id, records in by_user.items():
+            path = self.path_for(user_id)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # یک write با O_APPEND؛ رکوردهای دو پروسس در هم نمی‌روند
+            with open(path, 'ab') as f:
+                f.write(b''.join(records))
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _first_live(self, f, count, files):
+        """Index of the first record whose file still exists (binary search over the dead prefix)"""
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            f.seek(mid * RECORD.size)
+            timestamp, inode, _ = RECORD.unpack(f.read(RECORD.size))
+            if _is_live(files, timestamp, inode):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def read_page(self, user_id, log_path, page, per_page, matches=None):
+        """
+        صفحه‌ی ``page`` از سطرهای کاربر، جدیدترین اول
+
+        Returns ``(lines, total, stale)``. ``total`` counts the entries whose
+        log file still exists. ``matches(line)`` guards against stale offsets
+        (a cleared file, a reused inode); lines failing it are left out and
+        counted in ``stale``, so the caller can report that the index needs
+        ``rebuild_activity_index``.
+        """
+        path = self.path_for(user_id)
+        if not os.path.exists(path):
+            return [], 0, 0
+
+        files = log_files(log_path)
+        handles = {}
+        lines = []
+        stale = 0
+        try:
+            with open(path, 'rb') as f:
+                count = os.fstat(f.fileno()).st_size // RECORD.size
+                first = self._first_live(f, count, files)
+                total = count - first
+
+                end = count - (page - 1) * per_page
+                start = max(end - per_page, first)
+                if end <= start:
+                    return [], total, 0
+                f.seek(start * RECORD.size)
+                block = f.read((end - start) * RECORD.size)
+
+            for i in range(end - start - 1, -1, -1):
+                timestamp, inode, offset = RECORD.unpack_from(block, i * RECORD.size)
+                if not _is_live(files, timestamp, inode):
+                    continue
+                if inode not in handles:
+                    handles[inode] = open(files[inode][0], 'rb')
+                log = handles[inode]
+                log.seek(offset)
+                line = log.readline().decode('utf-8', errors='replace').strip()
+                if line and (matches is None or matches(line)):
+                    lines.append(line)
+                else:
+                    stale += 1
+        finally:
+            for handle in handles.values():
+                handle.close()
+        return lines, total, stale
+
+
+activity_index = ActivityIndex(os.path.join(
+    getattr(settings, 'LOG_DIR', os.path.join(settings.BASE_DIR, 'logs')), '.index', 'activity'
+))
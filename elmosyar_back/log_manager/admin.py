@@ -6,17 +6,21 @@ from django.conf import settings
 from django.utils.html import format_html
 from django.urls import path
 from django.shortcuts import render
-from django.http import HttpResponse, JsonResponse
-from django.core.paginator import Paginator
+from django.http import JsonResponse
 from django.contrib.admin.views.decorators import staff_member_required
 from django.views.generic import View
 from django.utils.decorators import method_decorator
 
+from core.files import serve_file
 from .log_config import log_audit
+from .reader import make_line_filter, read_log_page
+from .aggregator import top_users
+from .activity import activity_index
 from .views import (
     _parse_log_line, 
     _highlight_log_line, 
-    _human_readable_size
+    _human_readable_size,
+    _log_rollups,
 )
 
 
@@ -123,71 +127,21 @@ class LogViewerView(View):
             }
             return render(request, 'admin/log_manager/log_viewer.html', context)
         
-        # خواندن و فیلتر لاگ‌ها
-        logs = []
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                
-                # پارس کردن خط
-                log_entry = _parse_log_line(line)
-                
-                # اعمال فیلترها
-                include = True
-                
-                if level and log_entry.get('level') != level.upper():
-                    include = False
-                
-                if user_filter and user_filter not in log_entry.get('user', ''):
-                    include = False
-                
-                if ip_filter and ip_filter not in log_entry.get('ip', ''):
-                    include = False
-                
-                if search_text and search_text.lower() not in line.lower():
-                    include = False
-                
-                if date_from and log_entry.get('timestamp'):
-                    try:
-                        log_date = datetime.strptime(log_entry['timestamp'], '%Y-%m-%d %H:%M:%S')
-                        filter_date = datetime.strptime(date_from, '%Y-%m-%d')
-                        if log_date.date() < filter_date.date():
-                            include = False
-                    except:
-                        pass
-                
-                if date_to and log_entry.get('timestamp'):
-                    try:
-                        log_date = datetime.strptime(log_entry['timestamp'], '%Y-%m-%d %H:%M:%S')
-                        filter_date = datetime.strptime(date_to, '%Y-%m-%d')
-                        if log_date.date() > filter_date.date():
-                            include = False
-                    except:
-                        pass
-                
-                if include:
-                    logs.append({
-                        'raw': line,
-                        'parsed': log_entry,
-                        'highlight': _highlight_log_line(line)
-                    })
-        
-        # معکوس کردن (جدیدترین اول)
-        logs.reverse()
-        
-        # صفحه‌بندی
-        paginator = Paginator(logs, per_page)
-        try:
-            page_obj = paginator.page(page)
-        except:
-            page_obj = paginator.page(1)
+        # خواندن از انتهای فایل تا پر شدن صفحه
+        line_filter = make_line_filter(
+            level=level, user=user_filter, ip=ip_filter,
+            search=search_text, date_from=date_from, date_to=date_to
+        )
+        page_obj, window = read_log_page(
+            file_path, _parse_log_line, page=page, per_page=per_page,
+            line_filter=line_filter, date_from=date_from, date_to=date_to
+        )
+        page_obj.object_list = [_highlight_log_line(line) for line, _ in page_obj]
         
         # آمار
         level_stats = {}
-        for log in logs[:1000]:
-            level = log['parsed'].get('level', 'UNKNOWN')
+        for _, entry in window:
+            level = entry.get('level', 'UNKNOWN')
             level_stats[level] = level_stats.get(level, 0) + 1
         
         # لاگ کردن دسترسی
@@ -207,7 +161,7 @@ class LogViewerView(View):
             'logs': page_obj,
             'level_stats': level_stats,
             'file_size': _human_readable_size(os.path.getsize(file_path)),
-            'total_logs': len(logs),
+            'total_logs': page_obj.count,
             
             # فیلترهای فعال
             'filters': {
@@ -249,10 +203,12 @@ class DownloadLogView(View):
             request
         )
         
-        with open(file_path, 'rb') as f:
-            response = HttpResponse(f.read(), content_type='text/plain; charset=utf-8')
-            response['Content-Disposition'] = f'attachment; filename="{log_file}"'
-            return response
+        return serve_file(
+            request, log_dir, log_file,
+            content_type='text/plain; charset=utf-8',
+            as_attachment=True,
+            accel_prefix=settings.LOG_ACCEL_PREFIX,
+        )
 
 
 @method_decorator(staff_member_required, name='dispatch')
@@ -274,6 +230,9 @@ class ClearLogView(View):
         try:
             with open(file_path, 'w', encoding='utf-8') as f:
                 f.write(f"# Log file cleared by {request.user.username} at {datetime.now()}\n")
+            if log_file == 'application.log':
+                # offsetهای ایندکس فعالیت دیگر معتبر نیستند
+                activity_index.clear()
             
             # لاگ کردن عملیات
             log_audit(
@@ -316,58 +275,17 @@ class LogStatisticsView(View):
                     'modified': datetime.fromtimestamp(stat.st_mtime),
                 })
         
-        # تحلیل application.log
+        # تحلیل application.log از rollupهای افزایشی
         app_log = os.path.join(log_dir, 'application.log')
         if os.path.exists(app_log):
-            with open(app_log, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    
-                    entry = _parse_log_line(line)
-                    
-                    # توزیع سطح
-                    level = entry.get('level', 'UNKNOWN')
-                    statistics['level_distribution'][level] = \
-                        statistics['level_distribution'].get(level, 0) + 1
-                    
-                    # فعالیت کاربران
-                    user = entry.get('user', 'anonymous')
-                    statistics['user_activity'][user] = \
-                        statistics['user_activity'].get(user, 0) + 1
-                    
-                    # فعالیت ساعتی
-                    timestamp = entry.get('timestamp', '')
-                    if timestamp:
-                        try:
-                            hour = timestamp.split()[1].split(':')[0]
-                            statistics['hourly_activity'][hour] = \
-                                statistics['hourly_activity'].get(hour, 0) + 1
-                            
-                            date = timestamp.split()[0]
-                            statistics['daily_activity'][date] = \
-                                statistics['daily_activity'].get(date, 0) + 1
-                        except:
-                            pass
-                    
-                    # خطاهای اخیر
-                    if level in ['ERROR', 'CRITICAL']:
-                        statistics['recent_errors'].append({
-                            'timestamp': timestamp,
-                            'level': level,
-                            'user': user,
-                            'message': entry.get('message', line)[:100]
-                        })
-        
-        # محدود کردن خطاها به 20 مورد اخیر
-        statistics['recent_errors'] = statistics['recent_errors'][-20:]
-        
-        # مرتب سازی کاربران فعال
-        statistics['user_activity'] = dict(
-            sorted(statistics['user_activity'].items(), 
-                   key=lambda x: x[1], reverse=True)[:15]
-        )
+            rollups = _log_rollups(app_log)
+            statistics.update({
+                'level_distribution': rollups['levels'],
+                'user_activity': top_users(rollups, 15),
+                'hourly_activity': rollups['hourly'],
+                'daily_activity': rollups['daily'],
+                'recent_errors': rollups['recent_errors'][-20:],
+            })
         
         # لاگ کردن دسترسی
         log_audit(
@@ -0,0 +1,219 @@
+"""
+آمار تجمعی لاگ‌ها که به صورت افزایشی به‌روز می‌شود
+
+The statistics pages used to re-read the whole log on every load. The
+aggregator instead remembers how far it has read (byte offset and inode)
+and folds only the new lines into the stored rollups: level distribution,
+user activity, hourly and daily histograms and the most recent errors.
+Rollups and checkpoint live together in ``<log dir>/.index/<file>.stats.json``.
+"""
+import json
+import os
+import time
+from datetime import datetime
+
+
+RECENT_ERRORS = 20
+# بایت‌های ابتدای فایل که همراه inode فایل checkpoint را مشخص می‌کنند
+HEAD_BYTES = 64
+# روزهایی که در هیستوگرام روزانه نگه داشته می‌شوند
+DAILY_DAYS = 90
+# کاربران کم‌فعالیت‌تر از این تعداد هنگام ذخیره کنار گذاشته می‌شوند
+MAX_USERS = 1000
+
+
+class LogStatsAggregator:
+    """
+    Incremental rollups of one log file.
+
+    ``refresh()`` reads complete lines from the checkpoint offset onwards.
+    The checkpoint file is identified by its inode and its first bytes,
+    since a deleted file's inode is soon reused. When the log no longer
+    matches it the file was rotated, possibly more than once: the rest of
+    the old file is read from whichever backup (``.1``, ``.2``, ...) now
+    holds it, then every newer backup, before starting the new file at
+    offset 0. If the old file has already been rotated away (or cleared),
+    the backups written since the last refresh are read in full; only the
+    lines of deleted files are missed. A file shorter than the offset was
+    cleared and is read from the start.
+
+    The checkpoint is replaced atomically together with the rollups, so
+    two concurrent refreshes start from the same state and the last one
+    wins without counting lines twice.
+    """
+
+    def __init__(self, path, parse):
+        self.path = path
+        self.parse = parse
+        directory, name = os.path.split(path)
+        self.state_path = os.path.join(directory, '.index', f'{name}.stats.json')
+
+    @staticmethod
+    def empty_state():
+        return {
+            'inode': None,
+            'head': None,
+            'offset': 0,
+            'checked_at': 0,
+            'updated_at': None,
+            'lines': 0,
+            'levels': {},
+            'users': {},
+            'hourly': {str(h).zfill(2): 0 for h in range(24)},
+            'daily': {},
+            'recent_errors': [],
+        }
+
+    def load(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return self.empty_state()
+
+    def save(self, state):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        temp_path = f'{self.state_path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(temp_path, self.state_path)
+
+    def reset(self):
+        self.save(self.empty_state())
+
+    def refresh(self, max_bytes=None):
+        """
+        Fold new lines into the rollups and return them. At most
+        ``max_bytes`` are read per call (None for no limit); the rest is
+        picked up by the next call.
+        """
+        state = self.load()
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return state
+
+        start = (state['inode'], state['offset'])
+        budget = max_bytes
+
+        if state['inode'] is not None and not self._is_checkpoint(self.path, stat.st_ino, state):
+            for rotated, inode in self._unread_backups(state):
+                if not self._is_checkpoint(rotated, inode, state):
+                    state['inode'], state['offset'] = inode, 0
+                read, finished = self._consume(rotated, state, budget)
+                if budget is not None:
+                    budget -= read
+                if not finished or (budget is not None and budget <= 0):
+                    return self._commit(state, start)
+            state['offset'] = 0
+        elif stat.st_size < state['offset']:
+            state['offset'] = 0
+
+        state['inode'] = stat.st_ino
+        self._consume(self.path, state, budget)
+        return self._commit(state, start)
+
+    @staticmethod
+    def _head(path):
+        with open(path, 'rb') as f:
+            return f.read(HEAD_BYTES).hex()
+
+    def _is_checkpoint(self, path, inode, state):
+        # inode فایل حذف‌شده به فایل تازه داده می‌شود؛ ابتدای فایل هم باید بخواند
+        if inode != state['inode']:
+            return False
+        return state.get('head') is None or self._head(path).startswith(state['head'])
+
+    def _unread_backups(self, state):
+        """
+        ``[(path, inode)]`` of the backups not fully read yet, oldest first:
+        the one holding the checkpoint and every newer one. When the
+        checkpoint file is gone (rotated away or cleared), the backups
+        written since the last refresh.
+        """
+        backups = []
+        n = 1
+        while True:
+            rotated = f'{self.path}.{n}'
+            try:
+                backups.append((rotated, os.stat(rotated)))
+            except FileNotFoundError:
+                break
+            n += 1
+
+        for i, (rotated, stat) in enumerate(backups):
+            if self._is_checkpoint(rotated, stat.st_ino, state):
+                backups = backups[:i + 1]
+                break
+        else:
+            backups = [(rotated, stat) for rotated, stat in backups
+                       if stat.st_mtime > state.get('checked_at', 0)]
+        return [(rotated, stat.st_ino) for rotated, stat in reversed(backups)]
+
+    def _commit(self, state, start):
+        if (state['inode'], state['offset']) != start:
+            state['updated_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            state['checked_at'] = time.time()
+            self._trim(state)
+            self.save(state)
+        return state
+
+    def _consume(self, path, state, budget):
+        """Returns ``(bytes read, reached the end of the file)``"""
+        read = 0
+        finished = True
+        with open(path, 'rb') as f:
+            state['head'] = f.read(HEAD_BYTES).hex()
+            f.seek(state['offset'])
+            for raw in f:
+                if not raw.endswith(b'\n'):
+                    # سطر نیمه‌کاره؛ دفعه‌ی بعد کامل خوانده می‌شود
+                    break
+                if budget is not None and read and read + len(raw) > budget:
+                    finished = False
+                    break
+                read += len(raw)
+                line = raw.decode('utf-8', errors='replace').strip()
+                if line:
+                    self._add(state, line)
+        state['offset'] += read
+        return read, finished
+
+    def _add(self, state, line):
+        entry = self.parse(line)
+        state['lines'] += 1
+
+        level = entry.get('level', 'UNKNOWN')
+        state['levels'][level] = state['levels'].get(level, 0) + 1
+
+        user = entry.get('user', 'anonymous')
+        state['users'][user] = state['users'].get(user, 0) + 1
+
+        timestamp = entry.get('timestamp') or ''
+        parts = timestamp.split()
+        if len(parts) == 2:
+            hour = parts[1].split(':')[0]
+            state['hourly'][hour] = state['hourly'].get(hour, 0) + 1
+            state['daily'][parts[0]] = state['daily'].get(parts[0], 0) + 1
+
+        if level in ['ERROR', 'CRITICAL']:
+            state['recent_errors'].append({
+                'timestamp': timestamp,
+                'level': level,
+                'user': user,
+                'message': entry.get('message', line)[:200],
+            })
+            del state['recent_errors'][:-RECENT_ERRORS]
+
+    @staticmethod
+    def _trim(state):
+        days = sorted(state['daily'])
+        for day in days[:-DAILY_DAYS]:
+            del state['daily'][day]
+        if len(state['users']) > MAX_USERS:
+            top = sorted(state['users'].items(), key=lambda x: x[1], reverse=True)[:MAX_USERS]
+            state['users'] = dict(top)
+
+
+def top_users(state, limit):
+    return dict(sorted(state['users'].items(), key=lambda x: x[1], reverse=True)[:limit])
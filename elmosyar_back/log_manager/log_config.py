@@ -1,11 +1,255 @@
+import atexit
+import copy
 import logging
 import logging.handlers
 import os
 import json
+import queue
+import threading
 from datetime import datetime
 from django.conf import settings
 from django.utils import timezone
 
+try:
+    import fcntl
+except ImportError:  # Windows؛ قفل بین پروسه‌ها در دسترس نیست
+    fcntl = None
+
+from .activity import activity_index
+
+
+# ویژگی‌هایی که logging اجازه‌ی بازنویسی آن‌ها از extra را نمی‌دهد
+_RECORD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    هر لاگ یک شیء JSON در یک سطر
+
+    The record carries the full ``log_context`` built by ``AdvancedLogger.log``
+    (user_id, ip, method, path, user_agent and any extra fields), so the log
+    viewers read fields directly instead of matching the text format. Extra
+    fields named like a core field (``level``, ``message``, ...) are kept
+    under ``context`` instead of replacing it.
+    """
+
+    def __init__(self):
+        super().__init__(datefmt='%Y-%m-%d %H:%M:%S')
+
+    def format(self, record):
+        context = dict(getattr(record, 'log_context', None) or {})
+        # زمان رکورد جایگزین timestamp کانتکست می‌شود
+        context.pop('timestamp', None)
+
+        # timestamp اول می‌آید تا ایندکس reader آن را در ابتدای سطر پیدا کند
+        data = {
+            'timestamp': self.formatTime(record, self.datefmt),
+            'level': record.levelname,
+            'logger': record.name,
+            'user': context.pop('user', getattr(record, 'user', 'anonymous')),
+            'user_id': context.pop('user_id', None),
+            'ip': context.pop('ip', getattr(record, 'ip', 'unknown')),
+            'method': context.pop('method', None),
+            'path': context.pop('path', None),
+            'module': record.module,
+            'line': record.lineno,
+            'message': record.getMessage(),
+        }
+        # فیلدهای اصلی رکورد بازنویسی نمی‌شوند؛ کلیدهای هم‌نام زیر "context" می‌روند
+        for key, value in context.items():
+            if key in data:
+                data.setdefault('context', {})[key] = value
+            else:
+                data[key] = value
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # رکوردی که از صف آمده traceback را به صورت متن دارد
+            data['exception'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class BatchRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    ``RotatingFileHandler`` that writes a batch of records under one lock and one flush
+
+    With an ``activity_index`` the byte offset of every line logged for an
+    authenticated user is recorded in that user's index file. Several
+    workers append to the same file, so each batch holds an exclusive
+    ``flock`` on it and offsets are read with ``tell()`` from the end of
+    the file as seen under that lock.
+    """
+
+    def __init__(self, *args, activity_index=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.activity_index = activity_index
+
+    def emit(self, record):
+        try:
+            self._write([record])
+        except Exception:
+            self.handleError(record)
+
+    def handle_batch(self, records):
+        records = [record for record in records if self.filter(record)]
+        if not records:
+            return
+        with self.lock:
+            try:
+                self._write(records)
+            except Exception:
+                self.handleError(records[-1])
+
+    def _lock_stream(self):
+        """Returns the inode of the locked file"""
+        if self.stream is None:
+            self.stream = self._open()
+        if fcntl is not None:
+            fcntl.flock(self.stream.fileno(), fcntl.LOCK_EX)
+        # ممکن است worker دیگری بعد از آخرین نوشتن ما چیزی اضافه کرده باشد
+        self.stream.seek(0, os.SEEK_END)
+        return os.fstat(self.stream.fileno()).st_ino
+
+    def _unlock_stream(self):
+        self.stream.flush()
+        if fcntl is not None:
+            fcntl.flock(self.stream.fileno(), fcntl.LOCK_UN)
+
+    def _write(self, records):
+        entries = []
+        inode = self._lock_stream()
+        try:
+            for record in records:
+                if self.shouldRollover(record):
+                    self._unlock_stream()
+                    self.doRollover()
+                    inode = self._lock_stream()
+                if self.activity_index and getattr(record, 'user_id', None):
+                    entries.append((record.user_id, record.created, inode, self.stream.tell()))
+                self.stream.write(self.format(record) + self.terminator)
+        finally:
+            self._unlock_stream()
+        if entries:
+            self.activity_index.append(entries)
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    صف محدود بین درخواست‌ها و thread نویسنده
+
+    When the queue is full the ``drop`` policy discards the record at once
+    and ``block`` waits up to ``LOG_QUEUE_BLOCK_TIMEOUT`` seconds for room
+    before discarding it. Discarded records are counted per logger.
+    """
+
+    def __init__(self, log_queue, policy, timeout, counters):
+        super().__init__(log_queue)
+        self.policy = policy
+        self.timeout = timeout
+        self.counters = counters
+
+    def prepare(self, record):
+        # فقط داده‌ی ساده به thread دیگر می‌رود؛ args و exc_info همین‌جا به متن تبدیل می‌شوند
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            if self.policy == 'block':
+                self.queue.put(record, timeout=self.timeout)
+            else:
+                self.queue.put_nowait(record)
+            self.counters.count('enqueued')
+        except queue.Full:
+            self.counters.count('dropped', record.name)
+
+
+class LogQueueCounters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {'enqueued': 0, 'dropped': 0, 'written': 0, 'batches': 0}
+        self.dropped_by_logger = {}
+
+    def count(self, event, logger_name=None, n=1):
+        with self._lock:
+            self.counters[event] += n
+            if event == 'dropped':
+                self.dropped_by_logger[logger_name] = self.dropped_by_logger.get(logger_name, 0) + n
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counters, dropped_by_logger=dict(self.dropped_by_logger))
+
+
+class BatchQueueListener:
+    """
+    یک thread که صف لاگ را در دسته‌های حداکثر ``batch_size`` تایی روی دیسک می‌نویسد
+
+    Records are routed to the handlers registered for their logger name.
+    File handlers receive the whole batch at once (``handle_batch``), the
+    others record by record.
+    """
+
+    _SENTINEL = None
+
+    def __init__(self, log_queue, batch_size, counters):
+        self.queue = log_queue
+        self.batch_size = batch_size
+        self.counters = counters
+        self.handlers = {}
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='log-queue-listener', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """بقیه‌ی صف را می‌نویسد و thread را متوقف می‌کند"""
+        if self._thread is None:
+            return
+        self.queue.put(self._SENTINEL)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stopping = self._SENTINEL in batch
+            self.write([record for record in batch if record is not self._SENTINEL])
+            if stopping:
+                return
+
+    def write(self, records):
+        if not records:
+            return
+        by_logger = {}
+        for record in records:
+            by_logger.setdefault(record.name, []).append(record)
+
+        for name, group in by_logger.items():
+            for handler in self.handlers.get(name, ()):
+                if isinstance(handler, BatchRotatingFileHandler):
+                    handler.handle_batch([r for r in group if r.levelno >= handler.level])
+                else:
+                    for record in group:
+                        if record.levelno >= handler.level:
+                            handler.handle(record)
+        self.counters.count('written', n=len(records))
+        self.counters.count('batches')
+
+
 class AdvancedLogger:
     """
     سیستم لاگینگ پیشرفته
@@ -13,7 +257,19 @@ class AdvancedLogger:
     
     def __init__(self):
         self.log_dir = self._get_log_directory()
+        self.listener = None
+        self.queue_counters = LogQueueCounters()
+        if getattr(settings, 'LOG_QUEUE_ENABLED', False):
+            # حالت صف: درخواست فقط رکورد را در صف می‌گذارد و یک thread روی دیسک می‌نویسد
+            self.listener = BatchQueueListener(
+                queue.Queue(maxsize=settings.LOG_QUEUE_SIZE),
+                settings.LOG_QUEUE_BATCH_SIZE,
+                self.queue_counters,
+            )
         self.setup_loggers()
+        if self.listener:
+            self.listener.start()
+            atexit.register(self.listener.stop)
     
     def _get_log_directory(self):
         log_dir = getattr(settings, 'LOG_DIR', None)
@@ -32,6 +288,9 @@ class AdvancedLogger:
             '📁 %(module)s:%(lineno)d | 📝 %(message)s',
             datefmt='%Y-%m-%d %H:%M:%S'
         )
+        self.console_formatter = detailed_formatter
+        if getattr(settings, 'LOG_FORMAT', 'text') == 'json':
+            detailed_formatter = JsonLinesFormatter()
         
         # لاگر اصلی اپلیکیشن
         self._setup_logger(
@@ -40,7 +299,8 @@ class AdvancedLogger:
             level=logging.DEBUG if settings.DEBUG else logging.INFO,
             formatter=detailed_formatter,
             max_bytes=10 * 1024 * 1024,
-            backup_count=10
+            backup_count=10,
+            activity_index=activity_index
         )
         
         # لاگر API
@@ -83,7 +343,7 @@ class AdvancedLogger:
             backup_count=30
         )
     
-    def _setup_logger(self, name, filename, level, formatter, max_bytes, backup_count):
+    def _setup_logger(self, name, filename, level, formatter, max_bytes, backup_count, activity_index=None):
         """تنظیم یک لاگر خاص"""
         logger = logging.getLogger(name)
         logger.setLevel(level)
@@ -93,11 +353,12 @@ class AdvancedLogger:
             logger.handlers.clear()
         
         file_path = os.path.join(self.log_dir, filename)
-        file_handler = logging.handlers.RotatingFileHandler(
+        file_handler = BatchRotatingFileHandler(
             filename=file_path,
             maxBytes=max_bytes,
             backupCount=backup_count,
-            encoding='utf-8'
+            encoding='utf-8',
+            activity_index=activity_index
         )
         file_handler.setLevel(level)
         file_handler.setFormatter(formatter)
@@ -106,8 +367,29 @@ class AdvancedLogger:
         if settings.DEBUG:
             console_handler = logging.StreamHandler()
             console_handler.setLevel(level)
-            console_handler.setFormatter(formatter)
+            console_handler.setFormatter(self.console_formatter)
             logger.addHandler(console_handler)
+        
+        if self.listener:
+            # هندلرهای واقعی به listener می‌روند و لاگر فقط در صف می‌نویسد
+            self.listener.handlers[name] = list(logger.handlers)
+            logger.handlers = [BoundedQueueHandler(
+                self.listener.queue,
+                settings.LOG_QUEUE_POLICY,
+                settings.LOG_QUEUE_BLOCK_TIMEOUT,
+                self.queue_counters,
+            )]
+    
+    def queue_stats(self):
+        """شمارنده‌های صف لاگ (None در حالت همزمان)"""
+        if not self.listener:
+            return None
+        return dict(
+            self.queue_counters.snapshot(),
+            pending=self.listener.queue.qsize(),
+            capacity=self.listener.queue.maxsize,
+            policy=settings.LOG_QUEUE_POLICY,
+        )
     
     def log(self, logger_name, level, message, request=None, extra_data=None):
         """ثبت لاگ با کانتکست کامل"""
@@ -159,7 +441,11 @@ class AdvancedLogger:
             'critical': logger.critical
         }.get(level.lower(), logger.info)
         
-        log_method(full_message, extra=log_context)
+        # log_context کامل برای JsonLinesFormatter؛ stacklevel=3 محل فراخوانی
+        # log_info و بقیه‌ی توابع کمکی را به‌جای همین فایل ثبت می‌کند
+        # کلیدهای هم‌نام با ویژگی‌های LogRecord (filename، message، ...) فقط در log_context می‌مانند
+        record_extra = {key: value for key, value in log_context.items() if key not in _RECORD_ATTRS}
+        log_method(full_message, extra={**record_extra, 'log_context': log_context}, stacklevel=3)
 
 
 # ایجاد نمونه اصلی
@@ -0,0 +1,44 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from log_manager.aggregator import LogStatsAggregator
+from log_manager.views import _parse_log_line
+
+
+class Command(BaseCommand):
+    help = 'Fold new log lines into the incremental statistics rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', action='append',
+                            help='Log file name inside LOG_DIR (may be repeated, default application.log)')
+        parser.add_argument('--reset', action='store_true',
+                            help='Discard the stored rollups and checkpoint and start over')
+        parser.add_argument('--follow', action='store_true',
+                            help='Keep tailing the files instead of exiting')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='Seconds between refreshes with --follow')
+
+    def handle(self, *args, **options):
+        aggregators = [
+            LogStatsAggregator(os.path.join(settings.LOG_DIR, name), _parse_log_line)
+            for name in options['file'] or ['application.log']
+        ]
+        if options['reset']:
+            for aggregator in aggregators:
+                aggregator.reset()
+
+        while True:
+            for aggregator in aggregators:
+                before = aggregator.load()['lines']
+                state = aggregator.refresh()
+                if state['lines'] != before or not options['follow']:
+                    self.stdout.write(
+                        f"{os.path.basename(aggregator.path)}: {state['lines'] - before} new lines, "
+                        f"{state['lines']} total, offset {state['offset']}"
+                    )
+            if not options['follow']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,63 @@
+import os
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from log_manager.activity import activity_index, log_files
+from log_manager.views import _parse_log_line
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the per-user activity index from application.log and its backups. '
+            'Lines written while it runs may be indexed twice, so run it when traffic is low.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Number of index entries written per batch')
+
+    def handle(self, *args, **options):
+        log_path = os.path.join(settings.LOG_DIR, 'application.log')
+        # قدیمی‌ترین فایل اول تا ترتیب رکوردها مثل زمان نوشتن باشد
+        files = sorted(log_files(log_path).items(), key=lambda item: item[1][1])
+        self.user_ids = {}
+
+        activity_index.clear()
+        indexed = 0
+        for inode, (path, _) in files:
+            batch = []
+            offset = 0
+            with open(path, 'rb') as f:
+                for raw in f:
+                    entry = _parse_log_line(raw.decode('utf-8', errors='replace').strip())
+                    user_id = self._user_id(entry)
+                    if user_id:
+                        batch.append((user_id, self._timestamp(entry), inode, offset))
+                    offset += len(raw)
+                    if len(batch) >= options['batch_size']:
+                        activity_index.append(batch)
+                        indexed += len(batch)
+                        batch = []
+            activity_index.append(batch)
+            indexed += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} lines from {len(files)} files'))
+
+    def _user_id(self, entry):
+        if 'user_id' in entry:
+            return entry['user_id']
+        username = entry.get('user')
+        if not username or username == 'anonymous':
+            return None
+        if username not in self.user_ids:
+            self.user_ids[username] = (get_user_model().objects.filter(username=username)
+                                       .values_list('id', flat=True).first())
+        return self.user_ids[username]
+
+    @staticmethod
+    def _timestamp(entry):
+        try:
+            return datetime.strptime(entry.get('timestamp', ''), '%Y-%m-%d %H:%M:%S').timestamp()
+        except ValueError:
+            return 0.0
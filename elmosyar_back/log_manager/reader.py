@@ -0,0 +1,295 @@
+"""
+خواندن فایل‌های لاگ از انتها به ابتدا با ایندکس زمانی
+
+Log viewers only ever want the newest matching lines, so instead of
+parsing whole files they walk them backwards in fixed-size blocks and stop
+as soon as a page is filled. A sparse index of (timestamp, byte offset)
+pairs per file, kept next to the logs, narrows ``date_from`` / ``date_to``
+filters to the byte range that can contain matching lines.
+"""
+import json
+import os
+import re
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from itertools import islice
+
+
+BLOCK_SIZE = 64 * 1024
+# فاصله‌ی تقریبی بین دو نقطه‌ی ایندکس
+INDEX_STRIDE = 256 * 1024
+# تعداد سطرهایی که آمار سطح و کاربر از آن‌ها ساخته می‌شود
+STATS_WINDOW = 1000
+
+_TIMESTAMP = re.compile(r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})')
+
+
+def line_timestamp(line):
+    """``YYYY-MM-DD HH:MM:SS`` at the start of a log line, or None (tracebacks, continuations)"""
+    match = _TIMESTAMP.search(line[:40])
+    return match.group(1) if match else None
+
+
+# ════════════════════════════════════════════════════════════
+# Reverse reading
+# ════════════════════════════════════════════════════════════
+
+def iter_lines_reverse(path, start=0, end=None, block_size=BLOCK_SIZE):
+    """
+    Yield ``(offset, line)`` for the lines in ``[start, end)``, last line first.
+
+    The file is read backwards one block at a time, so the cost depends on
+    how many lines the caller consumes, not on the size of the file.
+    ``start`` and ``end`` should be line boundaries.
+    """
+    with open(path, 'rb') as f:
+        if end is None:
+            f.seek(0, os.SEEK_END)
+            end = f.tell()
+
+        position = end
+        remainder = b''
+        while position > start:
+            read_size = min(block_size, position - start)
+            position -= read_size
+            f.seek(position)
+            block = f.read(read_size) + remainder
+
+            lines = block.split(b'\n')
+            # اولین تکه ممکن است نیمه‌ی یک سطر باشد؛ با بلوک قبلی کامل می‌شود
+            remainder = lines[0]
+            cursor = position + len(block)
+            for raw in reversed(lines[1:]):
+                cursor -= len(raw)
+                if raw.strip():
+                    yield cursor, raw.decode('utf-8', errors='replace').strip()
+                cursor -= 1
+
+        if remainder.strip():
+            yield start, remainder.decode('utf-8', errors='replace').strip()
+
+
+# ════════════════════════════════════════════════════════════
+# Sparse offset index
+# ════════════════════════════════════════════════════════════
+
+class LogIndex:
+    """
+    Sparse ``timestamp -> byte offset`` index of one log file.
+
+    Every ``INDEX_STRIDE`` bytes the first timestamped line is recorded.
+    The index is stored as JSON in ``<log dir>/.index/<file>.json`` and
+    extended incrementally as the file grows. It is rebuilt from scratch
+    when the inode changes or the file shrinks (rotation, clearing).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory, name = os.path.split(path)
+        self.index_path = os.path.join(directory, '.index', f'{name}.json')
+        self.entries = []
+
+    def _load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, data):
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        temp_path = f'{self.index_path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temp_path, self.index_path)
+
+    def refresh(self):
+        """Bring the index up to date with the file and return ``self``"""
+        stat = os.stat(self.path)
+        data = self._load()
+        if not data or data.get('inode') != stat.st_ino or data.get('size', 0) > stat.st_size:
+            data = {'inode': stat.st_ino, 'size': 0, 'next': 0, 'entries': []}
+
+        if data['size'] < stat.st_size:
+            self._extend(data, stat.st_size)
+            self._save(data)
+
+        self.entries = data['entries']
+        return self
+
+    def _extend(self, data, size):
+        entries = data['entries']
+        next_mark = data['next']
+        with open(self.path, 'rb') as f:
+            f.seek(data['size'])
+            offset = data['size']
+            for raw in f:
+                if offset >= size:
+                    break
+                if offset >= next_mark:
+                    timestamp = line_timestamp(raw[:60].decode('utf-8', errors='replace'))
+                    if timestamp:
+                        entries.append([timestamp, offset])
+                        next_mark = offset + INDEX_STRIDE
+                if raw.endswith(b'\n'):
+                    offset += len(raw)
+                else:
+                    # سطر نیمه‌کاره؛ دفعه‌ی بعد از ابتدای آن ادامه می‌دهیم
+                    break
+        data['size'] = offset
+        data['next'] = next_mark
+
+    def byte_range(self, date_from=None, date_to=None):
+        """
+        ``(start, end)`` byte offsets that contain every line between the
+        two dates (``YYYY-MM-DD``, inclusive). ``end`` is None for the end
+        of the file.
+        """
+        timestamps = [entry[0] for entry in self.entries]
+        start, end = 0, None
+        if date_from:
+            # آخرین نقطه‌ای که قبل از date_from است
+            i = bisect_left(timestamps, date_from) - 1
+            if i >= 0:
+                start = self.entries[i][1]
+        if date_to:
+            next_day = (datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+            # اولین نقطه‌ای که بعد از پایان date_to است
+            i = bisect_right(timestamps, next_day)
+            if i < len(self.entries):
+                end = self.entries[i][1]
+        return start, end
+
+
+# ════════════════════════════════════════════════════════════
+# Filtering and pages
+# ════════════════════════════════════════════════════════════
+
+def _valid_date(value):
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+        return value
+    except (TypeError, ValueError):
+        return None
+
+
+def make_line_filter(level=None, user=None, ip=None, search=None, date_from=None, date_to=None):
+    """
+    Predicate over ``(line, entry)`` matching the filters of the log viewers,
+    where ``entry`` is the parsed line. Its ``reject(line)`` attribute drops
+    most non-matching lines before they are parsed.
+    """
+    level = level.upper() if level else None
+    search = search.lower() if search else None
+    date_from, date_to = _valid_date(date_from), _valid_date(date_to)
+
+    def reject(line):
+        # رد سریع قبل از پارس: مقدار فیلدی که در کل سطر نیست در خود فیلد هم نیست
+        if line.startswith('{'):
+            if level and f'"level": "{level}"' not in line:
+                return True
+        elif level and level not in line:
+            return True
+        if user and user not in line:
+            return True
+        if ip and ip not in line:
+            return True
+        return bool(search) and search not in line.lower()
+
+    def matches(line, entry):
+        if level and entry.get('level') != level:
+            return False
+        if user and user not in entry.get('user', ''):
+            return False
+        if ip and ip not in entry.get('ip', ''):
+            return False
+        if search and search not in line.lower():
+            return False
+        timestamp = entry.get('timestamp') or ''
+        if date_from and timestamp and timestamp[:10] < date_from:
+            return False
+        if date_to and timestamp and timestamp[:10] > date_to:
+            return False
+        return True
+
+    matches.reject = reject
+    return matches
+
+
+def iter_entries(path, parse, line_filter=None, date_from=None, date_to=None):
+    """Yield ``(line, entry)`` newest first, reading only the indexed date range"""
+    date_from, date_to = _valid_date(date_from), _valid_date(date_to)
+    start, end = 0, None
+    if date_from or date_to:
+        start, end = LogIndex(path).refresh().byte_range(date_from, date_to)
+
+    reject = getattr(line_filter, 'reject', None)
+    for _, line in iter_lines_reverse(path, start, end):
+        if reject is not None and reject(line):
+            continue
+        entry = parse(line)
+        if line_filter is None or line_filter(line, entry):
+            yield line, entry
+
+
+class LogPage:
+    """
+    One page of newest-first log lines, shaped like a ``Paginator`` page.
+
+    The scan stops after the page (and ``STATS_WINDOW`` lines for the
+    summary statistics), so ``count`` is exact only when ``exhausted``;
+    otherwise it is the number of lines read so far and ``num_pages``
+    promises one more page.
+    """
+
+    def __init__(self, items, number, per_page, collected, exhausted):
+        self.object_list = items
+        self.number = number
+        self.per_page = per_page
+        self.exhausted = exhausted
+        self.count = collected
+        if exhausted:
+            self.num_pages = max((collected + per_page - 1) // per_page, 1)
+        else:
+            self.num_pages = number + 1
+        self.paginator = self
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.number < self.num_pages
+
+    def has_previous(self):
+        return self.number > 1
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+
+def read_log_page(path, parse, page=1, per_page=100, line_filter=None, date_from=None, date_to=None,
+                  stats_window=STATS_WINDOW):
+    """
+    صفحه‌ی ``page`` از سطرهای منطبق، جدیدترین اول
+
+    Returns ``(page, window)`` where ``page`` is a ``LogPage`` of
+    ``(line, entry)`` pairs and ``window`` holds the newest
+    ``stats_window`` matches for summary statistics.
+    """
+    page = max(page, 1)
+    wanted = max(page * per_page + 1, stats_window)
+    window = list(islice(iter_entries(path, parse, line_filter, date_from, date_to), wanted))
+    exhausted = len(window) < wanted
+
+    items = window[(page - 1) * per_page:page * per_page]
+    if not items and page > 1:
+        # مثل Paginator: صفحه‌ی خارج از محدوده به صفحه‌ی اول برمی‌گردد
+        page = 1
+        items = window[:per_page]
+    return LogPage(items, page, per_page, len(window), exhausted), window[:stats_window]
@@ -0,0 +1,376 @@
+from django.test import SimpleTestCase, RequestFactory
+from types import SimpleNamespace
+import json
+import logging
+import os
+import queue
+import shutil
+import tempfile
+from . import reader
+from .log_config import (
+    logger as advanced_logger, JsonLinesFormatter, BatchRotatingFileHandler,
+    BoundedQueueHandler, BatchQueueListener, LogQueueCounters
+)
+from .activity import ActivityIndex, RECORD as ActivityRecord
+from .aggregator import LogStatsAggregator
+from .reader import iter_lines_reverse, LogIndex, make_line_filter, read_log_page
+from .views import _parse_log_line, _highlight_log_line, _my_activity_filter
+
+
+def _line(day, n, level='INFO', user='ali'):
+    return f'📅 2025-01-{day:02d} 10:00:{n % 60:02d} | 📊 {level} | 👤 {user} | 🌐 127.0.0.1 | 📁 views | 📝 message {n}\n'
+
+
+class TailReaderTest(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.path = os.path.join(self.root, 'application.log')
+        with open(self.path, 'w', encoding='utf-8') as f:
+            for day in (1, 2, 3):
+                for n in range(50):
+                    f.write(_line(day, n, level='ERROR' if n % 10 == 0 else 'INFO'))
+
+    def test_reverse_lines_across_blocks(self):
+        with open(self.path, encoding='utf-8') as f:
+            expected = [line.strip() for line in f][::-1]
+        self.assertEqual([line for _, line in iter_lines_reverse(self.path, block_size=37)], expected)
+
+        # offset هر سطر به ابتدای همان سطر اشاره می‌کند
+        offset, line = next(iter_lines_reverse(self.path))
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            self.assertEqual(f.readline().decode().strip(), line)
+
+    def test_page_stops_early_and_filters(self):
+        page, window = read_log_page(self.path, _parse_log_line, page=2, per_page=10)
+        self.assertEqual(page.object_list[0][1]['message'], 'message 39')
+        self.assertTrue(page.has_next())
+        self.assertTrue(page.exhausted)  # ۱۵۰ سطر کمتر از پنجره‌ی آمار است
+        self.assertEqual(page.count, 150)
+
+        line_filter = make_line_filter(level='error')
+        page, _ = read_log_page(self.path, _parse_log_line, per_page=100, line_filter=line_filter)
+        self.assertEqual(page.count, 15)
+        self.assertFalse(page.has_next())
+
+    def test_date_filter_uses_index(self):
+        original = reader.INDEX_STRIDE
+        reader.INDEX_STRIDE = 500
+        self.addCleanup(setattr, reader, 'INDEX_STRIDE', original)
+
+        index = LogIndex(self.path).refresh()
+        self.assertTrue(os.path.exists(index.index_path))
+        start, end = index.byte_range('2025-01-02', '2025-01-02')
+        self.assertGreater(start, 0)
+        self.assertLess(end, os.path.getsize(self.path))
+
+        line_filter = make_line_filter(date_from='2025-01-02', date_to='2025-01-02')
+        page, _ = read_log_page(self.path, _parse_log_line, per_page=100, line_filter=line_filter,
+                                date_from='2025-01-02', date_to='2025-01-02')
+        self.assertEqual(page.count, 50)
+        self.assertTrue(all(entry['timestamp'].startswith('2025-01-02') for _, entry in page))
+
+        # فایل رشد می‌کند: ایندکس ادامه پیدا می‌کند؛ فایل خالی می‌شود: از نو ساخته می‌شود
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(_line(4, 1))
+        entries = LogIndex(self.path).refresh().entries
+        self.assertEqual(entries[:len(index.entries)], index.entries)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(_line(5, 1))
+        self.assertEqual(LogIndex(self.path).refresh().entries, [['2025-01-05 10:00:01', 0]])
+
+
+class JsonLogFormatTest(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.path = os.path.join(self.root, 'application.log')
+
+        handler = logging.FileHandler(self.path, encoding='utf-8')
+        handler.setFormatter(JsonLinesFormatter())
+        test_logger = logging.getLogger('test_json_lines')
+        test_logger.addHandler(handler)
+        test_logger.setLevel(logging.DEBUG)
+        test_logger.propagate = False
+        self.addCleanup(handler.close)
+        self.addCleanup(test_logger.removeHandler, handler)
+
+    def _log(self, level, message, user_id, username, extra=None):
+        request = RequestFactory().post('/api/posts/', REMOTE_ADDR='10.0.0.7')
+        request.user = SimpleNamespace(is_authenticated=True, id=user_id, username=username, is_superuser=False)
+        advanced_logger.log('test_json_lines', level, message, request, extra)
+
+    def test_records_carry_full_context(self):
+        self._log('info', 'post created', 7, 'sara', {'post_id': 42})
+
+        with open(self.path, encoding='utf-8') as f:
+            line = f.readline().strip()
+        record = json.loads(line)
+        self.assertTrue(line.startswith('{"timestamp": "'))
+        self.assertEqual(
+            (record['level'], record['user'], record['user_id'], record['ip'], record['method'], record['path'], record['post_id']),
+            ('INFO', 'sara', 7, '10.0.0.7', 'POST', '/api/posts/', 42)
+        )
+
+        entry = _parse_log_line(line)
+        self.assertEqual(entry['message'], 'post created')
+        self.assertIn('📊', _highlight_log_line(line))
+
+    def test_extra_fields_do_not_replace_core_fields(self):
+        self._log('info', 'report filed', 7, 'sara', {'level': 'high', 'message': 'spam', 'logger': 'x', 'reason': 'ads'})
+
+        with open(self.path, encoding='utf-8') as f:
+            record = json.loads(f.readline())
+        self.assertEqual((record['level'], record['message'], record['logger']), ('INFO', 'report filed', 'test_json_lines'))
+        self.assertEqual(record['context'], {'level': 'high', 'message': 'spam', 'logger': 'x'})
+        self.assertEqual(record['reason'], 'ads')
+
+    def test_filters_compare_fields(self):
+        self._log('info', 'first', 7, 'sara')
+        self._log('error', 'second', 8, 'sarah')
+        self._log('info', 'third', 8, 'sarah')
+
+        page, _ = read_log_page(self.path, _parse_log_line, line_filter=make_line_filter(level='error'))
+        self.assertEqual([entry['message'] for _, entry in page], ['second'])
+
+        page, _ = read_log_page(self.path, _parse_log_line, line_filter=make_line_filter(ip='10.0.0.7', user='sarah'))
+        self.assertEqual([entry['message'] for _, entry in page], ['third', 'second'])
+
+
+
+class LogQueueTest(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.path = os.path.join(self.root, 'application.log')
+        self.counters = LogQueueCounters()
+
+    def _logger(self, listener, policy='drop'):
+        file_handler = BatchRotatingFileHandler(self.path, maxBytes=0, encoding='utf-8')
+        file_handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+        self.addCleanup(file_handler.close)
+        listener.handlers['test_log_queue'] = [file_handler]
+
+        test_logger = logging.getLogger('test_log_queue')
+        test_logger.handlers = [BoundedQueueHandler(listener.queue, policy, 0.01, self.counters)]
+        test_logger.setLevel(logging.INFO)
+        test_logger.propagate = False
+        self.addCleanup(setattr, test_logger, 'handlers', [])
+        return test_logger
+
+    def test_listener_writes_batches_in_order(self):
+        listener = BatchQueueListener(queue.Queue(maxsize=100), 10, self.counters)
+        test_logger = self._logger(listener)
+        listener.start()
+        for n in range(25):
+            test_logger.info('record %s', n)
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            test_logger.exception('failed')
+        listener.stop()
+
+        with open(self.path, encoding='utf-8') as f:
+            content = f.read()
+        lines = content.splitlines()
+        self.assertEqual(lines[:25], [f'INFO record {n}' for n in range(25)])
+        # traceback قبل از رفتن به صف به متن تبدیل شده است
+        self.assertEqual(lines[25], 'ERROR failed')
+        self.assertIn('ValueError: boom', content)
+
+        stats = self.counters.snapshot()
+        self.assertEqual((stats['enqueued'], stats['written'], stats['dropped']), (26, 26, 0))
+        self.assertLessEqual(stats['batches'], 26)
+
+    def test_full_queue_drops_and_counts(self):
+        for policy in ('drop', 'block'):
+            self.counters = LogQueueCounters()
+            # listener شروع نشده؛ صف پر می‌ماند
+            listener = BatchQueueListener(queue.Queue(maxsize=2), 10, self.counters)
+            test_logger = self._logger(listener, policy)
+            for n in range(5):
+                test_logger.info('record %s', n)
+
+            stats = self.counters.snapshot()
+            self.assertEqual((stats['enqueued'], stats['dropped']), (2, 3))
+            self.assertEqual(stats['dropped_by_logger'], {'test_log_queue': 3})
+
+
+class LogStatsAggregatorTest(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.path = os.path.join(self.root, 'application.log')
+        self.aggregator = LogStatsAggregator(self.path, _parse_log_line)
+
+    def _write(self, mode, lines):
+        with open(self.path, mode, encoding='utf-8') as f:
+            f.writelines(lines)
+
+    def test_incremental_rollups(self):
+        self._write('w', [_line(1, n, level='ERROR' if n == 3 else 'INFO') for n in range(5)])
+        state = self.aggregator.refresh()
+        self.assertEqual((state['lines'], state['levels']), (5, {'INFO': 4, 'ERROR': 1}))
+        self.assertEqual(state['daily'], {'2025-01-01': 5})
+        self.assertEqual(state['hourly']['10'], 5)
+        self.assertEqual(state['recent_errors'][0]['message'], 'message 3')
+
+        # سطر نیمه‌کاره تا کامل شدن شمرده نمی‌شود
+        self._write('a', [_line(2, 0, user='reza'), _line(2, 1, user='reza').rstrip('\n')])
+        self.assertEqual(self.aggregator.refresh()['lines'], 6)
+        self._write('a', ['\n'])
+        state = self.aggregator.refresh()
+        self.assertEqual((state['lines'], state['users']), (7, {'ali': 5, 'reza': 2}))
+        self.assertEqual(state['offset'], os.path.getsize(self.path))
+
+    def test_byte_budget(self):
+        self._write('w', [_line(1, n) for n in range(10)])
+        line_size = len(_line(1, 0).encode())
+        self.assertEqual(self.aggregator.refresh(max_bytes=line_size * 3)['lines'], 3)
+        self.assertEqual(self.aggregator.refresh(max_bytes=line_size * 3)['lines'], 6)
+        self.assertEqual(self.aggregator.refresh()['lines'], 10)
+
+    def test_rotation_and_clearing(self):
+        self._write('w', [_line(1, n) for n in range(3)])
+        self.aggregator.refresh()
+
+        # RotatingFileHandler: بقیه‌ی فایل قدیمی از application.log.1 خوانده می‌شود
+        self._write('a', [_line(1, 3)])
+        os.rename(self.path, f'{self.path}.1')
+        self._write('w', [_line(2, 0), _line(2, 1)])
+        state = self.aggregator.refresh()
+        self.assertEqual(state['lines'], 6)
+        self.assertEqual(state['daily'], {'2025-01-01': 4, '2025-01-02': 2})
+
+        self._write('w', [_line(3, 0)])
+        state = self.aggregator.refresh()
+        self.assertEqual((state['lines'], state['offset']), (7, os.path.getsize(self.path)))
+
+    def _rotate(self, backups=3):
+        for n in range(backups - 1, 0, -1):
+            if os.path.exists(f'{self.path}.{n}'):
+                os.replace(f'{self.path}.{n}', f'{self.path}.{n + 1}')
+        os.replace(self.path, f'{self.path}.1')
+
+    def test_several_rotations_between_refreshes(self):
+        self._write('w', [_line(1, n) for n in range(3)])
+        self.aggregator.refresh()
+
+        # دو بار rotate بین دو refresh؛ هیچ سطری نباید گم شود
+        self._write('a', [_line(1, 3)])
+        self._rotate()
+        self._write('w', [_line(2, 0), _line(2, 1)])
+        self._rotate()
+        self._write('w', [_line(3, 0)])
+        line_size = len(_line(1, 0).encode())
+        self.assertEqual(self.aggregator.refresh(max_bytes=line_size * 2)['lines'], 5)
+        state = self.aggregator.refresh()
+        self.assertEqual(state['lines'], 7)
+        self.assertEqual(state['daily'], {'2025-01-01': 4, '2025-01-02': 2, '2025-01-03': 1})
+
+        # فایل checkpoint از backupها بیرون رفته (و inode آن دوباره استفاده شده):
+        # backupهای نوشته‌شده پس از refresh قبلی کامل خوانده می‌شوند و فقط
+        # سطر فایل حذف‌شده (3, 1) گم می‌شود
+        self._write('a', [_line(3, 1)])
+        for day in (4, 5, 6, 7):
+            self._rotate()
+            self._write('w', [_line(day, 0)])
+        state = self.aggregator.refresh()
+        self.assertEqual(state['lines'], 11)
+        self.assertEqual(state['daily']['2025-01-03'], 1)
+        self.assertEqual(state['daily']['2025-01-07'], 1)
+
+
+class ActivityIndexTest(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.path = os.path.join(self.root, 'application.log')
+        self.index = ActivityIndex(os.path.join(self.root, '.index', 'activity'))
+
+        self.handler = BatchRotatingFileHandler(
+            self.path, maxBytes=1000, backupCount=5, encoding='utf-8', activity_index=self.index
+        )
+        self.handler.setFormatter(logging.Formatter(
+            '📅 %(asctime)s | 📊 %(levelname)s | 👤 %(user)s | 🌐 %(ip)s | 📁 %(module)s:%(lineno)d | 📝 %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        ))
+        test_logger = logging.getLogger('test_activity_index')
+        test_logger.handlers = [self.handler]
+        test_logger.setLevel(logging.INFO)
+        test_logger.propagate = False
+        self.addCleanup(self.handler.close)
+        self.addCleanup(setattr, test_logger, 'handlers', [])
+
+    def _log(self, message, user_id, username):
+        request = RequestFactory().get('/api/posts/')
+        request.user = SimpleNamespace(is_authenticated=True, id=user_id, username=username, is_superuser=False)
+        advanced_logger.log('test_activity_index', 'info', message, request)
+
+    def _page(self, user, page, per_page=5):
+        lines, total, _ = self.index.read_page(user.id, self.path, page, per_page, _my_activity_filter(user))
+        return [_parse_log_line(line)['message'] for line in lines], total
+
+    def test_direct_lookup_newest_first(self):
+        sara = SimpleNamespace(id=7, username='sara')
+        for n in range(8):
+            self._log(f'sara {n}', 7, 'sara')
+            self._log(f'sarah {n}', 8, 'sarah')
+        advanced_logger.log('test_activity_index', 'info', 'anonymous request')
+
+        self.assertEqual(self._page(sara, 1), (['sara 7', 'sara 6', 'sara 5', 'sara 4', 'sara 3'], 8))
+        self.assertEqual(self._page(sara, 2), (['sara 2', 'sara 1', 'sara 0'], 8))
+        self.assertEqual(self._page(sara, 3), ([], 8))
+
+    def test_rotated_files(self):
+        sara = SimpleNamespace(id=7, username='sara')
+        for n in range(30):
+            self._log(f'sara {n}', 7, 'sara')
+        self.assertTrue(os.path.exists(f'{self.path}.2'))
+        messages, total = self._page(sara, 1, per_page=100)
+        self.assertEqual((messages, total), ([f'sara {n}' for n in range(29, -1, -1)], 30))
+
+        # فایل دور ریخته‌شده دیگر شمرده نمی‌شود
+        os.remove(f'{self.path}.2')
+        messages, total = self._page(sara, 1, per_page=100)
+        self.assertEqual(len(messages), total)
+        self.assertLess(total, 30)
+        self.assertEqual(messages, [f'sara {n}' for n in range(29, 29 - total, -1)])
+
+        # رکورد قدیمی‌تر از اولین سطر فایل، مال نسل قبلی همان inode است
+        inode = os.stat(self.path).st_ino
+        with open(self.index.path_for(7), 'r+b') as f:
+            records = f.read()
+            f.seek(0)
+            f.write(ActivityRecord.pack(1000.0, inode, 0) + records)
+        self.assertEqual(self._page(sara, 1, per_page=100)[1], total)
+
+        # فایل پاک‌شده: offsetهای قدیمی به سطر کاربر اشاره نمی‌کنند
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('# cleared\n')
+        messages, _ = self._page(sara, 1, per_page=100)
+        self.assertNotIn('sara 29', messages)
+        lines, total, stale = self.index.read_page(7, self.path, 1, 100, _my_activity_filter(sara))
+        self.assertEqual(stale, total - len(lines))
+        self.assertGreater(stale, 0)
+
+    def test_offsets_with_another_writer(self):
+        # worker دیگری روی همان فایل؛ offsetها باید از انتهای واقعی فایل باشند
+        other = BatchRotatingFileHandler(self.path, maxBytes=100000, encoding='utf-8')
+        other.setFormatter(logging.Formatter('%(message)s'))
+        self.addCleanup(other.close)
+        self.handler.maxBytes = 100000
+        sara = SimpleNamespace(id=7, username='sara')
+        for n in range(4):
+            self._log(f'sara {n}', 7, 'sara')
+            other.handle(logging.makeLogRecord({'msg': f'other worker {n} ' + 'x' * n}))
+
+        lines, total, stale = self.index.read_page(7, self.path, 1, 10, _my_activity_filter(sara))
+        self.assertEqual(([_parse_log_line(line)['message'] for line in lines], total, stale),
+                         (['sara 3', 'sara 2', 'sara 1', 'sara 0'], 4, 0))
@@ -5,16 +5,21 @@ from datetime import datetime, timedelta
 from pathlib import Path
 
 from django.conf import settings
-from django.http import HttpResponse, JsonResponse
+from django.http import JsonResponse
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from django.core.paginator import Paginator
 from django.db.models import Q
 
 from .permissions import IsSuperUser
-from .log_config import logger, log_info, log_error
+from .log_config import log_info, log_warning, log_error, log_audit, logger as advanced_logger
+from core.cache import metrics as cache_metrics
+from core.images import derivative_pool
+from core.files import serve_file
+from .reader import make_line_filter, read_log_page, LogPage
+from .activity import activity_index
+from .aggregator import LogStatsAggregator, top_users
 
 # ════════════════════════════════════════════════════════════
 # 📊 Log Management Endpoints (Only for Superusers)
@@ -62,7 +67,7 @@ def list_log_files(request):
                 })
         
         # لاگ کردن دسترسی
-        logger.audit_trail(
+        log_audit(
             f"Superuser '{request.user.username}' viewed log files list",
             request
         )
@@ -112,72 +117,20 @@ def read_logs(request):
                 'message': f'فایل لاگ "{log_file}" یافت نشد'
             }, status=status.HTTP_404_NOT_FOUND)
         
-        # خواندن و فیلتر لاگ‌ها
-        logs = []
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                
-                # پارس کردن خط لاگ
-                log_entry = _parse_log_line(line)
-                
-                # اعمال فیلترها
-                include = True
-                
-                if level and log_entry.get('level') != level.upper():
-                    include = False
-                
-                if user_filter and user_filter not in log_entry.get('user', ''):
-                    include = False
-                
-                if ip_filter and ip_filter not in log_entry.get('ip', ''):
-                    include = False
-                
-                if search_text and search_text.lower() not in line.lower():
-                    include = False
-                
-                if date_from and log_entry.get('timestamp'):
-                    try:
-                        log_date = datetime.strptime(log_entry['timestamp'], '%Y-%m-%d %H:%M:%S')
-                        filter_date = datetime.strptime(date_from, '%Y-%m-%d')
-                        if log_date.date() < filter_date.date():
-                            include = False
-                    except:
-                        pass
-                
-                if date_to and log_entry.get('timestamp'):
-                    try:
-                        log_date = datetime.strptime(log_entry['timestamp'], '%Y-%m-%d %H:%M:%S')
-                        filter_date = datetime.strptime(date_to, '%Y-%m-%d')
-                        if log_date.date() > filter_date.date():
-                            include = False
-                    except:
-                        pass
-                
-                if include:
-                    logs.append({
-                        'raw': line,
-                        'parsed': log_entry,
-                        'highlight': _highlight_log_line(line)
-                    })
-        
-        # مرتب سازی (جدیدترین اول)
-        logs.reverse()
-        
-        # صفحه‌بندی
-        paginator = Paginator(logs, per_page)
-        try:
-            page_obj = paginator.page(page)
-        except:
-            page_obj = paginator.page(1)
-        
-        # آمار
+        # خواندن از انتهای فایل تا پر شدن صفحه؛ فیلتر تاریخ از ایندکس فایل استفاده می‌کند
+        line_filter = make_line_filter(
+            level=level, user=user_filter, ip=ip_filter,
+            search=search_text, date_from=date_from, date_to=date_to
+        )
+        page_obj, window = read_log_page(
+            file_path, _parse_log_line, page=page, per_page=per_page,
+            line_filter=line_filter, date_from=date_from, date_to=date_to
+        )
+        
+        # آمار (جدیدترین ۱۰۰۰ خط منطبق)
         level_stats = {}
         user_stats = {}
-        for log in logs[:1000]:  # فقط ۱۰۰۰ خط اول برای آمار
-            entry = log['parsed']
+        for _, entry in window:
             level = entry.get('level', 'UNKNOWN')
             user = entry.get('user', 'anonymous')
             
@@ -185,7 +138,7 @@ def read_logs(request):
             user_stats[user] = user_stats.get(user, 0) + 1
         
         # لاگ کردن دسترسی
-        logger.audit_trail(
+        log_audit(
             f"Superuser '{request.user.username}' read logs from '{log_file}'",
             request,
             {'filters': request.GET.dict()}
@@ -194,12 +147,13 @@ def read_logs(request):
         return Response({
             'success': True,
             'file': log_file,
-            'logs': [log['highlight'] for log in page_obj.object_list],
+            'logs': [_highlight_log_line(line) for line, _ in page_obj],
             'pagination': {
-                'page': page,
+                'page': page_obj.number,
                 'per_page': per_page,
-                'total_pages': paginator.num_pages,
-                'total_count': paginator.count,
+                # وقتی فایل تا انتها خوانده نشده تعداد کل مشخص نیست
+                'total_pages': page_obj.num_pages if page_obj.exhausted else None,
+                'total_count': page_obj.count if page_obj.exhausted else None,
                 'has_next': page_obj.has_next(),
                 'has_previous': page_obj.has_previous(),
             },
@@ -243,16 +197,18 @@ def download_log_file(request, file_name):
             }, status=status.HTTP_404_NOT_FOUND)
         
         # لاگ کردن دانلود
-        logger.audit_trail(
+        log_audit(
             f"Superuser '{request.user.username}' downloaded log file '{file_name}'",
             request
         )
         
-        # ارسال فایل
-        with open(file_path, 'rb') as f:
-            response = HttpResponse(f.read(), content_type='text/plain; charset=utf-8')
-            response['Content-Disposition'] = f'attachment; filename="{file_name}"'
-            return response
+        # ارسال فایل بدون خواندن کامل آن در حافظه
+        return serve_file(
+            request, log_dir, file_name,
+            content_type='text/plain; charset=utf-8',
+            as_attachment=True,
+            accel_prefix=settings.LOG_ACCEL_PREFIX,
+        )
             
     except Exception as e:
         log_error(f"Failed to download log file: {str(e)}", request)
@@ -289,9 +245,12 @@ def clear_log_file(request, file_name):
         # پاک کردن فایل (ایجاد فایل خالی جدید)
         with open(file_path, 'w', encoding='utf-8') as f:
             f.write(f"# Log file cleared by {request.user.username} at {datetime.now()}\n")
+        if file_name == 'application.log':
+            # offsetهای ایندکس فعالیت دیگر معتبر نیستند
+            activity_index.clear()
         
         # لاگ کردن عملیات
-        logger.audit_trail(
+        log_audit(
             f"Superuser '{request.user.username}' cleared log file '{file_name}'",
             request
         )
@@ -344,50 +303,23 @@ def get_log_statistics(request):
                     'modified': datetime.fromtimestamp(stat.st_mtime)
                 })
         
-        # تحلیل فایل application.log برای آمار
+        # آمار application.log از rollupهای افزایشی، بدون خواندن کل فایل
         app_log_path = os.path.join(log_dir, 'application.log')
         if os.path.exists(app_log_path):
-            errors_today = []
-            user_activities = {}
-            hourly_activity = {str(h).zfill(2): 0 for h in range(24)}
-            
-            with open(app_log_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    
-                    # استخراج اطلاعات
-                    entry = _parse_log_line(line)
-                    
-                    # شمارش خطاهای امروز
-                    if entry.get('level') in ['ERROR', 'CRITICAL']:
-                        if 'today' in entry.get('timestamp', ''):
-                            errors_today.append(entry)
-                    
-                    # آمار کاربران
-                    user = entry.get('user', 'anonymous')
-                    user_activities[user] = user_activities.get(user, 0) + 1
-                    
-                    # فعالیت ساعتی
-                    timestamp = entry.get('timestamp')
-                    if timestamp:
-                        try:
-                            hour = timestamp.split()[1].split(':')[0]
-                            hourly_activity[hour] = hourly_activity.get(hour, 0) + 1
-                        except:
-                            pass
-            
-            statistics['recent_errors'] = errors_today[-10:]  # ۱۰ خطای آخر
-            statistics['top_users'] = dict(sorted(
-                user_activities.items(), 
-                key=lambda x: x[1], 
-                reverse=True
-            )[:10])
-            statistics['activity_by_hour'] = hourly_activity
+            rollups = _log_rollups(app_log_path)
+            statistics['recent_errors'] = rollups['recent_errors'][-10:]  # ۱۰ خطای آخر
+            statistics['top_users'] = top_users(rollups, 10)
+            statistics['activity_by_hour'] = rollups['hourly']
+            statistics['levels'] = rollups['levels']
+            statistics['aggregated_at'] = rollups['updated_at']
+        
+        # آمار hit/miss کش در همین worker
+        statistics['cache'] = cache_metrics.snapshot()
+        statistics['image_derivatives'] = derivative_pool.snapshot()
+        statistics['log_queue'] = advanced_logger.queue_stats()
         
         # لاگ کردن دسترسی
-        logger.audit_trail(
+        log_audit(
             f"Superuser '{request.user.username}' viewed log statistics",
             request
         )
@@ -425,38 +357,30 @@ def get_my_activity_logs(request):
                 'message': 'فایل لاگ یافت نشد'
             }, status=status.HTTP_404_NOT_FOUND)
         
-        # فیلتر لاگ‌های کاربر جاری
-        user_logs = []
+        # مستقیم از ایندکس فعالیت کاربر، جدیدترین اول
         username = request.user.username
-        
-        with open(app_log_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if username in line:
-                    user_logs.append({
-                        'raw': line,
-                        'highlight': _highlight_log_line(line)
-                    })
-        
-        # مرتب سازی معکوس (جدیدترین اول)
-        user_logs.reverse()
-        
-        # صفحه‌بندی
-        paginator = Paginator(user_logs, per_page)
-        try:
-            page_obj = paginator.page(page)
-        except:
-            page_obj = paginator.page(1)
+        matches = _my_activity_filter(request.user)
+        lines, total, stale = activity_index.read_page(request.user.id, app_log_path, max(page, 1), per_page, matches)
+        if not lines and page > 1:
+            page = 1
+            lines, total, stale = activity_index.read_page(request.user.id, app_log_path, page, per_page, matches)
+        if stale:
+            # offset‌ها به سطر دیگری اشاره می‌کنند؛ ایندکس باید بازسازی شود
+            log_warning(
+                f"Activity index returned {stale} stale entries; run rebuild_activity_index",
+                request, {'user_id': request.user.id, 'stale_entries': stale}
+            )
+        page_obj = LogPage(lines, max(page, 1), per_page, total, exhausted=True)
         
         return Response({
             'success': True,
             'username': username,
-            'logs': [log['highlight'] for log in page_obj.object_list],
+            'logs': [_highlight_log_line(line) for line in page_obj],
             'pagination': {
-                'page': page,
+                'page': page_obj.number,
                 'per_page': per_page,
-                'total_pages': paginator.num_pages,
-                'total_count': paginator.count,
+                'total_pages': page_obj.num_pages,
+                'total_count': page_obj.count,
                 'has_next': page_obj.has_next(),
                 'has_previous': page_obj.has_previous(),
             }
@@ -474,8 +398,52 @@ def get_my_activity_logs(request):
 # 🛠️ Helper Functions
 # ════════════════════════════════════════════════════════════
 
+def _log_rollups(path):
+    """
+    rollupهای آمار یک فایل لاگ؛ حداکثر LOG_STATS_REFRESH_BYTES از خطوط جدید
+    همین‌جا خوانده می‌شود (0 یعنی فقط دستور aggregate_log_stats به‌روزشان می‌کند)
+    """
+    aggregator = LogStatsAggregator(path, _parse_log_line)
+    if settings.LOG_STATS_REFRESH_BYTES > 0:
+        return aggregator.refresh(max_bytes=settings.LOG_STATS_REFRESH_BYTES)
+    return aggregator.load()
+
+
+def _my_activity_filter(user):
+    """
+    سطری که ایندکس فعالیت به آن اشاره می‌کند واقعا مال همین کاربر است؛
+    رکوردهای JSON با user_id و سطرهای متنی با نام کاربری کامل مقایسه می‌شوند
+    """
+    def matches(line):
+        entry = _parse_log_line(line)
+        if 'user_id' in entry:
+            return entry['user_id'] == user.id
+        return entry.get('user') == user.username
+    return matches
+
+
+def _parse_json_line(line):
+    """رکورد فرمت JSON (LOG_FORMAT = 'json')؛ فیلدها بدون regex خوانده می‌شوند"""
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(entry, dict):
+        return None
+    entry.setdefault('user', 'anonymous')
+    entry.setdefault('ip', 'unknown')
+    if entry.get('module'):
+        entry.setdefault('location', f"{entry['module']}:{entry.get('line')}")
+    return entry
+
+
 def _parse_log_line(line):
     """پارس کردن یک خط لاگ به اجزای تشکیل دهنده"""
+    if line.startswith('{'):
+        entry = _parse_json_line(line)
+        if entry is not None:
+            return entry
+    
     try:
         # فرمت: 📅 2024-01-01 12:00:00 | 📊 INFO | 👤 admin | 🌐 127.0.0.1 | 📁 module:42 | 📝 message
         pattern = r'📅 (.+?) \| 📊 (.+?) \| 👤 (.+?) \| 🌐 (.+?) \| 📁 (.+?) \| 📝 (.+)'
@@ -527,6 +495,15 @@ def _parse_log_line(line):
 
 def _highlight_log_line(line):
     """هایلایت کردن خط لاگ برای نمایش بهتر"""
+    # رکورد JSON مثل فرمت متنی نمایش داده می‌شود
+    if line.startswith('{'):
+        entry = _parse_json_line(line)
+        if entry is not None:
+            line = (
+                f"📅 {entry.get('timestamp')} | 📊 {entry.get('level')} | 👤 {entry['user']} | "
+                f"🌐 {entry['ip']} | 📁 {entry.get('location', '')} | 📝 {entry.get('message', '')}"
+            )
+    
     # رنگ‌بندی بر اساس سطح
     colors = {
         'DEBUG': '#6c757d',    # خاکستری
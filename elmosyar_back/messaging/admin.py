@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
+from notifications.unread import rebuild_unread
 from .models import Conversation, Message
 
 # =====================================================
@@ -89,13 +90,21 @@ class MessageAdmin(admin.ModelAdmin):
     
     def mark_as_read(self, request, queryset):
         """علامت‌گذاری به عنوان خوانده شده"""
+        participants = set(Conversation.participants.through.objects.filter(
+            conversation__messages__in=queryset
+        ).values_list('user_id', flat=True))
         updated = queryset.update(is_read=True)
+        rebuild_unread(participants)
         self.message_user(request, f'{updated} پیام به عنوان خوانده شده علامت‌گذاری شد.')
     mark_as_read.short_description = 'علامت‌گذاری به عنوان خوانده شده'
     
     def mark_as_unread(self, request, queryset):
         """علامت‌گذاری به عنوان خوانده نشده"""
+        participants = set(Conversation.participants.through.objects.filter(
+            conversation__messages__in=queryset
+        ).values_list('user_id', flat=True))
         updated = queryset.update(is_read=False)
+        rebuild_unread(participants)
         self.message_user(request, f'{updated} پیام به عنوان خوانده نشده علامت‌گذاری شد.')
     mark_as_unread.short_description = 'علامت‌گذاری به عنوان خوانده نشده'
 
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 
 class Conversation(models.Model):
@@ -7,6 +8,11 @@ class Conversation(models.Model):
     participants = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='conversations')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # صندوق پیام بدون خواندن پیام‌ها: آخرین پیام و زمانش (یا زمان ساخت اگر پیامی نیست)
+    last_message = models.ForeignKey(
+        'Message', null=True, blank=True, on_delete=models.SET_NULL, related_name='+'
+    )
+    last_message_at = models.DateTimeField(default=timezone.now, db_index=True)
 
     class Meta:
         ordering = ['-updated_at']
@@ -15,6 +21,13 @@ class Conversation(models.Model):
     def __str__(self):
         return f"Conversation {self.id}"
 
+    def refresh_last_message(self):
+        """آخرین پیام را دوباره از جدول پیام‌ها پیدا می‌کند (بعد از حذف پیام)"""
+        last = self.messages.order_by('-created_at', '-id').first()
+        self.last_message = last
+        self.last_message_at = last.created_at if last else self.created_at
+        self.save(update_fields=['last_message', 'last_message_at'])
+
 
 class Message(models.Model):
     """مدل جدید برای پیام‌های خصوصی"""
@@ -38,5 +51,10 @@ class Message(models.Model):
 
     def mark_as_read(self):
         """علامت‌گذاری پیام به عنوان خوانده شده"""
+        from notifications.unread import adjust_unread, conversation_recipients
+
+        if self.is_read:
+            return
         self.is_read = True
-        self.save()
\ No newline at end of file
+        self.save(update_fields=['is_read'])
+        adjust_unread(conversation_recipients(self.conversation_id, self.sender_id), -1, self.conversation_id)
\ No newline at end of file
@@ -1,5 +1,8 @@
 from rest_framework import serializers
+from accounts.models import User
 from accounts.serializers import UserSerializer
+from core.images import thumbnail_url, srcset
+from notifications.unread import conversation_unread_counts
 from .models import Conversation, Message
 
 class MessageSerializer(serializers.ModelSerializer):
@@ -13,6 +16,28 @@ class MessageSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['sender', 'created_at']
 
+class ParticipantSerializer(serializers.ModelSerializer):
+    """نمایش فشرده‌ی طرف مکالمه در صندوق پیام؛ بدون شمارش‌های فالوور/پست"""
+    profile_picture_thumbnail = serializers.SerializerMethodField()
+    profile_picture_srcset = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = [
+            'id', 'username', 'first_name', 'last_name',
+            'profile_picture', 'profile_picture_thumbnail', 'profile_picture_srcset'
+        ]
+
+    def get_profile_picture_thumbnail(self, obj):
+        if not obj.profile_picture:
+            return None
+        return thumbnail_url(obj.profile_picture, obj.profile_picture_variants)
+
+    def get_profile_picture_srcset(self, obj):
+        if not obj.profile_picture:
+            return ''
+        return srcset(obj.profile_picture, obj.profile_picture_variants)
+
 class ConversationSerializer(serializers.ModelSerializer):
     other_user = serializers.SerializerMethodField()
     last_message = serializers.SerializerMethodField()
@@ -20,20 +45,22 @@ class ConversationSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Conversation
-        fields = ['id', 'other_user', 'last_message', 'unread_count', 'updated_at']
-        read_only_fields = ['updated_at']
+        fields = ['id', 'other_user', 'last_message', 'unread_count', 'last_message_at', 'updated_at']
+        read_only_fields = ['last_message_at', 'updated_at']
 
     def get_other_user(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            other_user = obj.participants.exclude(id=request.user.id).first()
+            # از participants پیش‌خوانده‌شده استفاده می‌شود
+            other_user = next((u for u in obj.participants.all() if u.id != request.user.id), None)
             return UserSerializer(other_user, context=self.context).data if other_user else None
         return None
 
     def get_last_message(self, obj):
-        last_message = obj.messages.last()
+        last_message = obj.last_message
         if last_message:
             return {
+                'id': last_message.id,
                 'content': last_message.content,
                 'sender': last_message.sender.username,
                 'created_at': last_message.created_at,
@@ -44,5 +71,22 @@ class ConversationSerializer(serializers.ModelSerializer):
     def get_unread_count(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.messages.filter(is_read=False).exclude(sender=request.user).count()
-        return 0
\ No newline at end of file
+            # لیست مکالمات شمارنده‌ها را یک‌جا در context می‌گذارد
+            unread_counts = self.context.get('unread_counts')
+            if unread_counts is None:
+                unread_counts = conversation_unread_counts(request.user.id, [obj.id])
+            return unread_counts.get(obj.id, 0)
+        return 0
+
+class InboxSerializer(ConversationSerializer):
+    """
+    یک صفحه از صندوق پیام با تعداد ثابت کوئری
+
+    Expects ``other_users`` (``{conversation_id: user}``) and
+    ``unread_counts`` in the context, both loaded once per page by the
+    view, and conversations with ``last_message__sender`` selected.
+    """
+
+    def get_other_user(self, obj):
+        other_user = self.context['other_users'].get(obj.id)
+        return ParticipantSerializer(other_user, context=self.context).data if other_user else None
@@ -0,0 +1,67 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from .models import Conversation, Message
+
+
+User = get_user_model()
+
+class InboxTest(TestCase):
+
+    def setUp(self):
+        self.me = User.objects.create_user(username="me", email="me@example.com", password="1234")
+        self.friends = [
+            User.objects.create_user(username=f"friend{n}", email=f"friend{n}@example.com", password="1234")
+            for n in range(5)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.me)
+        self.conversations = []
+        for friend in self.friends:
+            conversation = Conversation.objects.create()
+            conversation.participants.add(self.me, friend)
+            self.conversations.append(conversation)
+
+    def send(self, user, conversation, content):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post(f'/api/conversations/{conversation.id}/send/', {'content': content})
+        self.assertEqual(response.status_code, 201)
+        return response.data['message']['id']
+
+    def test_last_message_follows_send_and_delete(self):
+        conversation = self.conversations[0]
+        first = self.send(self.friends[0], conversation, 'hi')
+        second = self.send(self.me, conversation, 'hello')
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.last_message_id, second)
+
+        self.client.delete(f'/api/messages/{second}/delete/')
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.last_message_id, first)
+        self.assertEqual(conversation.last_message_at, Message.objects.get(id=first).created_at)
+
+    def test_inbox_in_constant_queries(self):
+        for n, conversation in enumerate(self.conversations):
+            for text in ('one', 'two', f'last {n}'):
+                self.send(self.friends[n], conversation, text)
+
+        # صفحه، COUNT، طرف‌های مکالمه، شمارنده‌ها
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/conversations/?per_page=3')
+        conversations = response.data['conversations']
+        self.assertEqual([c['other_user']['username'] for c in conversations], ['friend4', 'friend3', 'friend2'])
+        self.assertEqual(conversations[0]['last_message']['content'], 'last 4')
+        self.assertEqual(conversations[0]['unread_count'], 3)
+        self.assertEqual((response.data['count'], response.data['pagination']['total_count']), (5, 5))
+
+        # پیام تازه مکالمه را به بالای صندوق می‌آورد
+        self.send(self.friends[0], self.conversations[0], 'new')
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/conversations/?cursor=&per_page=2')
+        self.assertEqual([c['id'] for c in response.data['conversations']],
+                         [self.conversations[0].id, self.conversations[4].id])
+        self.assertNotIn('count', response.data)
+        response = self.client.get(f"/api/conversations/?cursor={response.data['pagination']['next']}&per_page=2")
+        self.assertEqual([c['id'] for c in response.data['conversations']],
+                         [self.conversations[3].id, self.conversations[2].id])
@@ -4,16 +4,20 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 from django.shortcuts import get_object_or_404
 from django.db import transaction
-from django.core.paginator import Paginator
+from django.contrib.auth import get_user_model
+from core.pagination import paginate, InvalidPagination
+from core.pubsub import publish_to_users
 from django.utils import timezone
 
-import settings
+from notifications.unread import adjust_unread, conversation_unread_counts
 from .models import Conversation, Message
-from .serializers import ConversationSerializer, MessageSerializer
+from .serializers import ConversationSerializer, InboxSerializer, MessageSerializer
 
 # جایگزین کردن لاگر قدیمی
 from log_manager.log_config import log_info, log_error, log_warning, log_audit
 
+User = get_user_model()
+
 MAX_MESSAGE_CONTENT_LENGTH = 2000
 
 
@@ -21,23 +25,61 @@ MAX_MESSAGE_CONTENT_LENGTH = 2000
 # 💬 Messaging Endpoints
 # ════════════════════════════════════════════════════════════
 
+def _inbox_context(request, conversations):
+    """طرف مقابل و شمارش خوانده‌نشده‌ی همه‌ی مکالمات صفحه، هر کدام با یک کوئری"""
+    ids = [conversation.id for conversation in conversations]
+    other_users = {}
+    for row in Conversation.participants.through.objects.filter(
+        conversation_id__in=ids
+    ).exclude(user_id=request.user.id).select_related('user'):
+        other_users.setdefault(row.conversation_id, row.user)
+    return {
+        'request': request,
+        'other_users': other_users,
+        'unread_counts': conversation_unread_counts(request.user.id, ids),
+    }
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def conversations_list(request):
-    """Get user's conversations"""
-    conversations = Conversation.objects.filter(participants=request.user).prefetch_related(
-        'participants', 'messages'
-    ).order_by('-updated_at')
+    """
+    Get user's conversations, most recent message first
+
+    ``count`` is the total number of the user's conversations, as before
+    pagination. Cursor pages (``?cursor=``) skip the COUNT query, so they
+    carry no ``count``; follow ``pagination.next`` instead.
+    """
+    page = request.GET.get('page', 1)
+    per_page = min(int(request.GET.get('per_page', 50)), 100)
     
-    serializer = ConversationSerializer(conversations, many=True, context={'request': request})
+    conversations = Conversation.objects.filter(participants=request.user).select_related(
+        'last_message__sender'
+    )
+    try:
+        conversations_page, pagination = paginate(
+            request, conversations, page, per_page, ordering=('-last_message_at', '-id')
+        )
+    except InvalidPagination as e:
+        log_warning(f"Invalid pagination: {str(e)}", request)
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
     
-    log_info(f"User viewed conversations list ({len(conversations)} conversations)", request)
+    conversations_page = list(conversations_page)
+    serializer = InboxSerializer(conversations_page, many=True, context=_inbox_context(request, conversations_page))
     
-    return Response({
+    log_info(f"User viewed conversations list ({len(conversations_page)} conversations)", request)
+    
+    response_data = {
         'success': True,
         'conversations': serializer.data,
-        'count': len(conversations)
-    }, status=status.HTTP_200_OK)
+        'pagination': pagination
+    }
+    if 'total_count' in pagination:
+        response_data['count'] = pagination['total_count']
+    return Response(response_data, status=status.HTTP_200_OK)
 
 
 @api_view(['POST'])
@@ -46,7 +88,7 @@ def start_conversation(request, username):
     """Start a new conversation"""
     try:
         with transaction.atomic():
-            other_user = get_object_or_404(settings.AUTH_USER_MODEL, username=username)
+            other_user = get_object_or_404(User, username=username)
             
             if other_user == request.user:
                 log_warning(f"User tried to start conversation with themselves", request)
@@ -92,25 +134,34 @@ def start_conversation(request, username):
 def conversation_detail(request, conversation_id):
     """Get conversation messages with pagination"""
     conversation = get_object_or_404(
-        Conversation.objects.prefetch_related('participants', 'messages'),
+        Conversation.objects.select_related('last_message__sender').prefetch_related('participants'),
         id=conversation_id, 
         participants=request.user
     )
     
-    page = int(request.GET.get('page', 1))
+    page = request.GET.get('page', 1)
     per_page = min(int(request.GET.get('per_page', 50)), 100)
     
     # Mark messages as read
-    unread_count = conversation.messages.filter(is_read=False).exclude(sender=request.user).count()
-    conversation.messages.filter(is_read=False).exclude(sender=request.user).update(is_read=True)
+    unread_count = conversation.messages.filter(is_read=False).exclude(sender=request.user).update(is_read=True)
+    adjust_unread([request.user.id], -unread_count, conversation.id)
+    if unread_count:
+        # رسید خواندن برای فرستنده و دستگاه‌های دیگر خواننده
+        publish_to_users([p.id for p in conversation.participants.all()], 'read', {
+            'conversation_id': conversation.id,
+            'reader_id': request.user.id,
+            'count': unread_count,
+        })
     
     messages = conversation.messages.all().order_by('-created_at')
-    paginator = Paginator(messages, per_page)
-    
     try:
-        messages_page = paginator.page(page)
-    except:
-        messages_page = paginator.page(1)
+        messages_page, pagination = paginate(request, messages, page, per_page, count_scopes=[('conversation', conversation.id)])
+    except InvalidPagination as e:
+        log_warning(f"Invalid pagination: {str(e)}", request)
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
     
     log_info(f"User viewed conversation {conversation_id} page {page}, marked {unread_count} messages as read", request)
     
@@ -121,14 +172,7 @@ def conversation_detail(request, conversation_id):
         'success': True,
         'conversation': conversation_serializer.data,
         'messages': message_serializer.data,
-        'pagination': {
-            'page': page,
-            'per_page': per_page,
-            'total_pages': paginator.num_pages,
-            'total_count': paginator.count,
-            'has_next': messages_page.has_next(),
-            'has_previous': messages_page.has_previous(),
-        }
+        'pagination': pagination
     }, status=status.HTTP_200_OK)
 
 
@@ -166,9 +210,10 @@ def send_message(request, conversation_id):
                 file=file
             )
             
-            # Update conversation time
-            conversation.updated_at = timezone.now()
-            conversation.save()
+            # آخرین پیام مکالمه؛ شرط زمان جلوی عقب رفتن آن در ارسال هم‌زمان را می‌گیرد
+            Conversation.objects.filter(
+                id=conversation.id, last_message_at__lte=message.created_at
+            ).update(last_message=message, last_message_at=message.created_at, updated_at=timezone.now())
             
             # لاگ پیام ارسالی (محتوا را کوتاه می‌کنیم)
             truncated_content = content[:100] + "..." if len(content) > 100 else content
@@ -181,6 +226,11 @@ def send_message(request, conversation_id):
             })
             
             serializer = MessageSerializer(message, context={'request': request})
+            # بدون request: فیلدهای وابسته به بیننده (is_me) برای همه‌ی گیرنده‌ها یکسان است
+            publish_to_users(conversation.participants.values_list('id', flat=True), 'message', {
+                'conversation_id': conversation.id,
+                'message': MessageSerializer(message).data,
+            })
             
             return Response({
                 'success': True,
@@ -217,9 +267,12 @@ def delete_message(request, message_id):
                     'message': 'You can only delete your own messages'
                 }, status=status.HTTP_403_FORBIDDEN)
             
-            conversation_id = message.conversation.id
+            conversation = message.conversation
+            conversation_id = conversation.id
             message_content = message.content[:50] if message.content else "No content"
             message.delete()
+            if conversation.last_message_id == message_id:
+                conversation.refresh_last_message()
             
             log_audit(f"User deleted message from conversation {conversation_id}", request, {
                 'message_id': message_id,
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Notification
+from .unread import rebuild_unread
 
 # =====================================================
 # Notification Admin
@@ -7,7 +8,7 @@ from .models import Notification
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
     list_display = [
-        'id', 'recipient', 'sender', 'notif_type', 
+        'id', 'recipient', 'sender', 'notif_type', 'actor_count',
         'message_preview', 'is_read', 'created_at'
     ]
     list_filter = ['notif_type', 'is_read', 'created_at']
@@ -42,13 +43,17 @@ class NotificationAdmin(admin.ModelAdmin):
     
     def mark_as_read(self, request, queryset):
         """علامت‌گذاری به عنوان خوانده شده"""
+        recipients = set(queryset.values_list('recipient_id', flat=True))
         updated = queryset.update(is_read=True)
+        rebuild_unread(recipients)
         self.message_user(request, f'{updated} نوتیفیکیشن به عنوان خوانده شده علامت‌گذاری شد.')
     mark_as_read.short_description = 'علامت‌گذاری به عنوان خوانده شده'
     
     def mark_as_unread(self, request, queryset):
         """علامت‌گذاری به عنوان خوانده نشده"""
+        recipients = set(queryset.values_list('recipient_id', flat=True))
         updated = queryset.update(is_read=False)
+        rebuild_unread(recipients)
         self.message_user(request, f'{updated} نوتیفیکیشن به عنوان خوانده نشده علامت‌گذاری شد.')
     mark_as_unread.short_description = 'علامت‌گذاری به عنوان خوانده نشده'
 
@@ -2,4 +2,8 @@ from django.apps import AppConfig
 
 class NotificationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'notifications'
\ No newline at end of file
+    name = 'notifications'
+
+    def ready(self):
+        # نگه‌داری شمارنده‌های خوانده‌نشده با ساخت و حذف نوتیفیکیشن و پیام
+        import notifications.unread
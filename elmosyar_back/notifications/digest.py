@@ -0,0 +1,86 @@
+"""
+خلاصه‌ی دوره‌ای نوتیفیکیشن‌های کم‌اهمیت
+
+``DigestItem`` rows parked by the dispatcher are turned into one ``digest``
+notification per recipient, e.g. "12 new activities: 7 comment likes,
+5 follows". Run periodically with ``send_notification_digests``.
+"""
+from collections import Counter
+
+from django.db import transaction
+
+from core.counts import bump_count_scopes
+from .dispatch import LATEST_ACTORS, actor_entry, push_notifications
+from .models import Notification, DigestItem
+from .unread import add_unread
+
+
+DIGEST_LABELS = {
+    'like': 'post likes',
+    'like_comment': 'comment likes',
+    'dislike_comment': 'comment dislikes',
+    'repost': 'reposts',
+    'comment': 'comments',
+    'reply': 'replies',
+    'mention': 'mentions',
+    'follow': 'follows',
+}
+
+
+def digest_message(type_counts):
+    total = sum(type_counts.values())
+    parts = ', '.join(
+        f"{count} {DIGEST_LABELS.get(notif_type, notif_type)}"
+        for notif_type, count in type_counts.most_common()
+    )
+    return f"{total} new activit{'ies' if total > 1 else 'y'}: {parts}"[:255]
+
+
+def build_digests(batch_size=500):
+    """
+    Turn all parked items into digest notifications; returns the number of
+    digests written. Items are consumed one recipient batch at a time, so
+    an item parked meanwhile waits for the next run.
+    """
+    written = 0
+    while True:
+        recipients = list(
+            DigestItem.objects.order_by().values_list('recipient_id', flat=True).distinct()[:batch_size]
+        )
+        if not recipients:
+            return written
+
+        with transaction.atomic():
+            items = list(
+                DigestItem.objects.select_for_update().filter(recipient_id__in=recipients)
+                .select_related('sender').order_by('created_at')
+            )
+            by_recipient = {}
+            for item in items:
+                by_recipient.setdefault(item.recipient_id, []).append(item)
+
+            digests = []
+            for recipient_id, recipient_items in by_recipient.items():
+                actors = []
+                seen = set()
+                for item in reversed(recipient_items):
+                    if item.sender_id not in seen:
+                        seen.add(item.sender_id)
+                        actors.append(actor_entry(item.sender))
+                latest = recipient_items[-1]
+                digests.append(Notification(
+                    recipient_id=recipient_id,
+                    sender=latest.sender,
+                    notif_type='digest',
+                    message=digest_message(Counter(item.notif_type for item in recipient_items)),
+                    actor_count=len(actors),
+                    latest_actors=actors[:LATEST_ACTORS],
+                ))
+
+            Notification.objects.bulk_create(digests)
+            DigestItem.objects.filter(id__in=[item.id for item in items]).delete()
+            add_unread(n.recipient_id for n in digests)
+            bump_count_scopes(*[('notifications', n.recipient_id) for n in digests])
+        # بعد از commit؛ کلاینت نباید از ردیفی باخبر شود که هنوز دیده نمی‌شود
+        push_notifications(digests)
+        written += len(digests)
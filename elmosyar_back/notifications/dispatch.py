@@ -0,0 +1,198 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core.counts import bump_count_scopes
+from core.pubsub import publish_to_users
+from .models import Notification, DigestItem
+from .serializers import NotificationPushSerializer
+from .unread import add_unread
+
+
+# تعداد فعال‌هایی که روی ردیف تجمیعی نگه داشته می‌شوند
+LATEST_ACTORS = 3
+
+# متن ردیف تجمیعی: «ali and 4 others liked your post»
+ACTIVITY_VERBS = {
+    'like': 'liked your post',
+    'like_comment': 'liked your comment',
+    'dislike_comment': 'disliked your comment',
+    'repost': 'reposted your post',
+    'comment': 'commented on your post',
+    'reply': 'replied to your comment',
+    'mention': 'mentioned you',
+    'follow': 'followed you',
+}
+
+
+class NotificationBatch:
+    """
+    جمع کردن نوتیفیکیشن‌های یک عملیات و ثبت همه با یک INSERT
+
+    Call sites ``add`` one notification per recipient and the batch writes
+    them with a single ``bulk_create``. Self-notifications and missing
+    recipients (anonymous posts) are skipped here, so views do not repeat
+    those checks.
+
+    Used as a context manager the batch is sent when the block exits
+    without an exception. With ``deferred=True`` (default from
+    ``NOTIFICATION_DELIVERY``) it is sent only after the surrounding
+    transaction commits, and never if it rolls back.
+
+    ``bulk_create`` sends no ``post_save``, so the batch bumps the cached
+    notification counts and the unread counters of the recipients itself.
+
+    Types in ``NOTIFICATION_COALESCE_TYPES`` are folded into the recipient's
+    unread notification of the same type on the same post/comment if its
+    group started within ``NOTIFICATION_COALESCE_WINDOW`` seconds, instead
+    of adding a row. Types in ``NOTIFICATION_DIGEST_TYPES`` are parked as
+    ``DigestItem`` rows for ``send_notification_digests``.
+
+    New and folded notifications are pushed to connected recipients
+    (``notifications.stream``).
+    """
+
+    def __init__(self, sender, deferred=None):
+        self.sender = sender
+        if deferred is None:
+            deferred = settings.NOTIFICATION_DELIVERY == 'on_commit'
+        self.deferred = deferred
+        self.pending = []
+
+    def add(self, recipient, notif_type, post=None, comment=None, message=''):
+        if recipient is None or getattr(recipient, 'pk', recipient) == self.sender.pk:
+            return
+        self.pending.append(Notification(
+            recipient_id=getattr(recipient, 'pk', recipient),
+            sender=self.sender,
+            notif_type=notif_type,
+            post=post,
+            comment=comment,
+            message=message,
+            latest_actors=[actor_entry(self.sender)],
+        ))
+
+    def send(self):
+        """Write the pending notifications now, or schedule them for commit when deferred"""
+        if self.deferred:
+            pending, self.pending = self.pending, []
+            if pending:
+                transaction.on_commit(lambda: self._write(pending))
+            return []
+        return self.flush()
+
+    def flush(self):
+        pending, self.pending = self.pending, []
+        return self._write(pending)
+
+    @staticmethod
+    def _write(pending):
+        """Returns the notifications inserted as new rows"""
+        digest_types = settings.NOTIFICATION_DIGEST_TYPES
+        if digest_types:
+            parked = [n for n in pending if n.notif_type in digest_types]
+            if parked:
+                DigestItem.objects.bulk_create([
+                    DigestItem(recipient_id=n.recipient_id, sender=n.sender, notif_type=n.notif_type,
+                               post=n.post, comment=n.comment)
+                    for n in parked
+                ])
+                pending = [n for n in pending if n.notif_type not in digest_types]
+
+        pending, folded = _coalesce(pending)
+        created = Notification.objects.bulk_create(pending) if pending else []
+        if created:
+            add_unread(n.recipient_id for n in created)
+            bump_count_scopes(*[('notifications', recipient_id)
+                                for recipient_id in {n.recipient_id for n in created}])
+        push_notifications(created + folded)
+        return created
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.send()
+        else:
+            self.pending = []
+        return False
+
+
+def actor_entry(user):
+    return {'id': user.pk, 'username': user.username}
+
+
+def fold_actor(notification, sender):
+    """
+    Make ``sender`` the latest actor of an aggregate notification. A sender
+    already among the latest actors (like, unlike, like again) is not
+    counted twice.
+    """
+    actors = [a for a in notification.latest_actors or [] if a['id'] != sender.pk]
+    if len(actors) == len(notification.latest_actors or []):
+        notification.actor_count += 1
+    notification.latest_actors = [actor_entry(sender)] + actors[:LATEST_ACTORS - 1]
+    notification.sender = sender
+    verb = ACTIVITY_VERBS.get(notification.notif_type)
+    if verb and notification.actor_count > 1:
+        others = notification.actor_count - 1
+        notification.message = f"{sender.username} and {others} other{'s' if others > 1 else ''} {verb}"
+
+
+def push_notifications(notifications):
+    if not settings.PUSH_ENABLED:
+        return
+    for notification in notifications:
+        publish_to_users([notification.recipient_id], 'notification',
+                         NotificationPushSerializer(notification).data)
+
+
+def _coalesce(pending):
+    """
+    Fold coalescable notifications into recent unread aggregates. Returns
+    ``(notifications that still need a row, updated aggregates)``.
+    """
+    window = settings.NOTIFICATION_COALESCE_WINDOW
+    coalesce_types = settings.NOTIFICATION_COALESCE_TYPES
+    if window <= 0 or not any(n.notif_type in coalesce_types for n in pending):
+        return pending, []
+
+    since = timezone.now() - timedelta(seconds=window)
+    fresh = []
+    folded = []
+    heads = {}
+    with transaction.atomic():
+        for n in pending:
+            if n.notif_type not in coalesce_types:
+                fresh.append(n)
+                continue
+            key = (n.recipient_id, n.notif_type, n.post_id, n.comment_id)
+            if key in heads:
+                fold_actor(heads[key], n.sender)
+                continue
+            # ردیف قبلی را قفل می‌کنیم تا دو لایک هم‌زمان شمارش را گم نکنند
+            existing = Notification.objects.select_for_update().filter(
+                recipient_id=n.recipient_id, notif_type=n.notif_type,
+                post_id=n.post_id, comment_id=n.comment_id,
+                is_read=False, window_started_at__gte=since
+            ).order_by('-created_at').first()
+            if existing is None:
+                heads[key] = n
+                fresh.append(n)
+                continue
+            fold_actor(existing, n.sender)
+            # ردیف تجمیعی با آخرین فعالیت به بالای لیست می‌آید
+            existing.created_at = timezone.now()
+            existing.save(update_fields=['sender', 'actor_count', 'latest_actors', 'message', 'created_at'])
+            heads[key] = existing
+            folded.append(existing)
+    return fresh, folded
+
+
+def notify(sender, recipient, notif_type, post=None, comment=None, message='', deferred=None):
+    """A batch of one, for writes that notify a single user"""
+    with NotificationBatch(sender, deferred=deferred) as batch:
+        batch.add(recipient, notif_type, post=post, comment=comment, message=message)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from notifications.unread import rebuild_unread
+
+
+class Command(BaseCommand):
+    help = 'Recompute unread notification and message counters from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append',
+                            help='Only rebuild the counters of this user id (may be repeated)')
+
+    def handle(self, *args, **options):
+        rows = rebuild_unread(options['user'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {rows} unread counters'))
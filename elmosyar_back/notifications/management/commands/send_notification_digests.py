@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications.digest import build_digests
+
+
+class Command(BaseCommand):
+    help = 'Turn parked low-priority notifications into one digest notification per user'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of recipients processed per transaction')
+        parser.add_argument('--follow', action='store_true',
+                            help='Keep running instead of exiting')
+        parser.add_argument('--interval', type=float, default=3600,
+                            help='Seconds between runs with --follow')
+
+    def handle(self, *args, **options):
+        while True:
+            written = build_digests(batch_size=options['batch_size'])
+            if written or not options['follow']:
+                self.stdout.write(f'Sent {written} digest notifications')
+            if not options['follow']:
+                break
+            time.sleep(options['interval'])
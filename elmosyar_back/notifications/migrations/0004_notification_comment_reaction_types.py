@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_notification_coalescing'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='notif_type',
+            field=models.CharField(choices=[('like', 'Like'), ('like_comment', 'Like Comment'), ('dislike_comment', 'Dislike Comment'), ('comment', 'Comment'), ('mention', 'Mention'), ('repost', 'Repost'), ('follow', 'Follow'), ('reply', 'Reply'), ('digest', 'Digest')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:27
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def start_windows_at_creation(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+    Notification.objects.update(window_started_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_notification_comment_reaction_types'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='window_started_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(start_windows_at_creation, migrations.RunPython.noop),
+    ]
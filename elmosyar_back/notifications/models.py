@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.conf import settings
 from posts.models import Post
 from interactions.models import Comment
@@ -8,11 +9,14 @@ import settings
 class Notification(models.Model):
     NOTIF_TYPE_CHOICES = [
         ('like', 'Like'),
+        ('like_comment', 'Like Comment'),
+        ('dislike_comment', 'Dislike Comment'),
         ('comment', 'Comment'),
         ('mention', 'Mention'),
         ('repost', 'Repost'),
         ('follow', 'Follow'),
         ('reply', 'Reply'),
+        ('digest', 'Digest'),
     ]
     recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notifications')
     sender = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sent_notifications')
@@ -21,6 +25,11 @@ class Notification(models.Model):
     comment = models.ForeignKey(Comment, null=True, blank=True, on_delete=models.CASCADE)
     message = models.CharField(max_length=255, blank=True)
     is_read = models.BooleanField(default=False)
+    # ردیف تجمیعی: چند نفر روی یک هدف، sender آخرین نفر است
+    actor_count = models.PositiveIntegerField(default=1)
+    latest_actors = models.JSONField(default=list, blank=True)
+    # شروع پنجره‌ی تجمیع؛ created_at با هر فعالیت جلو می‌آید و فقط برای ترتیب است
+    window_started_at = models.DateTimeField(default=timezone.now)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -35,6 +44,66 @@ class Notification(models.Model):
 
     def mark_as_read(self):
         """علامت‌گذاری نوتیفیکیشن به عنوان خوانده شده"""
+        from .unread import adjust_unread
+
+        if self.is_read:
+            return
         self.is_read = True
-        self.save()
+        self.save(update_fields=['is_read'])
+        adjust_unread([self.recipient_id], -1)
+
+
+class DigestItem(models.Model):
+    """
+    رویداد کم‌اهمیتی که منتظر خلاصه‌ی دوره‌ای است
+
+    Types listed in ``NOTIFICATION_DIGEST_TYPES`` are parked here instead of
+    becoming notifications; ``send_notification_digests`` turns each
+    recipient's items into one ``digest`` notification.
+    """
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='digest_items')
+    sender = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    notif_type = models.CharField(max_length=20)
+    post = models.ForeignKey(Post, null=True, blank=True, on_delete=models.CASCADE, related_name='+')
+    comment = models.ForeignKey(Comment, null=True, blank=True, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['recipient', 'created_at']),
+        ]
+        db_table = 'notification_digest_item'
+
+    def __str__(self):
+        return f"{self.notif_type} digest item for {self.recipient}"
+
+
+class UnreadCounter(models.Model):
+    """
+    شمارنده‌ی خوانده‌نشده‌ها برای badgeها
+
+    One row per user with ``conversation`` NULL counts unread
+    notifications; one row per (participant, conversation) counts the
+    unread messages others sent there. Maintained by ``notifications.unread``.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='unread_counters')
+    conversation = models.ForeignKey(
+        'messaging.Conversation', null=True, blank=True, on_delete=models.CASCADE, related_name='unread_counters'
+    )
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'conversation'], name='unique_unread_counter'),
+            models.UniqueConstraint(
+                fields=['user'], condition=models.Q(conversation__isnull=True),
+                name='unique_unread_notifications_counter'
+            ),
+        ]
+        db_table = 'unread_counter'
+
+    def __str__(self):
+        target = f"conversation {self.conversation_id}" if self.conversation_id else "notifications"
+        return f"{self.count} unread {target} for {self.user_id}"
 
@@ -10,7 +10,17 @@ class NotificationSerializer(serializers.ModelSerializer):
         model = Notification
         fields = [
             'id', 'sender', 'sender_info', 'notif_type', 'post', 'comment',
-            'message', 'is_read', 'created_at'
+            'message', 'actor_count', 'latest_actors', 'is_read', 'created_at'
         ]
         read_only_fields = ['created_at']
 
+
+class NotificationPushSerializer(NotificationSerializer):
+    """
+    همان شکل برای stream، ولی sender_info فقط id و username است؛
+    UserSerializer برای هر نوتیفیکیشن چند COUNT می‌زند
+    """
+    sender_info = serializers.SerializerMethodField()
+
+    def get_sender_info(self, obj):
+        return {'id': obj.sender_id, 'username': obj.sender.username}
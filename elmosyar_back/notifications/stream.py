@@ -0,0 +1,128 @@
+"""
+Stream رویدادها با Server-Sent Events روی ASGI
+
+``GET /api/stream/?token=<access token>`` keeps the response open and
+writes one ``data:`` line per event published to the user's channel in
+``core.pubsub``. Every event is ``{"type": ..., "data": ...}``:
+
+* ``ready``: sent first, with the badge counts of ``unread-summary``
+* ``notification``: a new or updated (coalesced) notification
+* ``notifications_read``: notifications marked read on another device
+* ``message``: a new message in one of the user's conversations
+* ``read``: the other participant read the user's messages
+* ``resync``: events were dropped; refetch from the REST endpoints
+
+A ``: ping`` comment goes out every ``PUSH_HEARTBEAT`` seconds so proxies
+keep the connection and dead clients are noticed. ``EventSource`` cannot
+set headers, hence the token in the query string; an ``Authorization:
+Bearer`` header works as well.
+
+This is a raw ASGI app mounted in ``asgi.py`` in front of Django; under
+WSGI (gunicorn sync workers) there is no stream and clients keep polling.
+"""
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from core.pubsub import get_broker, encode_event, user_channel
+from log_manager.log_config import log_info
+from .unread import unread_summary
+
+
+STREAM_PATH = '/api/stream/'
+
+
+def _raw_token(scope):
+    token = parse_qs(scope.get('query_string', b'').decode()).get('token')
+    if token:
+        return token[0]
+    for name, value in scope.get('headers', []):
+        if name == b'authorization':
+            parts = value.decode().split()
+            if len(parts) == 2 and parts[0] == 'Bearer':
+                return parts[1]
+    return None
+
+
+def _authenticate(raw_token):
+    """The token's user, or None for a bad token"""
+    if not raw_token:
+        return None
+    auth = JWTAuthentication()
+    try:
+        user = auth.get_user(auth.get_validated_token(raw_token))
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+    log_info(f"User '{user.username}' opened push stream", None, {'user_id': user.id})
+    return user
+
+
+def _ready_payload(user_id):
+    summary = unread_summary(user_id)
+    summary['conversations'] = {str(k): v for k, v in summary['conversations'].items()}
+    return summary
+
+
+async def _reject(send):
+    body = json.dumps({'success': False, 'message': 'Authentication required'}).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': 401,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _wait_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def stream_application(scope, receive, send):
+    user = await sync_to_async(_authenticate)(_raw_token(scope))
+    if user is None:
+        await _reject(send)
+        return
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            # nginx نباید پاسخ را بافر کند
+            (b'x-accel-buffering', b'no'),
+        ],
+    })
+
+    async def write(chunk):
+        await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+
+    # اول اشتراک، بعد شمارش‌ها؛ رویدادی که در این فاصله برسد در صف می‌ماند
+    subscription = await get_broker().subscribe(user_channel(user.id))
+    disconnect = asyncio.ensure_future(_wait_disconnect(receive))
+    try:
+        summary = await sync_to_async(_ready_payload)(user.id)
+        await write(f"retry: {settings.PUSH_RETRY_MS}\ndata: {encode_event('ready', summary)}\n\n")
+        while True:
+            next_message = asyncio.ensure_future(subscription.get(settings.PUSH_HEARTBEAT))
+            await asyncio.wait({next_message, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnect.done():
+                next_message.cancel()
+                break
+            if subscription.overflowed:
+                subscription.overflowed = False
+                await write(f"data: {encode_event('resync', None)}\n\n")
+            message = next_message.result()
+            await write(f"data: {message}\n\n" if message is not None else ": ping\n\n")
+    finally:
+        disconnect.cancel()
+        await subscription.close()
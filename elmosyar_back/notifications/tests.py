@@ -0,0 +1,299 @@
+import json
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from datetime import timedelta
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from core.pubsub import get_broker
+from posts.models import Post, Category
+from interactions.models import Comment
+from social.models import UserFollow
+from messaging.models import Conversation, Message
+from .digest import build_digests
+from .dispatch import NotificationBatch, notify
+from .models import Notification, UnreadCounter, DigestItem
+from .stream import stream_application
+from .unread import rebuild_unread, unread_summary
+
+
+User = get_user_model()
+
+class NotificationDispatchTest(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user(username="author", email="author@example.com", password="1234")
+        self.classmates = [
+            User.objects.create_user(username=f"classmate{n}", email=f"classmate{n}@example.com", password="1234")
+            for n in range(5)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def test_batch_inserts_once_and_skips_self(self):
+        post = Post.objects.create(author=self.author, category=Category.objects.create(name="notes"))
+        batch = NotificationBatch(self.author, deferred=False)
+        for user in self.classmates + [self.author, None]:
+            batch.add(user, 'mention', post=post, message='mentioned you')
+
+        # INSERT نوتیفیکیشن‌ها + ساخت و افزایش شمارنده‌ها
+        with self.assertNumQueries(3):
+            created = batch.flush()
+        self.assertEqual(len(created), 5)
+        self.assertEqual(Notification.objects.filter(notif_type='mention', post=post).count(), 5)
+        self.assertFalse(Notification.objects.filter(recipient=self.author).exists())
+
+    def test_deferred_delivery_waits_for_commit(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            notify(self.author, self.classmates[0], 'follow', deferred=True)
+            self.assertFalse(Notification.objects.exists())
+        # ثبت نوتیفیکیشن، بی‌اعتبارسازی شمارش‌ها و push آن
+        self.assertEqual(len(callbacks), 3)
+        self.assertTrue(Notification.objects.filter(recipient=self.classmates[0]).exists())
+
+        # خطا داخل بلوک: چیزی فرستاده نمی‌شود
+        with self.assertRaises(ValueError):
+            with NotificationBatch(self.author, deferred=False) as batch:
+                batch.add(self.classmates[1], 'follow')
+                raise ValueError
+        self.assertFalse(Notification.objects.filter(recipient=self.classmates[1]).exists())
+
+    @override_settings(NOTIFICATION_DELIVERY='on_commit')
+    def test_post_mentions_fan_out(self):
+        usernames = ','.join(user.username for user in self.classmates) + ',author'
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/posts/', {
+                'category': 'notes', 'attributes': '{"title": "hw"}', 'mentions': usernames
+            })
+        self.assertEqual(response.status_code, 201)
+        post = Post.objects.get(id=response.data['post']['id'])
+        self.assertEqual(post.mentions.count(), 6)
+        self.assertEqual(Notification.objects.filter(notif_type='mention', post=post).count(), 5)
+
+    def test_follow_and_unfollow(self):
+        target = self.classmates[0]
+        response = self.client.post(f'/api/users/{target.username}/follow/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['followers_count'], 1)
+        self.assertTrue(UserFollow.objects.filter(follower=self.author, following=target).exists())
+        self.assertTrue(Notification.objects.filter(recipient=target, notif_type='follow').exists())
+
+        response = self.client.post(f'/api/users/{target.username}/unfollow/')
+        self.assertEqual((response.status_code, response.data['followers_count']), (200, 0))
+
+    def test_comment_reactions_use_declared_types(self):
+        post = Post.objects.create(author=self.author)
+        comment = Comment.objects.create(post=post, user=self.classmates[0], content="nice")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/comments/{comment.id}/like/')
+            self.client.post(f'/api/comments/{comment.id}/dislike/')
+
+        notifications = Notification.objects.filter(recipient=self.classmates[0]).order_by('id')
+        self.assertEqual([n.get_notif_type_display() for n in notifications], ['Like Comment', 'Dislike Comment'])
+        for notification in notifications:
+            notification.full_clean()
+
+
+class UnreadCounterTest(TestCase):
+
+    def setUp(self):
+        self.alice = User.objects.create_user(username="alice", email="alice@example.com", password="1234")
+        self.bob = User.objects.create_user(username="bob", email="bob@example.com", password="1234")
+        self.client = APIClient()
+        self.client.force_authenticate(self.bob)
+
+    def test_notification_counter_follows_create_and_mark_read(self):
+        with NotificationBatch(self.alice, deferred=False) as batch:
+            for _ in range(3):
+                batch.add(self.bob, 'follow')
+        notify(self.alice, self.bob, 'like', deferred=False)
+        self.assertEqual(unread_summary(self.bob.id)['notifications'], 4)
+
+        first = Notification.objects.filter(recipient=self.bob).first()
+        response = self.client.post('/api/notifications/mark-read/', {'ids': [first.id]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        # دوباره خواندن همان نوتیفیکیشن چیزی کم نمی‌کند
+        self.client.post('/api/notifications/mark-read/', {'ids': [first.id]}, format='json')
+        response = self.client.get('/api/notifications/')
+        self.assertEqual(response.data['unread_count'], 3)
+
+        Notification.objects.filter(recipient=self.bob, is_read=False).first().delete()
+        self.client.post('/api/notifications/mark-read/', {}, format='json')
+        self.assertEqual(unread_summary(self.bob.id)['notifications'], 0)
+
+    def test_message_counters_and_summary(self):
+        alice_client = APIClient()
+        alice_client.force_authenticate(self.alice)
+        response = alice_client.post('/api/conversations/start/bob/')
+        self.assertEqual(response.status_code, 200)
+        conversation_id = response.data['conversation']['id']
+        for text in ('hi', 'are you there?'):
+            alice_client.post(f'/api/conversations/{conversation_id}/send/', {'content': text})
+        notify(self.alice, self.bob, 'follow', deferred=False)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/notifications/unread-summary/')
+        self.assertEqual(response.data['notifications'], 1)
+        self.assertEqual(response.data['messages'], 2)
+        self.assertEqual(response.data['conversations'], {str(conversation_id): 2})
+        # فرستنده پیام خوانده‌نشده‌ای ندارد
+        self.assertEqual(unread_summary(self.alice.id)['messages'], 0)
+
+        response = self.client.get('/api/conversations/')
+        self.assertEqual(response.data['conversations'][0]['unread_count'], 2)
+
+        Message.objects.filter(conversation_id=conversation_id).last().delete()
+        self.assertEqual(unread_summary(self.bob.id)['conversations'], {conversation_id: 1})
+
+        self.client.get(f'/api/conversations/{conversation_id}/')
+        self.assertEqual(unread_summary(self.bob.id)['messages'], 0)
+
+    def test_rebuild_matches_maintained_counters(self):
+        conversation = Conversation.objects.create()
+        conversation.participants.add(self.alice, self.bob)
+        Message.objects.create(conversation=conversation, sender=self.alice, content='hi')
+        Message.objects.create(conversation=conversation, sender=self.bob, content='hello')
+        notify(self.alice, self.bob, 'follow', deferred=False)
+        maintained = {user.id: unread_summary(user.id) for user in (self.alice, self.bob)}
+
+        UnreadCounter.objects.update(count=0)
+        rebuild_unread()
+        self.assertEqual({user.id: unread_summary(user.id) for user in (self.alice, self.bob)}, maintained)
+        self.assertEqual(maintained[self.alice.id]['messages'], 1)
+
+
+class NotificationCoalescingTest(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user(username="author", email="author@example.com", password="1234")
+        self.fans = [
+            User.objects.create_user(username=f"fan{n}", email=f"fan{n}@example.com", password="1234")
+            for n in range(4)
+        ]
+        self.post = Post.objects.create(author=self.author, category=Category.objects.create(name="notes"))
+
+    def like(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post(f'/api/posts/{self.post.id}/like/')
+
+    def test_likes_fold_into_one_row(self):
+        for fan in self.fans:
+            self.assertEqual(self.like(fan).status_code, 200)
+        # لایک، برداشتن و لایک دوباره یک نفر را دو بار نمی‌شمارد
+        self.like(self.fans[2])
+        self.like(self.fans[2])
+
+        notification = Notification.objects.get(recipient=self.author, notif_type='like')
+        self.assertEqual(notification.actor_count, 4)
+        self.assertEqual([a['username'] for a in notification.latest_actors], ['fan2', 'fan3', 'fan1'])
+        self.assertEqual(notification.sender, self.fans[2])
+        self.assertEqual(notification.message, 'fan2 and 3 others liked your post')
+        self.assertEqual(unread_summary(self.author.id)['notifications'], 1)
+
+        # بعد از خوانده شدن، لایک بعدی ردیف تازه می‌سازد
+        notification.mark_as_read()
+        self.like(self.fans[1])
+        self.like(self.fans[1])
+        self.assertEqual(Notification.objects.filter(recipient=self.author, notif_type='like').count(), 2)
+
+    @override_settings(NOTIFICATION_COALESCE_WINDOW=3600)
+    def test_window_starts_at_first_event(self):
+        self.like(self.fans[0])
+        # گروه دو ساعت پیش شروع شده؛ لایک‌های تازه‌تر created_at را جلو آورده‌اند
+        Notification.objects.update(window_started_at=timezone.now() - timedelta(hours=2))
+        self.like(self.fans[1])
+        self.assertEqual(Notification.objects.filter(recipient=self.author, notif_type='like').count(), 2)
+
+        fresh = Notification.objects.filter(recipient=self.author, notif_type='like').latest('created_at')
+        self.like(self.fans[2])
+        folded = Notification.objects.get(id=fresh.id)
+        self.assertEqual(folded.actor_count, 2)
+        # تجمیع زمان مرتب‌سازی را جلو می‌برد ولی شروع پنجره ثابت می‌ماند
+        self.assertEqual(folded.window_started_at, fresh.window_started_at)
+        self.assertGreater(folded.created_at, fresh.created_at)
+
+    @override_settings(NOTIFICATION_COALESCE_WINDOW=0)
+    def test_window_zero_disables_coalescing(self):
+        for fan in self.fans:
+            self.like(fan)
+        self.assertEqual(Notification.objects.filter(recipient=self.author, notif_type='like').count(), 4)
+
+    @override_settings(NOTIFICATION_DIGEST_TYPES=['follow'])
+    def test_digest_types_are_parked_and_summarised(self):
+        for fan in self.fans:
+            notify(fan, self.author, 'follow', deferred=False)
+        notify(self.fans[0], self.author, 'comment', post=self.post, deferred=False)
+        self.assertEqual(DigestItem.objects.count(), 4)
+        self.assertEqual(Notification.objects.filter(recipient=self.author).count(), 1)
+
+        self.assertEqual(build_digests(), 1)
+        digest = Notification.objects.get(recipient=self.author, notif_type='digest')
+        self.assertEqual(digest.message, '4 new activities: 4 follows')
+        self.assertEqual((digest.actor_count, len(digest.latest_actors)), (4, 3))
+        self.assertFalse(DigestItem.objects.exists())
+        self.assertEqual(unread_summary(self.author.id)['notifications'], 2)
+
+
+class PushStreamTest(TestCase):
+
+    def setUp(self):
+        self.alice = User.objects.create_user(username="alice", email="alice@example.com", password="1234")
+        self.bob = User.objects.create_user(username="bob", email="bob@example.com", password="1234")
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.alice, self.bob)
+
+    def open_stream(self, query_string):
+        communicator = ApplicationCommunicator(stream_application, {
+            'type': 'http', 'method': 'GET', 'path': '/api/stream/',
+            'query_string': query_string.encode(), 'headers': [],
+        })
+        return communicator
+
+    async def next_event(self, communicator):
+        body = (await communicator.receive_output(5))['body'].decode()
+        data_line = [line for line in body.splitlines() if line.startswith('data: ')][0]
+        return json.loads(data_line[len('data: '):])
+
+    async def test_rejects_bad_token(self):
+        communicator = self.open_stream('token=not-a-token')
+        await communicator.send_input({'type': 'http.request'})
+        self.assertEqual((await communicator.receive_output(5))['status'], 401)
+
+    async def test_pushes_notifications_messages_and_read_receipts(self):
+        communicator = self.open_stream(f'token={AccessToken.for_user(self.bob)}')
+        await communicator.send_input({'type': 'http.request'})
+        start = await communicator.receive_output(5)
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream; charset=utf-8'), start['headers'])
+        ready = await self.next_event(communicator)
+        self.assertEqual(ready, {'type': 'ready', 'data': {'notifications': 0, 'messages': 0, 'conversations': {}}})
+
+        def act(action):
+            with self.captureOnCommitCallbacks(execute=True):
+                action()
+
+        await sync_to_async(act)(lambda: notify(self.alice, self.bob, 'follow', deferred=False))
+        event = await self.next_event(communicator)
+        self.assertEqual((event['type'], event['data']['notif_type']), ('notification', 'follow'))
+
+        alice_client = APIClient()
+        alice_client.force_authenticate(self.alice)
+        bob_client = APIClient()
+        bob_client.force_authenticate(self.bob)
+        await sync_to_async(act)(lambda: alice_client.post(
+            f'/api/conversations/{self.conversation.id}/send/', {'content': 'hi'}
+        ))
+        event = await self.next_event(communicator)
+        self.assertEqual(event['type'], 'message')
+        self.assertEqual(event['data']['message']['content'], 'hi')
+
+        await sync_to_async(act)(lambda: bob_client.get(f'/api/conversations/{self.conversation.id}/'))
+        event = await self.next_event(communicator)
+        self.assertEqual(event['data'], {'conversation_id': self.conversation.id, 'reader_id': self.bob.id, 'count': 1})
+
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(5)
+        self.assertEqual(get_broker().subscriber_count(), 0)
@@ -0,0 +1,152 @@
+"""
+شمارنده‌های خوانده‌نشده (نوتیفیکیشن‌ها و پیام‌ها)
+
+Badges used to be computed with a ``COUNT(*)`` per request: one over the
+user's unread notifications and one per conversation in the inbox. The
+counts now live in ``UnreadCounter`` rows and are changed with single
+``UPDATE ... SET count = count + n`` statements whenever a notification or
+message is created, deleted or marked read, so a badge is one indexed
+read.
+
+Single-row writes (``objects.create``, ``delete``) are picked up by the
+signal receivers below. ``bulk_create`` and queryset ``update`` send no
+signals, so the dispatcher and the mark-read views call ``adjust_unread``
+with the number of rows they changed.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Notification, UnreadCounter
+
+
+def adjust_unread(user_ids, delta, conversation_id=None):
+    """
+    Add ``delta`` to the counters of ``user_ids`` (notifications, or the
+    given conversation). Counters never drop below zero.
+    """
+    user_ids = list(user_ids)
+    if not user_ids or not delta:
+        return
+    counters = UnreadCounter.objects.filter(user_id__in=user_ids, conversation_id=conversation_id)
+    if delta > 0:
+        # ردیف‌هایی که هنوز نیستند؛ تکراری‌ها با unique constraint رد می‌شوند
+        UnreadCounter.objects.bulk_create([
+            UnreadCounter(user_id=user_id, conversation_id=conversation_id) for user_id in user_ids
+        ], ignore_conflicts=True)
+        counters.update(count=F('count') + delta)
+    else:
+        counters.update(count=Greatest(F('count') + delta, 0))
+
+
+def add_unread(user_ids, conversation_id=None):
+    """One increment per occurrence of a user id (a user may get several notifications at once)"""
+    by_delta = {}
+    for user_id, delta in Counter(user_ids).items():
+        by_delta.setdefault(delta, []).append(user_id)
+    for delta, ids in by_delta.items():
+        adjust_unread(ids, delta, conversation_id)
+
+
+def conversation_recipients(conversation_id, sender_id):
+    """Participants of a conversation other than the sender of a message"""
+    from messaging.models import Conversation
+
+    return Conversation.participants.through.objects.filter(
+        conversation_id=conversation_id
+    ).exclude(user_id=sender_id).values_list('user_id', flat=True)
+
+
+def notifications_unread(user_id):
+    return UnreadCounter.objects.filter(
+        user_id=user_id, conversation__isnull=True
+    ).values_list('count', flat=True).first() or 0
+
+
+def conversation_unread_counts(user_id, conversation_ids=None):
+    """``{conversation_id: unread}`` for the user's non-zero conversation counters"""
+    counters = UnreadCounter.objects.filter(user_id=user_id, conversation__isnull=False, count__gt=0)
+    if conversation_ids is not None:
+        counters = counters.filter(conversation_id__in=conversation_ids)
+    return dict(counters.values_list('conversation_id', 'count'))
+
+
+def unread_summary(user_id):
+    """همه‌ی badgeهای یک کاربر با یک کوئری"""
+    summary = {'notifications': 0, 'messages': 0, 'conversations': {}}
+    for conversation_id, count in UnreadCounter.objects.filter(
+        user_id=user_id, count__gt=0
+    ).values_list('conversation_id', 'count'):
+        if conversation_id is None:
+            summary['notifications'] = count
+        else:
+            summary['conversations'][conversation_id] = count
+            summary['messages'] += count
+    return summary
+
+
+def rebuild_unread(user_ids=None):
+    """
+    Recompute counters from the notification and message tables, for all
+    users or only ``user_ids``. Used to backfill and after bulk edits that
+    bypass ``adjust_unread`` (admin actions).
+    """
+    from messaging.models import Message
+
+    notifications = Notification.objects.filter(is_read=False)
+    messages = Message.objects.filter(is_read=False).annotate(
+        participant=F('conversation__participants')
+    ).exclude(participant=F('sender_id'))
+    counters = UnreadCounter.objects.all()
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        notifications = notifications.filter(recipient_id__in=user_ids)
+        messages = messages.filter(participant__in=user_ids)
+        counters = counters.filter(user_id__in=user_ids)
+
+    rows = [
+        UnreadCounter(user_id=row['recipient_id'], count=row['n'])
+        for row in notifications.values('recipient_id').annotate(n=Count('id'))
+    ]
+    rows += [
+        UnreadCounter(user_id=row['participant'], conversation_id=row['conversation_id'], count=row['n'])
+        for row in messages.values('participant', 'conversation_id').annotate(n=Count('id'))
+    ]
+    with transaction.atomic():
+        counters.delete()
+        UnreadCounter.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+# ════════════════════════════════════════════════════════════
+# Signals
+# ════════════════════════════════════════════════════════════
+
+@receiver(post_save, sender=Notification)
+def _notification_created(sender, instance, created, **kwargs):
+    if created and not instance.is_read:
+        adjust_unread([instance.recipient_id], 1)
+
+
+@receiver(post_delete, sender=Notification)
+def _notification_deleted(sender, instance, **kwargs):
+    if not instance.is_read:
+        adjust_unread([instance.recipient_id], -1)
+
+
+@receiver(post_save, sender='messaging.Message')
+def _message_created(sender, instance, created, **kwargs):
+    if created and not instance.is_read:
+        adjust_unread(conversation_recipients(instance.conversation_id, instance.sender_id), 1,
+                      instance.conversation_id)
+
+
+@receiver(post_delete, sender='messaging.Message')
+def _message_deleted(sender, instance, **kwargs):
+    if not instance.is_read:
+        adjust_unread(conversation_recipients(instance.conversation_id, instance.sender_id), -1,
+                      instance.conversation_id)
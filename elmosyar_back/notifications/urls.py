@@ -6,4 +6,5 @@ app_name = 'notifications'
 urlpatterns = [
     path('', views.notifications_list, name='notifications_list'),
     path('mark-read/', views.notifications_mark_read, name='notifications_mark_read'),
+    path('unread-summary/', views.unread_summary, name='unread_summary'),
 ]
\ No newline at end of file
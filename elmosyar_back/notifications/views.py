@@ -2,10 +2,12 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
-from django.core.paginator import Paginator
+from core.pagination import paginate, InvalidPagination
+from core.pubsub import publish_to_users
 
 from .models import Notification
 from .serializers import NotificationSerializer
+from .unread import adjust_unread, notifications_unread, unread_summary as get_unread_summary
 
 # جایگزین کردن لاگر قدیمی
 from log_manager.log_config import log_info, log_error, log_warning
@@ -18,18 +20,21 @@ from log_manager.log_config import log_info, log_error, log_warning
 @permission_classes([IsAuthenticated])
 def notifications_list(request):
     """Get user notifications with pagination"""
-    page = int(request.GET.get('page', 1))
+    page = request.GET.get('page', 1)
     per_page = min(int(request.GET.get('per_page', 20)), 100)
     
     notifications = Notification.objects.filter(
         recipient=request.user
     ).select_related('sender', 'post', 'comment').order_by('-created_at')
     
-    paginator = Paginator(notifications, per_page)
     try:
-        notifications_page = paginator.page(page)
-    except:
-        notifications_page = paginator.page(1)
+        notifications_page, pagination = paginate(request, notifications, page, per_page, count_scopes=[('notifications', request.user.id)])
+    except InvalidPagination as e:
+        log_warning(f"Invalid pagination: {str(e)}", request)
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
     
     serializer = NotificationSerializer(notifications_page, many=True, context={'request': request})
     
@@ -39,15 +44,8 @@ def notifications_list(request):
     return Response({
         'success': True,
         'notifications': serializer.data,
-        'unread_count': Notification.objects.filter(recipient=request.user, is_read=False).count(),
-        'pagination': {
-            'page': page,
-            'per_page': per_page,
-            'total_pages': paginator.num_pages,
-            'total_count': paginator.count,
-            'has_next': notifications_page.has_next(),
-            'has_previous': notifications_page.has_previous(),
-        }
+        'unread_count': notifications_unread(request.user.id),
+        'pagination': pagination
     }, status=status.HTTP_200_OK)
 
 
@@ -66,10 +64,20 @@ def notifications_mark_read(request):
             # Mark specific notifications as read
             updated_count = Notification.objects.filter(
                 recipient=request.user,
-                id__in=ids
+                id__in=ids,
+                is_read=False
             ).update(is_read=True)
             log_info(f"User marked {updated_count} specific notifications as read", request, {'ids': ids})
         
+        # فقط ردیف‌هایی که واقعاً تغییر کردند از شمارنده کم می‌شوند
+        adjust_unread([request.user.id], -updated_count)
+        if updated_count:
+            # دستگاه‌های دیگر همین کاربر badge را به روز کنند
+            publish_to_users([request.user.id], 'notifications_read', {
+                'ids': ids or None,
+                'unread_count': notifications_unread(request.user.id),
+            })
+        
         return Response({
             'success': True,
             'message': 'Notifications marked as read'
@@ -79,4 +87,18 @@ def notifications_mark_read(request):
         return Response({
             'success': False,
             'message': 'Failed to mark notifications as read'
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def unread_summary(request):
+    """All unread badges (notifications and messages) from the maintained counters"""
+    # کلاینت‌ها این endpoint را مدام poll می‌کنند؛ لاگ دسترسی نمی‌نویسیم
+    summary = get_unread_summary(request.user.id)
+    return Response({
+        'success': True,
+        'notifications': summary['notifications'],
+        'messages': summary['messages'],
+        'conversations': {str(k): v for k, v in summary['conversations'].items()},
+    }, status=status.HTTP_200_OK)
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Post, PostMedia, CategoryFormat, Category
+from .models import Post, PostMedia, CategoryFormat, Category, MediaUpload, MediaBlob
+from .search import index_post_attributes
 
 
 class PostMediaInline(admin.TabularInline):
@@ -36,7 +37,10 @@ class PostAdmin(admin.ModelAdmin):
     ]
     list_filter = ['category', 'is_repost', 'created_at']
     search_fields = ['author__username', 'category__name']
-    readonly_fields = ['created_at', 'updated_at', 'likes_count', 'dislikes_count', 'comments_count']
+    readonly_fields = [
+        'created_at', 'updated_at', 'likes_count', 'dislikes_count',
+        'comments_count', 'reposts_count', 'replies_count'
+    ]
     date_hierarchy = 'created_at'
     filter_horizontal = ['mentions', 'saved_by']
     inlines = [PostMediaInline]
@@ -58,7 +62,7 @@ class PostAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         ('Statistics', {
-            'fields': ('likes_count', 'dislikes_count', 'comments_count'),
+            'fields': ('likes_count', 'dislikes_count', 'comments_count', 'reposts_count', 'replies_count'),
             'classes': ('collapse',)
         }),
         ('Dates', {
@@ -75,18 +79,26 @@ class PostAdmin(admin.ModelAdmin):
         return format_html('<span style="color: red;">✗</span>')
     has_media.short_description = 'Media'
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        index_post_attributes(obj)
+
 
 @admin.register(PostMedia)
 class PostMediaAdmin(admin.ModelAdmin):
-    list_display = ['id', 'post', 'media_type', 'caption', 'order', 'created_at']
+    list_display = ['id', 'post', 'media_type', 'mime_type', 'size', 'caption', 'order', 'created_at']
     list_filter = ['media_type', 'created_at']
     search_fields = ['post__id', 'caption']
-    readonly_fields = ['created_at']
+    readonly_fields = ['created_at', 'size', 'mime_type', 'width', 'height', 'duration']
     date_hierarchy = 'created_at'
     
     fieldsets = (
         ('Media Information', {
-            'fields': ('post', 'file', 'media_type', 'caption', 'order')
+            'fields': ('post', 'uploaded_by', 'file', 'media_type', 'caption', 'order')
+        }),
+        ('File Metadata', {
+            'fields': ('size', 'mime_type', 'width', 'height', 'duration'),
+            'classes': ('collapse',)
         }),
         ('Date', {
             'fields': ('created_at',),
@@ -95,6 +107,23 @@ class PostMediaAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(MediaUpload)
+class MediaUploadAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'filename', 'size', 'received', 'status', 'created_at', 'updated_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['id', 'user__username', 'filename', 'sha256']
+    readonly_fields = ['id', 'received', 'sha256', 'media', 'created_at', 'updated_at']
+    date_hierarchy = 'created_at'
+
+
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ['sha256', 'name', 'size', 'ref_count', 'created_at', 'updated_at']
+    list_filter = ['created_at']
+    search_fields = ['sha256', 'name']
+    readonly_fields = ['sha256', 'name', 'size', 'ref_count', 'created_at', 'updated_at']
+
+
 @admin.register(CategoryFormat)
 class CategoryFormatAdmin(admin.ModelAdmin):
     list_display = ['category', 'created_by', 'created_at', 'updated_at']
@@ -2,4 +2,12 @@ from django.apps import AppConfig
 
 class PostsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'posts'
\ No newline at end of file
+    name = 'posts'
+
+    def ready(self):
+        # ثبت تابع جستجوی attributes روی اتصال‌های SQLite
+        import posts.search
+        # سیگنال‌های بی‌اعتبارسازی کش نمایش پست‌ها
+        import posts.fragments
+        # شمارش ارجاع به فایل‌های ContentAddressedStorage
+        import posts.blobs
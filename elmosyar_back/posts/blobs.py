@@ -0,0 +1,76 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import MediaBlob, PostMedia, CategoryFormat
+from .storage import blob_digest
+
+
+# مدل‌هایی که فایلشان در ContentAddressedStorage ذخیره می‌شود
+BLOB_FIELDS = {
+    PostMedia: 'file',
+    CategoryFormat: 'format_file',
+}
+
+
+def acquire_blob(storage, name):
+    """Count one more reference to the blob ``name``, creating its row on first use"""
+    digest = blob_digest(name)
+    if digest is None:
+        return
+    blob, created = MediaBlob.objects.get_or_create(
+        sha256=digest, defaults={'name': name, 'size': storage.size(name), 'ref_count': 1}
+    )
+    if not created:
+        MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1, updated_at=timezone.now())
+
+
+def release_blob(storage, name):
+    """
+    Drop one reference to ``name``. The file itself is only removed by
+    ``gc_media_blobs``. Files stored before the blob store existed have no
+    row and are deleted once the transaction commits, as before.
+    """
+    if not name:
+        return
+    if blob_digest(name) is None:
+        transaction.on_commit(lambda: storage.delete(name))
+        return
+    MediaBlob.objects.filter(sha256=blob_digest(name), ref_count__gt=0).update(
+        ref_count=F('ref_count') - 1, updated_at=timezone.now()
+    )
+
+
+def _stored_name(instance):
+    field_file = getattr(instance, BLOB_FIELDS[type(instance)])
+    # فایلی که هنوز در storage نوشته نشده ارجاعی ندارد
+    return field_file.name if field_file and field_file._committed else None
+
+
+def _on_init(sender, instance, **kwargs):
+    instance._blob_name = _stored_name(instance)
+
+
+def _on_save(sender, instance, created, **kwargs):
+    field_file = getattr(instance, BLOB_FIELDS[sender])
+    old = None if created else instance._blob_name
+    new = field_file.name or None
+    if new != old:
+        if new:
+            acquire_blob(field_file.storage, new)
+        if old:
+            release_blob(field_file.storage, old)
+    instance._blob_name = new
+
+
+def _on_delete(sender, instance, **kwargs):
+    field_file = getattr(instance, BLOB_FIELDS[sender])
+    release_blob(field_file.storage, instance._blob_name)
+
+
+for _model in BLOB_FIELDS:
+    post_init.connect(_on_init, sender=_model, dispatch_uid=f'blob_init_{_model.__name__}')
+    post_save.connect(_on_save, sender=_model, dispatch_uid=f'blob_save_{_model.__name__}')
+    post_delete.connect(_on_delete, sender=_model, dispatch_uid=f'blob_delete_{_model.__name__}')
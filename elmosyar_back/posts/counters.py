@@ -0,0 +1,24 @@
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+from .models import Post
+from .fragments import invalidate_fragments
+
+
+def adjust_counters(post_id, **deltas):
+    """
+    Atomically shift the persisted counters of a post, e.g.
+    ``adjust_counters(post.id, likes_count=1, dislikes_count=-1)``.
+
+    Must be called inside the transaction of the write it accounts for.
+    Counters never go below zero even if they have drifted. The post's
+    cached fragment is invalidated when the transaction commits.
+    """
+    updates = {
+        field: Greatest(F(field) + delta, Value(0))
+        for field, delta in deltas.items()
+        if delta
+    }
+    if updates:
+        Post.objects.filter(pk=post_id).update(**updates)
+        invalidate_fragments(('post', post_id))
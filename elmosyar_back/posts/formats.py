@@ -0,0 +1,104 @@
+import json
+import re
+import threading
+
+from .models import CategoryFormat
+
+
+def attribute_value_to_str(value):
+    """
+    تبدیل مقدار یک attribute به رشته برای تطبیق با regex
+
+    Lists and dicts are matched against their JSON text, ``None`` against the
+    empty string and everything else against ``str(value)``.
+    """
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    if value is None:
+        return ""
+    return str(value)
+
+
+class CompiledFormat:
+    """
+    فرمت پارس‌شده‌ی یک دسته با الگوهای از پیش کامپایل‌شده
+    """
+
+    def __init__(self, category, data, stamp):
+        self.category = category
+        self.data = data
+        self.stamp = stamp
+        # کلیدها همیشه به صورت رشته نگه داشته می‌شوند
+        self.patterns = {str(key): re.compile(pattern) for key, pattern in data.items()}
+
+    @property
+    def keys(self):
+        return list(self.patterns)
+
+    def matches(self, key, value):
+        """Whether ``value`` matches the pattern of ``key`` (keys without a pattern always match)"""
+        pattern = self.patterns.get(str(key))
+        if pattern is None:
+            return True
+        return pattern.match(attribute_value_to_str(value)) is not None
+
+
+class FormatRegistry:
+    """
+    In-process cache of category formats, keyed by category name.
+
+    Every lookup asks the database for the format's ``(id, updated_at)``
+    stamp, which is a single indexed row read. The file is parsed and its
+    patterns compiled only when that stamp differs from the cached one. An
+    upload or delete in any worker therefore reaches every other worker on
+    its next lookup. ``invalidate`` additionally drops the local entry right
+    away.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, category):
+        """Return the ``CompiledFormat`` of a category, or ``None`` if it has no format"""
+        if not category:
+            return None
+
+        stamp = (
+            CategoryFormat.objects.filter(category=category)
+            .values_list('id', 'updated_at')
+            .first()
+        )
+        if stamp is None:
+            self.invalidate(category)
+            return None
+
+        entry = self._entries.get(category)
+        if entry is not None and entry.stamp == stamp:
+            return entry
+
+        format_obj = CategoryFormat.objects.filter(id=stamp[0]).first()
+        if not format_obj or not format_obj.format_file:
+            self.invalidate(category)
+            return None
+
+        with open(format_obj.format_file.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError(f'Format for category {category} must be a JSON object')
+
+        entry = CompiledFormat(category, data, (format_obj.id, format_obj.updated_at))
+        with self._lock:
+            self._entries[category] = entry
+        return entry
+
+    def invalidate(self, category=None):
+        """Drop the cached format of one category, or of all categories"""
+        with self._lock:
+            if category is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(category, None)
+
+
+format_registry = FormatRegistry()
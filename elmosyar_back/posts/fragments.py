@@ -0,0 +1,149 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from core.cache import namespace
+from accounts.serializers import UserSerializer
+from .models import Post, PostMedia, Category
+from .serializers import PostSerializer
+
+
+# نمایش سریال‌شده‌ی هر پست، بدون فیلدهای وابسته به بیننده
+post_fragments = namespace('post', timeout=getattr(settings, 'POST_FRAGMENT_TIMEOUT', 300))
+
+
+def _fragment_scopes(post):
+    """Everything a post's fragment is built from: the post, its category, author and mentions"""
+    scopes = [('post', post.id), ('user', post.author_id)]
+    if post.category_id:
+        scopes.append(('category', post.category_id))
+    scopes.extend(('user', user.id) for user in post.mentions.all())
+    return scopes
+
+
+def _merge_viewer_fields(data, post, post_serializer, user_serializer, request):
+    data['user_reaction'] = post_serializer.get_user_reaction(post)
+    data['is_saved'] = post_serializer.get_is_saved(post)
+
+    users = {post.author_id: post.author}
+    users.update((user.id, user) for user in post.mentions.all())
+    for user_data in [data.get('author_info')] + list(data.get('mentions') or []):
+        if not user_data:
+            continue
+        if request is not None and user_data.get('profile_picture'):
+            # مثل ImageField در DRF: آدرس مطلق از روی همین درخواست
+            user_data['profile_picture'] = request.build_absolute_uri(user_data['profile_picture'])
+        user = users.get(user_data['id'])
+        if user is None:
+            # fragment با mentionهای فعلی نمی‌خواند؛ پرچم‌ها پیش‌فرض می‌مانند
+            continue
+        user_data['is_following'] = user_serializer.get_is_following(user)
+        user_data['is_me'] = user_serializer.get_is_me(user)
+    return data
+
+
+def serialize_posts(posts, context):
+    """
+    Serialize posts like ``PostSerializer(posts, many=True, context=context)``,
+    reading the viewer-independent part of each post from the fragment cache.
+
+    Fragments are rendered without a request, so their viewer fields hold
+    neutral defaults and profile pictures are relative. ``user_reaction``,
+    ``is_saved`` and the ``is_following`` / ``is_me`` flags of the author
+    and mentions are then filled in for the current viewer, from
+    ``context['viewer']`` when present, and the picture URLs are made
+    absolute for the request. Posts should come with ``author``,
+    ``category`` and ``mentions`` loaded.
+
+    With ``POST_FRAGMENT_CACHE`` off (the default with the per-process
+    ``locmem`` cache) posts are serialized directly.
+    """
+    posts = list(posts)
+    if not posts:
+        return []
+    if not settings.POST_FRAGMENT_CACHE:
+        return PostSerializer(posts, many=True, context=context).data
+
+    keys = post_fragments.versioned_keys({post.id: _fragment_scopes(post) for post in posts})
+    fragments = post_fragments.get_many(keys.values())
+
+    missing = [post for post in posts if keys[post.id] not in fragments]
+    if missing:
+        rendered = PostSerializer(missing, many=True, context={}).data
+        fresh = {keys[post.id]: data for post, data in zip(missing, rendered)}
+        # ذخیره قبل از ادغام فیلدهای بیننده، تا نسخه‌ی کش‌شده خنثی بماند
+        post_fragments.set_many(fresh)
+        fragments.update(fresh)
+
+    post_serializer = PostSerializer(context=context)
+    user_serializer = UserSerializer(context=context)
+    return [
+        _merge_viewer_fields(dict(fragments[keys[post.id]]), post, post_serializer, user_serializer,
+                             context.get('request'))
+        for post in posts
+    ]
+
+
+def serialize_post(post, context):
+    return serialize_posts([post], context)[0]
+
+
+# ════════════════════════════════════════════════════════════
+# Invalidation
+# ════════════════════════════════════════════════════════════
+
+def invalidate_fragments(*scopes):
+    """
+    Bump fragment scopes once the current transaction commits, so a
+    concurrent reader cannot cache the pre-commit state under the new
+    version.
+    """
+    transaction.on_commit(lambda: post_fragments.bump(*scopes))
+
+
+@receiver(post_save, sender=Post)
+def _post_saved(sender, instance, created, **kwargs):
+    if created:
+        # posts_count نویسنده تغییر کرده است
+        invalidate_fragments(('post', instance.id), ('user', instance.author_id))
+    else:
+        invalidate_fragments(('post', instance.id))
+
+
+@receiver(post_delete, sender=Post)
+def _post_deleted(sender, instance, **kwargs):
+    invalidate_fragments(('post', instance.id), ('user', instance.author_id))
+
+
+@receiver([post_save, post_delete], sender=PostMedia)
+def _media_changed(sender, instance, **kwargs):
+    if instance.post_id:
+        invalidate_fragments(('post', instance.post_id))
+
+
+@receiver(m2m_changed, sender=Post.mentions.through)
+def _mentions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        invalidate_fragments(*[('post', post_id) for post_id in (pk_set or ())])
+    else:
+        invalidate_fragments(('post', instance.id))
+
+
+@receiver([post_save, post_delete], sender=Category)
+def _category_changed(sender, instance, **kwargs):
+    invalidate_fragments(('category', instance.id))
+
+
+@receiver(post_save, sender=get_user_model())
+def _user_saved(sender, instance, **kwargs):
+    invalidate_fragments(('user', instance.id))
+
+
+@receiver([post_save, post_delete], sender='social.UserFollow')
+def _follow_changed(sender, instance, **kwargs):
+    # followers_count / following_count هر دو کاربر تغییر کرده است
+    invalidate_fragments(('user', instance.follower_id), ('user', instance.following_id))
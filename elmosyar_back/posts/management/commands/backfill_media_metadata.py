@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import PostMedia
+from posts.media import probe_media
+from posts.fragments import invalidate_fragments
+
+
+METADATA_FIELDS = ('size', 'mime_type', 'width', 'height', 'duration')
+
+
+class Command(BaseCommand):
+    help = 'Record size, MIME type and dimensions of existing post media'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=200,
+                            help='Number of media rows probed per batch')
+        parser.add_argument('--all', action='store_true',
+                            help='Re-probe rows that already have metadata')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+
+        media = PostMedia.objects.exclude(file='')
+        if not options['all']:
+            media = media.filter(size=0)
+
+        last_id = 0
+        updated = 0
+        missing = 0
+
+        while True:
+            chunk = list(media.filter(id__gt=last_id).order_by('id')[:chunk_size])
+            if not chunk:
+                break
+
+            probed = []
+            for item in chunk:
+                try:
+                    with item.file.open('rb') as f:
+                        metadata = probe_media(f, item.media_type)
+                except (FileNotFoundError, OSError):
+                    missing += 1
+                    self.stderr.write(f'Missing file for media {item.id}: {item.file.name}')
+                    continue
+                for field, value in metadata.items():
+                    setattr(item, field, value)
+                probed.append(item)
+
+            if probed:
+                PostMedia.objects.bulk_update(probed, METADATA_FIELDS)
+                invalidate_fragments(*{('post', item.post_id) for item in probed})
+
+            last_id = chunk[-1].id
+            updated += len(probed)
+            self.stdout.write(f'Probed {updated} media files')
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {updated} media updated, {missing} files missing'))
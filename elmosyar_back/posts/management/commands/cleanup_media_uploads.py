@@ -0,0 +1,59 @@
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts.models import MediaUpload, PostMedia
+
+
+class Command(BaseCommand):
+    help = 'Delete abandoned chunked uploads and uploaded media never attached to a post'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=settings.MEDIA_UPLOAD_EXPIRY_HOURS,
+                            help='Age after which unfinished uploads and unattached media are removed')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be deleted')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        dry_run = options['dry_run']
+
+        # آپلودهای نیمه‌کاره؛ delete فایل موقت را هم پاک می‌کند
+        uploads = MediaUpload.objects.filter(updated_at__lt=cutoff)
+        orphans = PostMedia.objects.filter(post__isnull=True, created_at__lt=cutoff)
+
+        upload_count = uploads.count()
+        orphan_count = orphans.count()
+
+        stray_files = []
+        temp_dir = settings.MEDIA_UPLOAD_TEMP_DIR
+        if os.path.isdir(temp_dir):
+            live = {upload_id.hex for upload_id in MediaUpload.objects.values_list('id', flat=True)}
+            for name in os.listdir(temp_dir):
+                path = os.path.join(temp_dir, name)
+                if name not in live and os.path.isfile(path) \
+                        and os.path.getmtime(path) < cutoff.timestamp():
+                    stray_files.append(path)
+
+        if dry_run:
+            self.stdout.write(
+                f'Would delete {upload_count} uploads, {orphan_count} unattached media '
+                f'and {len(stray_files)} stray temp files'
+            )
+            return
+
+        for upload in uploads.iterator():
+            upload.delete()
+        # حذف تک‌به‌تک تا فایل هر رسانه هم از storage پاک شود
+        for media in orphans.iterator():
+            media.delete()
+        for path in stray_files:
+            os.remove(path)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {upload_count} uploads, {orphan_count} unattached media '
+            f'and {len(stray_files)} stray temp files'
+        ))
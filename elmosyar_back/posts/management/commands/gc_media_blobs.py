@@ -0,0 +1,131 @@
+import os
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from posts.blobs import BLOB_FIELDS
+from posts.models import MediaBlob
+from posts.storage import blob_storage, blob_digest, BLOB_PREFIX
+
+
+class Command(BaseCommand):
+    help = 'Reclaim media blobs that are no longer referenced'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=int, default=24,
+                            help='Only reclaim blobs unreferenced and untouched for this long')
+        parser.add_argument('--recount', action='store_true',
+                            help='Recompute reference counts from PostMedia and CategoryFormat first')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of blobs deleted per batch')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be deleted')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        self.dry_run = options['dry_run']
+        self.chunk_size = options['chunk_size']
+
+        if options['recount']:
+            self.recount()
+
+        reclaimed, freed = self.reclaim_unreferenced(cutoff)
+        orphans = self.remove_orphan_files(cutoff)
+
+        verb = 'Would reclaim' if self.dry_run else 'Reclaimed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {reclaimed} blobs ({freed} bytes) and {orphans} files without a blob row'
+        ))
+
+    def _is_recent(self, name, cutoff):
+        # آپلودی که همین الان محتوای یکسان را ذخیره کرده mtime فایل را جلو برده است
+        try:
+            return os.path.getmtime(blob_storage.path(name)) >= cutoff.timestamp()
+        except FileNotFoundError:
+            return False
+
+    def recount(self):
+        refs = Counter()
+        for model, field in BLOB_FIELDS.items():
+            rows = (model.objects.filter(**{f'{field}__startswith': BLOB_PREFIX})
+                    .values(field).annotate(n=Count('id')).values_list(field, 'n'))
+            for name, count in rows:
+                refs[blob_digest(name)] += count
+
+        changed = []
+        for blob in MediaBlob.objects.all().iterator():
+            if blob.ref_count != refs.get(blob.sha256, 0):
+                blob.ref_count = refs.get(blob.sha256, 0)
+                changed.append(blob)
+        if changed and not self.dry_run:
+            MediaBlob.objects.bulk_update(changed, ['ref_count'], batch_size=self.chunk_size)
+        self.stdout.write(f'Recounted references: {len(changed)} blobs corrected')
+
+    def reclaim_unreferenced(self, cutoff):
+        candidates = MediaBlob.objects.filter(ref_count__lte=0, updated_at__lt=cutoff)
+        last_id = 0
+        reclaimed = 0
+        freed = 0
+
+        while True:
+            chunk = list(candidates.filter(id__gt=last_id).order_by('id')[:self.chunk_size])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+
+            chunk = [blob for blob in chunk if not self._is_recent(blob.name, cutoff)]
+            if not chunk:
+                continue
+            if self.dry_run:
+                reclaimed += len(chunk)
+                freed += sum(blob.size for blob in chunk)
+                continue
+
+            ids = [blob.id for blob in chunk]
+            # ردیف‌ها اول و به شرط صفر بودن ارجاع حذف می‌شوند؛ blobی که
+            # در این فاصله دوباره ارجاع گرفته باقی می‌ماند
+            MediaBlob.objects.filter(id__in=ids, ref_count__lte=0).delete()
+            survivors = set(MediaBlob.objects.filter(id__in=ids).values_list('id', flat=True))
+            for blob in chunk:
+                if blob.id not in survivors:
+                    # نسخه‌های دیگری با پسوند متفاوت هم (اگر دو آپلود هم‌زمان ساخته باشند) حذف می‌شوند
+                    for name in set(blob_storage.digest_names(blob.sha256)) | {blob.name}:
+                        blob_storage.delete(name)
+                    reclaimed += 1
+                    freed += blob.size
+
+        return reclaimed, freed
+
+    def remove_orphan_files(self, cutoff):
+        """Files under ``blobs/`` with no row: interrupted writes or failed saves"""
+        root = blob_storage.path(BLOB_PREFIX)
+        if not os.path.isdir(root):
+            return 0
+
+        removed = 0
+        batch = []
+        for directory, _, files in os.walk(root):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, blob_storage.location).replace(os.sep, '/')
+                if os.path.getmtime(path) < cutoff.timestamp():
+                    batch.append(name)
+                if len(batch) >= self.chunk_size:
+                    removed += self._remove_unknown(batch)
+                    batch = []
+        if batch:
+            removed += self._remove_unknown(batch)
+        return removed
+
+    def _remove_unknown(self, names):
+        # فایل‌ها با digest نامشان سنجیده می‌شوند، نه نام کامل؛ پسوند ممکن است با ردیف فرق کند
+        digests = {blob_digest(name) for name in names} - {None}
+        known = set(MediaBlob.objects.filter(sha256__in=digests).values_list('sha256', flat=True))
+        unknown = [name for name in names if blob_digest(name) not in known]
+        if not self.dry_run:
+            for name in unknown:
+                blob_storage.delete(name)
+        return len(unknown)
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import Post, PostAttributeIndex
+from posts.search import attribute_index_rows
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the PostAttributeIndex table from post attributes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of posts reindexed per transaction')
+        parser.add_argument('--category', type=str, default=None,
+                            help='Only reindex posts of this category name')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        category = options['category']
+
+        posts = Post.objects.filter(category__isnull=False).only('id', 'category_id', 'attributes')
+        if category:
+            posts = posts.filter(category__name=category)
+
+        last_id = 0
+        scanned = 0
+        indexed = 0
+
+        while True:
+            chunk = list(posts.filter(id__gt=last_id).order_by('id')[:chunk_size])
+            if not chunk:
+                break
+
+            rows = []
+            for post in chunk:
+                rows.extend(attribute_index_rows(post))
+
+            with transaction.atomic():
+                PostAttributeIndex.objects.filter(post_id__in=[post.id for post in chunk]).delete()
+                PostAttributeIndex.objects.bulk_create(rows)
+
+            last_id = chunk[-1].id
+            scanned += len(chunk)
+            indexed += len(rows)
+            self.stdout.write(f'Indexed {scanned} posts ({indexed} attributes)')
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {scanned} posts, {indexed} attributes indexed'))
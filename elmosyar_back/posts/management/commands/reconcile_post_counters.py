@@ -0,0 +1,103 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from interactions.models import Reaction, Comment
+from posts.models import Post
+from posts.fragments import invalidate_fragments
+
+
+# ستون شمارنده روی Post -> نام annotation محاسبه‌شده از جداول اصلی
+COUNTER_ANNOTATIONS = {
+    'likes_count': 'num_likes',
+    'dislikes_count': 'num_dislikes',
+    'comments_count': 'num_comments',
+    'reposts_count': 'num_reposts',
+    'replies_count': 'num_replies',
+}
+
+COUNTER_FIELDS = tuple(COUNTER_ANNOTATIONS)
+
+
+def _count_subquery(queryset, field):
+    """
+    یک subquery همبسته که تعداد ردیف‌های مرتبط با هر پست را برمی‌گرداند
+    """
+    counts = (
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')[:1]
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def with_engagement_counts(queryset):
+    """
+    Annotate a post queryset with the engagement counts computed from the
+    reaction, comment and post tables (``num_likes``, ``num_dislikes``, ...),
+    the source of truth the persisted ``*_count`` columns are checked against.
+    """
+    return queryset.annotate(
+        num_likes=_count_subquery(Reaction.objects.filter(reaction='like'), 'post'),
+        num_dislikes=_count_subquery(Reaction.objects.filter(reaction='dislike'), 'post'),
+        num_comments=_count_subquery(Comment.objects.all(), 'post'),
+        num_reposts=_count_subquery(Post.objects.filter(is_repost=True), 'original_post'),
+        num_replies=_count_subquery(Post.objects.all(), 'parent'),
+    )
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized engagement counters on posts and repair drifted rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of posts recomputed per transaction')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report drifted posts without writing')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        dry_run = options['dry_run']
+
+        last_id = 0
+        scanned = 0
+        repaired = 0
+
+        while True:
+            with transaction.atomic():
+                # قفل روی ردیف‌های همین chunk تا افزایش‌های همزمان F() گم نشوند
+                chunk = list(
+                    with_engagement_counts(
+                        Post.objects.select_for_update()
+                        .filter(id__gt=last_id)
+                        .only('id', *COUNTER_FIELDS)
+                    ).order_by('id')[:chunk_size]
+                )
+                if not chunk:
+                    break
+
+                drifted = []
+                for post in chunk:
+                    changed = False
+                    for field, annotation in COUNTER_ANNOTATIONS.items():
+                        actual = getattr(post, annotation)
+                        if getattr(post, field) != actual:
+                            setattr(post, field, actual)
+                            changed = True
+                    if changed:
+                        drifted.append(post)
+
+                if drifted and not dry_run:
+                    Post.objects.bulk_update(drifted, COUNTER_FIELDS)
+                    invalidate_fragments(*[('post', post.id) for post in drifted])
+
+            last_id = chunk[-1].id
+            scanned += len(chunk)
+            repaired += len(drifted)
+            self.stdout.write(f'Scanned {scanned} posts, {repaired} drifted')
+
+        verb = 'would be repaired' if dry_run else 'repaired'
+        self.stdout.write(self.style.SUCCESS(f'Done: {scanned} posts scanned, {repaired} {verb}'))
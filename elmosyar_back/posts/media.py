@@ -0,0 +1,112 @@
+import mimetypes
+import struct
+
+from PIL import Image
+
+
+# ════════════════════════════════════════════════════════════
+# MP4 / MOV / M4A
+# ════════════════════════════════════════════════════════════
+
+# باکس‌هایی که فقط باکس‌های دیگر را در خود دارند
+_MP4_CONTAINERS = {b'moov', b'trak', b'mdia', b'minf', b'stbl', b'edts'}
+
+
+def _mp4_boxes(f, start, end):
+    """Yield ``(type, content_start, box_end)`` for each box between two offsets"""
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack('>I4s', header)
+        header_size = 8
+        if size == 1:
+            extended = f.read(8)
+            if len(extended) < 8:
+                return
+            size = struct.unpack('>Q', extended)[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size:
+            return
+        yield box_type, offset + header_size, offset + size
+        offset += size
+
+
+def _read_at(f, offset, length):
+    f.seek(offset)
+    data = f.read(length)
+    if len(data) < length:
+        raise ValueError('Truncated MP4 box')
+    return data
+
+
+def _walk_mp4(f, start, end, result):
+    for box_type, content, box_end in _mp4_boxes(f, start, end):
+        if box_type == b'mvhd':
+            version = _read_at(f, content, 1)[0]
+            if version == 1:
+                timescale, duration = struct.unpack('>IQ', _read_at(f, content + 20, 12))
+            else:
+                timescale, duration = struct.unpack('>II', _read_at(f, content + 12, 8))
+            if timescale:
+                result['duration'] = round(duration / timescale, 3)
+        elif box_type == b'tkhd' and 'width' not in result:
+            version = _read_at(f, content, 1)[0]
+            dimensions_at = content + (88 if version == 1 else 76)
+            width, height = struct.unpack('>II', _read_at(f, dimensions_at, 8))
+            # اعداد 16.16 fixed-point هستند؛ ترک‌های صوتی عرض و ارتفاع صفر دارند
+            if width >> 16 and height >> 16:
+                result['width'], result['height'] = width >> 16, height >> 16
+        elif box_type in _MP4_CONTAINERS:
+            _walk_mp4(f, content, box_end, result)
+
+
+def probe_mp4(f):
+    """Duration and video dimensions from the ``moov`` box, reading only box headers"""
+    f.seek(0, 2)
+    end = f.tell()
+    result = {}
+    for box_type, content, box_end in _mp4_boxes(f, 0, end):
+        if box_type == b'moov':
+            _walk_mp4(f, content, box_end, result)
+            break
+    return result
+
+
+# ════════════════════════════════════════════════════════════
+# Probe
+# ════════════════════════════════════════════════════════════
+
+def guess_mime_type(file, content_type=None):
+    return content_type or mimetypes.guess_type(getattr(file, 'name', '') or '')[0] or ''
+
+
+def probe_media(file, media_type, content_type=None):
+    """
+    اطلاعات فایل رسانه: حجم، MIME و در صورت امکان ابعاد و مدت زمان
+
+    Returns a dict of ``PostMedia`` field values. Only headers are read: the
+    image header through Pillow, and the box headers of MP4-family
+    containers for video and audio. Files that cannot be parsed only get
+    size and MIME type. The file position is reset to the start.
+    """
+    mime_type = guess_mime_type(file, content_type)
+    metadata = {'size': file.size or 0, 'mime_type': mime_type[:100]}
+
+    try:
+        file.seek(0)
+        if media_type == 'image':
+            with Image.open(file) as image:
+                metadata['width'], metadata['height'] = image.size
+        elif media_type in ('video', 'audio'):
+            metadata.update(probe_mp4(file))
+    except Exception:
+        pass
+    finally:
+        file.seek(0)
+
+    return metadata
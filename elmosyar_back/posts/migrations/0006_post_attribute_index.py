@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-17 18:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_post_engagement_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostAttributeIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255)),
+                ('value_text', models.CharField(blank=True, max_length=255)),
+                ('value_num', models.FloatField(blank=True, null=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attribute_index', to='posts.category')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attribute_index', to='posts.post')),
+            ],
+            options={
+                'db_table': 'post_attribute_index',
+                'indexes': [models.Index(fields=['category', 'key', 'value_text'], name='post_attrib_categor_86fb97_idx'), models.Index(fields=['category', 'key', 'value_num'], name='post_attrib_categor_bef37d_idx')],
+                'constraints': [models.UniqueConstraint(fields=('post', 'key'), name='unique_post_attribute_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_media_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postmedia',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:18
+
+import posts.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_postmedia_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='categoryformat',
+            name='format_file',
+            field=models.FileField(storage=posts.storage.get_blob_storage, upload_to='category_formats/'),
+        ),
+        migrations.AlterField(
+            model_name='postmedia',
+            name='file',
+            field=models.FileField(storage=posts.storage.get_blob_storage, upload_to='posts/media/'),
+        ),
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('ref_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'media_blob',
+                'indexes': [models.Index(fields=['ref_count', 'updated_at'], name='media_blob_ref_cou_c51b09_idx')],
+            },
+        ),
+    ]
@@ -1,6 +1,9 @@
 from django.db import models
 from django.conf import settings
 import os
+import uuid
+
+from .storage import get_blob_storage
 
 
 class Category(models.Model):
@@ -29,6 +32,13 @@ class Post(models.Model):
     saved_by = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='saved_posts', blank=True)
     attributes = models.JSONField(default=dict, blank=True)
 
+    # شمارنده‌های ذخیره‌شده؛ در همان تراکنش نوشتن با F() به‌روزرسانی می‌شوند
+    likes_count = models.PositiveIntegerField(default=0)
+    dislikes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    reposts_count = models.PositiveIntegerField(default=0)
+    replies_count = models.PositiveIntegerField(default=0)
+
     class Meta:
         ordering = ['-created_at']
         indexes = [
@@ -40,18 +50,6 @@ class Post(models.Model):
     def __str__(self):
         return f"Post by {self.author} at {self.created_at}"[:50]
 
-    @property
-    def likes_count(self):
-        return self.reactions.filter(reaction='like').count()
-
-    @property
-    def dislikes_count(self):
-        return self.reactions.filter(reaction='dislike').count()
-
-    @property
-    def comments_count(self):
-        return self.comments.count()
-    
     @property
     def is_anonymous(self):
         """بررسی می‌کند آیا پست در یک کتگوری ناشناس است یا نه"""
@@ -78,13 +76,26 @@ class PostMedia(models.Model):
         ("audio", "Audio"),
         ("file", "File"),
     ]
-    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='media')
-    file = models.FileField(upload_to='posts/media/')
+    # رسانه‌ای که با آپلود تکه‌ای ساخته شده تا زمان ساخت پست به هیچ پستی وصل نیست
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='media', null=True, blank=True)
+    uploaded_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='uploaded_media'
+    )
+    file = models.FileField(upload_to='posts/media/', storage=get_blob_storage)
     media_type = models.CharField(max_length=10, choices=MEDIA_TYPE_CHOICES)
     created_at = models.DateTimeField(auto_now_add=True)
     caption = models.CharField(max_length=255, blank=True)
     order = models.PositiveIntegerField(default=0)
 
+    # اطلاعات فایل که هنگام آپلود ثبت می‌شود تا سریالایزر به storage دست نزند
+    size = models.PositiveBigIntegerField(default=0)
+    mime_type = models.CharField(max_length=100, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    duration = models.FloatField(null=True, blank=True)
+    # thumbnail و نسخه‌های WebP که core.images در پس‌زمینه می‌سازد
+    variants = models.JSONField(default=dict, blank=True)
+
     class Meta:
         ordering = ['order', 'created_at']
         db_table = 'postmedia'
@@ -92,16 +103,87 @@ class PostMedia(models.Model):
     def __str__(self):
         return f"Media for post {self.post_id} ({self.media_type})"
 
+    def save(self, *args, **kwargs):
+        # فایل تازه آپلود شده (هنوز در storage نوشته نشده)
+        if self.file and not self.file._committed:
+            from .media import probe_media
+            content_type = getattr(self.file.file, 'content_type', None)
+            for field, value in probe_media(self.file, self.media_type, content_type).items():
+                setattr(self, field, value)
+        super().save(*args, **kwargs)
+
+
+class MediaBlob(models.Model):
+    """
+    یک فایل ذخیره‌شده در ContentAddressedStorage و تعداد ارجاع‌ها به آن
+
+    ``ref_count`` is kept by the signals in ``posts.blobs``. Blobs that
+    drop to zero stay on disk until ``gc_media_blobs`` reclaims them.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'media_blob'
+        indexes = [
+            models.Index(fields=['ref_count', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"Blob {self.sha256[:12]} ({self.ref_count} refs)"
+
+
+class MediaUpload(models.Model):
+    """
+    آپلود تکه‌ای و قابل ادامه‌ی یک فایل رسانه
+
+    Chunks are appended to a file under ``MEDIA_UPLOAD_TEMP_DIR``. Once
+    ``received`` reaches ``size`` the upload is completed into a
+    ``PostMedia`` that is not yet attached to any post.
+    """
+    STATUS_CHOICES = [
+        ("uploading", "Uploading"),
+        ("finalizing", "Finalizing"),
+        ("complete", "Complete"),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='media_uploads')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='uploading')
+    media = models.ForeignKey(PostMedia, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'media_upload'
+        indexes = [
+            models.Index(fields=['status', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"Upload {self.id} by {self.user_id} ({self.received}/{self.size})"
+
+    @property
+    def temp_path(self):
+        return os.path.join(settings.MEDIA_UPLOAD_TEMP_DIR, self.id.hex)
+
     def delete(self, *args, **kwargs):
-        if self.file:
-            if os.path.isfile(self.file.path):
-                os.remove(self.file.path)
+        if os.path.isfile(self.temp_path):
+            os.remove(self.temp_path)
         super().delete(*args, **kwargs)
 
 
 class CategoryFormat(models.Model):
     category = models.CharField(max_length=255, unique=True, db_index=True)
-    format_file = models.FileField(upload_to='category_formats/')
+    format_file = models.FileField(upload_to='category_formats/', storage=get_blob_storage)
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -112,8 +194,30 @@ class CategoryFormat(models.Model):
     def __str__(self):
         return f"Format for {self.category}"
 
-    def delete(self, *args, **kwargs):
-        if self.format_file:
-            if os.path.isfile(self.format_file.path):
-                os.remove(self.format_file.path)
-        super().delete(*args, **kwargs)
\ No newline at end of file
+
+class PostAttributeIndex(models.Model):
+    """
+    ایندکس معکوس attributes پست‌ها: یک ردیف برای هر کلید هر پست
+
+    ``value_text`` is the normalized (stripped, casefolded) string form of the
+    value, used for exact and prefix filters. ``value_num`` holds the value as
+    a number when it is numeric, for range filters.
+    """
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='attribute_index')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='attribute_index')
+    key = models.CharField(max_length=255)
+    value_text = models.CharField(max_length=255, blank=True)
+    value_num = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'post_attribute_index'
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'key'], name='unique_post_attribute_key'),
+        ]
+        indexes = [
+            models.Index(fields=['category', 'key', 'value_text']),
+            models.Index(fields=['category', 'key', 'value_num']),
+        ]
+
+    def __str__(self):
+        return f"{self.key}={self.value_text} (post {self.post_id})"
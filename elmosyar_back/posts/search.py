@@ -0,0 +1,205 @@
+import functools
+import json
+import math
+import re
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import BooleanField, Func, Q, Value
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.lookups import Regex
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .formats import attribute_value_to_str
+from .models import PostAttributeIndex
+
+
+SQLITE_ATTRIBUTE_MATCH = 'elmosyar_attr_match'
+
+
+@functools.lru_cache(maxsize=256)
+def _compile(pattern):
+    return re.compile(pattern)
+
+
+def _sqlite_attribute_match(attributes_json, key, pattern):
+    """
+    همان منطق جستجوی قبلی در پایتون، اما داخل خود SQLite اجرا می‌شود
+    """
+    if attributes_json is None:
+        return False
+    try:
+        attributes = json.loads(attributes_json)
+    except ValueError:
+        return False
+    if not isinstance(attributes, dict) or key not in attributes:
+        return False
+    return _compile(pattern).match(attribute_value_to_str(attributes[key])) is not None
+
+
+@receiver(connection_created)
+def register_sqlite_functions(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function(
+            SQLITE_ATTRIBUTE_MATCH, 3, _sqlite_attribute_match, deterministic=True
+        )
+
+
+class AttributeMatch(Func):
+    """``re.match(pattern, str(attributes[key]))`` evaluated by the registered SQLite function"""
+    function = SQLITE_ATTRIBUTE_MATCH
+    output_field = BooleanField()
+
+    def __init__(self, key, pattern):
+        super().__init__('attributes', Value(key), Value(pattern))
+
+
+def attribute_match(key, pattern):
+    """
+    A boolean expression that is true when ``attributes[key]`` exists and
+    its value matches ``pattern`` from the start, as ``re.match`` would.
+
+    SQLite runs the exact Python semantics through a registered function.
+    Other backends use a JSON key lookup with a ``^``-anchored regex. There,
+    lists, booleans and null values follow the database's JSON text, and the
+    pattern uses the database's regex dialect.
+    """
+    if connection.vendor == 'sqlite':
+        return AttributeMatch(key, pattern)
+    return Regex(KeyTextTransform(key, 'attributes'), f'^(?:{pattern})')
+
+
+def build_attribute_search(search_criteria, format_keys):
+    """
+    Turn ``{key_regex: value_regex}`` search criteria into a ``Q``.
+
+    Each key regex is matched against the category's format keys. A post
+    satisfies a criterion when any of the matching keys has a value that
+    matches the value regex, and it must satisfy every criterion. Returns
+    ``None`` when a key regex matches no format key, which means that no
+    post can match.
+    """
+    query = Q()
+    for key_regex, value_regex in search_criteria.items():
+        try:
+            key_pattern = re.compile(key_regex)
+            re.compile(value_regex)
+        except (re.error, TypeError) as e:
+            raise ValidationError(f'Invalid regex pattern in search: {e}')
+
+        matching_keys = [key for key in format_keys if key_pattern.match(key)]
+        if not matching_keys:
+            return None
+
+        criterion = Q()
+        for key in matching_keys:
+            criterion |= Q(attribute_match(key, value_regex))
+        query &= criterion
+    return query
+
+
+# ════════════════════════════════════════════════════════════
+# ایندکس معکوس attributes
+# ════════════════════════════════════════════════════════════
+
+INDEX_VALUE_MAX_LENGTH = 255
+
+# عملگرهای قابل استفاده در attr_filter
+INDEX_OPERATORS = ('eq', 'prefix', 'lt', 'lte', 'gt', 'gte')
+
+
+def normalize_index_text(value):
+    return attribute_value_to_str(value).strip().casefold()[:INDEX_VALUE_MAX_LENGTH]
+
+
+def normalize_index_number(value):
+    """The value as a finite float, or ``None`` when it is not numeric"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        number = float(value)
+    elif isinstance(value, str):
+        try:
+            number = float(value.strip())
+        except ValueError:
+            return None
+    else:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def attribute_index_rows(post):
+    """Build (unsaved) index rows for a post; posts without a category are not indexed"""
+    if not post.category_id or not isinstance(post.attributes, dict):
+        return []
+    return [
+        PostAttributeIndex(
+            post_id=post.id,
+            category_id=post.category_id,
+            key=str(key),
+            value_text=normalize_index_text(value),
+            value_num=normalize_index_number(value),
+        )
+        for key, value in post.attributes.items()
+        if len(str(key)) <= INDEX_VALUE_MAX_LENGTH
+    ]
+
+
+def index_post_attributes(post):
+    """
+    Replace the index rows of a post with its current attributes.
+    Call it inside the transaction that created or updated the post.
+    """
+    PostAttributeIndex.objects.filter(post_id=post.id).delete()
+    PostAttributeIndex.objects.bulk_create(attribute_index_rows(post))
+
+
+def _index_condition(operator, operand):
+    if operator == 'eq':
+        if isinstance(operand, (int, float)) and not isinstance(operand, bool):
+            return {'value_num': float(operand)}
+        return {'value_text': normalize_index_text(operand)}
+    if operator == 'prefix':
+        if not isinstance(operand, str):
+            raise ValidationError('"prefix" expects a string')
+        return {'value_text__startswith': normalize_index_text(operand)}
+
+    number = normalize_index_number(operand)
+    if number is None:
+        raise ValidationError(f'"{operator}" expects a number')
+    return {f'value_num__{operator}': number}
+
+
+def filter_by_attribute_index(queryset, filters, category_id):
+    """
+    Filter posts of a category through ``PostAttributeIndex``.
+
+    ``filters`` maps attribute keys to either a plain value (exact match) or
+    an object of operators, e.g.
+    ``{"price": {"lt": 50000}, "title": {"prefix": "calc"}, "isbn": "978"}``.
+    Each key becomes one subquery on the ``(category, key, value)`` indexes,
+    and all keys must match.
+    """
+    if not isinstance(filters, dict) or not filters:
+        raise ValidationError('attr_filter must be a non-empty JSON object')
+
+    for key, spec in filters.items():
+        if not isinstance(spec, dict):
+            spec = {'eq': spec}
+        if not spec:
+            raise ValidationError(f'No operator given for attribute "{key}"')
+
+        conditions = {}
+        for operator, operand in spec.items():
+            if operator not in INDEX_OPERATORS:
+                raise ValidationError(
+                    f'Unknown operator "{operator}", expected one of: {", ".join(INDEX_OPERATORS)}'
+                )
+            conditions.update(_index_condition(operator, operand))
+
+        matching = PostAttributeIndex.objects.filter(
+            category_id=category_id, key=str(key), **conditions
+        ).values('post_id')
+        queryset = queryset.filter(id__in=matching)
+    return queryset
@@ -1,21 +1,33 @@
 from rest_framework import serializers
 from accounts.serializers import UserSerializer
+from core.images import thumbnail_url, srcset
 from .models import Post, PostMedia, CategoryFormat, Category
 
 
 class PostMediaSerializer(serializers.ModelSerializer):
     url = serializers.SerializerMethodField()
     file_size = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = PostMedia
-        fields = ['id', 'url', 'media_type', 'caption', 'order', 'file_size']
+        fields = [
+            'id', 'url', 'media_type', 'caption', 'order', 'file_size',
+            'mime_type', 'width', 'height', 'duration', 'thumbnail', 'srcset'
+        ]
 
     def get_url(self, obj):
         return obj.file.url if obj.file else ''
 
     def get_file_size(self, obj):
-        return obj.file.size if obj.file else 0
+        return obj.size
+
+    def get_thumbnail(self, obj):
+        return thumbnail_url(obj.file, obj.variants) if obj.file else None
+
+    def get_srcset(self, obj):
+        return srcset(obj.file, obj.variants) if obj.file else ''
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -31,11 +43,6 @@ class PostSerializer(serializers.ModelSerializer):
     media = PostMediaSerializer(many=True, read_only=True)
     mentions = serializers.SerializerMethodField()
     category_info = CategorySerializer(source='category', read_only=True)
-    likes_count = serializers.SerializerMethodField()
-    dislikes_count = serializers.SerializerMethodField()
-    comments_count = serializers.SerializerMethodField()
-    reposts_count = serializers.SerializerMethodField()
-    replies_count = serializers.SerializerMethodField()
     user_reaction = serializers.SerializerMethodField()
     is_saved = serializers.SerializerMethodField()
     attributes = serializers.JSONField(default=dict, required=False)
@@ -48,7 +55,10 @@ class PostSerializer(serializers.ModelSerializer):
             'original_post', 'likes_count', 'dislikes_count', 'comments_count',
             'reposts_count', 'replies_count', 'user_reaction', 'is_saved', 'attributes'
         ]
-        read_only_fields = ['created_at', 'updated_at']
+        read_only_fields = [
+            'created_at', 'updated_at', 'likes_count', 'dislikes_count',
+            'comments_count', 'reposts_count', 'replies_count'
+        ]
 
     def get_author(self, obj):
         """
@@ -84,22 +94,10 @@ class PostSerializer(serializers.ModelSerializer):
         
         return UserSerializer(obj.mentions.all(), many=True, context=self.context).data
 
-    def get_likes_count(self, obj):
-        return obj.reactions.filter(reaction='like').count()
-
-    def get_dislikes_count(self, obj):
-        return obj.reactions.filter(reaction='dislike').count()
-
-    def get_comments_count(self, obj):
-        return obj.comments.count()
-
-    def get_reposts_count(self, obj):
-        return Post.objects.filter(original_post=obj, is_repost=True).count()
-
-    def get_replies_count(self, obj):
-        return obj.replies.count()
-
     def get_user_reaction(self, obj):
+        viewer = self.context.get('viewer')
+        if viewer and viewer.knows_post(obj.id):
+            return viewer.reaction_for(obj.id)
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             reaction = obj.reactions.filter(user=request.user).first()
@@ -107,6 +105,9 @@ class PostSerializer(serializers.ModelSerializer):
         return None
 
     def get_is_saved(self, obj):
+        viewer = self.context.get('viewer')
+        if viewer and viewer.knows_post(obj.id):
+            return viewer.has_saved(obj.id)
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return obj.saved_by.filter(id=request.user.id).exists()
@@ -0,0 +1,87 @@
+import hashlib
+import os
+import re
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+BLOB_PREFIX = 'blobs/'
+_BLOB_NAME = re.compile(r'^blobs/[0-9a-f]{2}/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})(\.[\w]+)?$')
+
+
+def blob_digest(name):
+    """The SHA-256 encoded in a blob name, or None for files outside the blob store"""
+    match = _BLOB_NAME.match(name or '')
+    return match.group('digest') if match else None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    ذخیره‌ی فایل بر اساس SHA-256 محتوا: فایل‌های یکسان فقط یک بار نوشته می‌شوند
+
+    The name passed in only contributes its extension; the stored name is
+    ``blobs/ab/cd/<sha256><ext>``. Content is read once: it is copied to a
+    staging file under ``blobs/tmp/`` while being hashed, then renamed to
+    its blob name, or dropped if a blob with that digest already exists.
+    The existing blob keeps its extension, so the same bytes uploaded as
+    ``a.jpg`` and ``b.jpeg`` share the single ``.jpg`` file, matching the
+    one ``MediaBlob`` row per digest.
+
+    The storage itself keeps no counts. ``posts.blobs`` tracks references
+    in ``MediaBlob`` and ``gc_media_blobs`` removes unreferenced blobs.
+    """
+
+    def blob_name(self, digest, name):
+        ext = os.path.splitext(name)[1].lower()
+        if not re.fullmatch(r'\.\w{1,10}', ext):
+            ext = ''
+        return f'{BLOB_PREFIX}{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+
+    def digest_names(self, digest):
+        """Stored names of every file holding ``digest``, whatever their extension"""
+        directory = f'{BLOB_PREFIX}{digest[:2]}/{digest[2:4]}/'
+        try:
+            _, files = self.listdir(directory)
+        except FileNotFoundError:
+            return []
+        return sorted(directory + filename for filename in files if blob_digest(directory + filename) == digest)
+
+    def _save(self, name, content):
+        partial, digest = self._copy_hashing(content)
+        existing = self.digest_names(digest)
+        if existing:
+            name = existing[0]
+            os.remove(self.path(partial))
+            # به‌روز کردن mtime تا gc_media_blobs در فاصله‌ی ثبت ارجاع آن را پاک نکند
+            os.utime(self.path(name))
+            return name
+
+        name = self.blob_name(digest, name)
+        # جابه‌جایی اتمیک؛ دو آپلود همزمان یک محتوا را می‌نویسند
+        os.makedirs(os.path.dirname(self.path(name)), exist_ok=True)
+        os.replace(self.path(partial), self.path(name))
+        return name
+
+    def _copy_hashing(self, content):
+        """Copy ``content`` to a staging file in one pass; returns ``(staging name, sha256)``"""
+        partial = f'{BLOB_PREFIX}tmp/{uuid.uuid4().hex}.part'
+        path = self.path(partial)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        digest = hashlib.sha256()
+        with open(path, 'wb') as f:
+            for chunk in content.chunks():
+                digest.update(chunk)
+                f.write(chunk)
+        if self.file_permissions_mode is not None:
+            os.chmod(path, self.file_permissions_mode)
+        return partial, digest.hexdigest()
+
+
+blob_storage = ContentAddressedStorage()
+
+
+def get_blob_storage():
+    return blob_storage
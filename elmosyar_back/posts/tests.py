@@ -0,0 +1,590 @@
+from django.test import TestCase, RequestFactory, override_settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.exceptions import ValidationError
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework.test import APIClient
+from datetime import timedelta
+from io import StringIO
+import hashlib
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+from PIL import Image
+from interactions.models import Reaction, Comment
+from social.models import UserFollow
+from accounts.serializers import UserSerializer
+from .models import Post, PostMedia, Category, CategoryFormat, PostAttributeIndex, MediaBlob, MediaUpload
+from .counters import adjust_counters
+from .serializers import PostSerializer, PostMediaSerializer
+from .viewer import ViewerContext
+from .formats import format_registry
+from .fragments import serialize_posts, post_fragments, _fragment_scopes
+from .search import build_attribute_search, filter_by_attribute_index, index_post_attributes
+
+
+User = get_user_model()
+
+class EngagementCountersTest(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user(username="author", email="author@example.com", password="1234")
+        self.reader = User.objects.create_user(username="reader", email="reader@example.com", password="5678")
+        self.category = Category.objects.create(name="textbooks")
+        self.post = Post.objects.create(author=self.author, category=self.category, attributes={"title": "Calculus"})
+
+    def test_adjust_counters(self):
+        adjust_counters(self.post.id, likes_count=2, comments_count=1)
+        adjust_counters(self.post.id, likes_count=-1, dislikes_count=-1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual(self.post.dislikes_count, 0)
+
+    def test_reconcile_repairs_drift(self):
+        Reaction.objects.create(user=self.reader, post=self.post, reaction='like')
+        Comment.objects.create(user=self.reader, post=self.post, content="nice")
+        # ساخت مستقیم با ORM شمارنده‌ها را به‌روز نمی‌کند
+        Post.objects.create(author=self.reader, parent=self.post, category=self.category)
+        Post.objects.create(author=self.reader, is_repost=True, original_post=self.post, category=self.category)
+        Post.objects.filter(id=self.post.id).update(likes_count=7, dislikes_count=2, comments_count=0)
+
+        call_command('reconcile_post_counters', '--chunk-size', '1', stdout=StringIO())
+
+        self.assertEqual(self.counters(), {
+            'likes_count': 1, 'dislikes_count': 0, 'comments_count': 1, 'reposts_count': 1, 'replies_count': 1
+        })
+
+    def counters(self):
+        self.post.refresh_from_db()
+        return {field: getattr(self.post, field) for field in (
+            'likes_count', 'dislikes_count', 'comments_count', 'reposts_count', 'replies_count'
+        )}
+
+    def test_views_maintain_counters(self):
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        zero = dict.fromkeys(['likes_count', 'dislikes_count', 'comments_count', 'reposts_count', 'replies_count'], 0)
+
+        # لایک، تبدیل به دیسلایک و برداشتن آن
+        client.post(f'/api/posts/{self.post.id}/like/')
+        self.assertEqual(self.counters(), {**zero, 'likes_count': 1})
+        client.post(f'/api/posts/{self.post.id}/dislike/')
+        self.assertEqual(self.counters(), {**zero, 'dislikes_count': 1})
+        client.post(f'/api/posts/{self.post.id}/dislike/')
+        self.assertEqual(self.counters(), zero)
+
+        response = client.post(f'/api/posts/{self.post.id}/comment/', {'content': 'nice'})
+        comment_id = response.data['comment']['id']
+        client.post(f'/api/posts/{self.post.id}/comment/', {'content': 'thanks', 'parent': comment_id})
+        self.assertEqual(self.counters()['comments_count'], 2)
+        # حذف کامنت، پاسخ‌هایش را هم کم می‌کند
+        client.delete(f'/api/comments/{comment_id}/delete/')
+        self.assertEqual(self.counters()['comments_count'], 0)
+
+        repost_id = client.post(f'/api/posts/{self.post.id}/repost/').data['post']['id']
+        reply_id = client.post('/api/posts/', {'parent': self.post.id, 'attributes': '{"title": "re"}'}).data['post']['id']
+        self.assertEqual(self.counters(), {**zero, 'reposts_count': 1, 'replies_count': 1})
+
+        client.delete(f'/api/posts/{repost_id}/delete/')
+        client.delete(f'/api/posts/{reply_id}/delete/')
+        self.assertEqual(self.counters(), zero)
+
+
+class ViewerContextTest(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user(username="author", email="author@example.com", password="1234")
+        self.reader = User.objects.create_user(username="reader", email="reader@example.com", password="5678")
+        self.category = Category.objects.create(name="textbooks")
+        for i in range(4):
+            post = Post.objects.create(author=self.author, category=self.category, attributes={"title": str(i)})
+            post.mentions.add(self.reader)
+        self.liked = Post.objects.first()
+        Reaction.objects.create(user=self.reader, post=self.liked, reaction='like')
+        self.liked.saved_by.add(self.reader)
+        UserFollow.objects.create(follower=self.reader, following=self.author)
+
+    def test_flags_resolved_in_three_queries(self):
+        request = RequestFactory().get('/api/posts/')
+        request.user = self.reader
+        posts = list(Post.objects.select_related('category').prefetch_related('mentions'))
+
+        with self.assertNumQueries(3):
+            viewer = ViewerContext.for_posts(request, posts)
+
+        context = {'request': request, 'viewer': viewer}
+        post_serializer = PostSerializer(context=context)
+        user_serializer = UserSerializer(context=context)
+        with self.assertNumQueries(0):
+            self.assertEqual(post_serializer.get_user_reaction(self.liked), 'like')
+            self.assertTrue(post_serializer.get_is_saved(self.liked))
+            self.assertTrue(user_serializer.get_is_following(self.author))
+            self.assertFalse(user_serializer.get_is_following(self.reader))
+
+
+class FormatRegistryTest(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=self.media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        self.admin = User.objects.create_user(username="admin", email="admin@example.com", password="1234")
+        self.format_obj = CategoryFormat(category="textbooks", created_by=self.admin)
+        self.format_obj.format_file.save("textbooks.json", ContentFile(b'{"year": "^[0-9]{4}$"}'))
+        self.addCleanup(format_registry.invalidate)
+
+    def test_cached_until_format_changes(self):
+        category_format = format_registry.get("textbooks")
+        self.assertTrue(category_format.matches("year", 2024))
+        self.assertFalse(category_format.matches("year", "soon"))
+
+        with self.assertNumQueries(1):
+            self.assertIs(format_registry.get("textbooks"), category_format)
+
+        self.format_obj.format_file.save("textbooks.json", ContentFile(b'{"year": "^[0-9]{2}$"}'))
+        self.assertTrue(format_registry.get("textbooks").matches("year", 24))
+
+        self.format_obj.delete()
+        self.assertIsNone(format_registry.get("textbooks"))
+
+
+class AttributeSearchTest(TestCase):
+
+    format_keys = ["title", "year", "tags", "subtitle"]
+
+    def setUp(self):
+        self.author = User.objects.create_user(username="author", email="author@example.com", password="1234")
+        self.category = Category.objects.create(name="textbooks")
+        self.calculus = self._post(title="Calculus", year=2020, tags=["math"])
+        self.physics = self._post(title="Physics", year=1999, subtitle="Calculus based")
+        self.untitled = self._post(year=None)
+
+    def _post(self, **attributes):
+        return Post.objects.create(author=self.author, category=self.category, attributes=attributes)
+
+    def _search(self, criteria):
+        query = build_attribute_search(criteria, self.format_keys)
+        if query is None:
+            return set()
+        return set(Post.objects.filter(query))
+
+    def test_value_regex_matches_from_start(self):
+        self.assertEqual(self._search({"title": "Calc"}), {self.calculus})
+        self.assertEqual(self._search({"title": "alc"}), set())
+        self.assertEqual(self._search({"year": "20"}), {self.calculus})
+        self.assertEqual(self._search({"year": "$"}), {self.untitled})
+        self.assertEqual(self._search({"tags": r'\["math"'}), {self.calculus})
+
+    def test_key_regex_and_multiple_criteria(self):
+        self.assertEqual(self._search({".*title": "Calc"}), {self.calculus, self.physics})
+        self.assertEqual(self._search({".*title": "Calc", "year": "19"}), {self.physics})
+        self.assertEqual(self._search({"author": ".*"}), set())
+
+    def test_invalid_regex(self):
+        with self.assertRaises(ValidationError):
+            build_attribute_search({"title": "("}, self.format_keys)
+
+
+class AttributeIndexTest(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user(username="author", email="author@example.com", password="1234")
+        self.category = Category.objects.create(name="textbooks")
+        self.cheap = self._post(title="Calculus I", price=30000)
+        self.pricey = self._post(title="Calculus II", price="75000")
+        self.other = self._post(title="Physics", price=45000)
+
+    def _post(self, **attributes):
+        post = Post.objects.create(author=self.author, category=self.category, attributes=attributes)
+        index_post_attributes(post)
+        return post
+
+    def _filter(self, filters):
+        return set(filter_by_attribute_index(Post.objects.all(), filters, self.category.id))
+
+    def test_exact_prefix_and_range(self):
+        self.assertEqual(self._filter({"price": {"lt": 50000}}), {self.cheap, self.other})
+        self.assertEqual(self._filter({"price": {"gte": 45000, "lte": 75000}}), {self.pricey, self.other})
+        self.assertEqual(self._filter({"title": {"prefix": "calc"}, "price": {"lt": 50000}}), {self.cheap})
+        self.assertEqual(self._filter({"title": "physics"}), {self.other})
+        self.assertEqual(self._filter({"price": {"eq": 75000}}), {self.pricey})
+
+    def test_invalid_filters(self):
+        with self.assertRaises(ValidationError):
+            self._filter({"price": {"between": [1, 2]}})
+        with self.assertRaises(ValidationError):
+            self._filter({"price": {"lt": "cheap"}})
+
+    def test_reindex_on_update_and_rebuild(self):
+        self.cheap.attributes = {"title": "Calculus I", "price": 90000}
+        self.cheap.save()
+        index_post_attributes(self.cheap)
+        self.assertEqual(self._filter({"price": {"gt": 80000}}), {self.cheap})
+
+        PostAttributeIndex.objects.all().delete()
+        call_command('rebuild_attribute_index', '--chunk-size', '2', stdout=StringIO())
+        self.assertEqual(PostAttributeIndex.objects.count(), 6)
+        self.assertEqual(self._filter({"price": {"lt": 50000}}), {self.other})
+
+
+@override_settings(POST_FRAGMENT_CACHE=True)
+class PostFragmentCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="author", email="author@example.com", password="1234")
+        self.reader = User.objects.create_user(username="reader", email="reader@example.com", password="5678")
+        self.category = Category.objects.create(name="textbooks")
+        self.post = Post.objects.create(author=self.author, category=self.category, attributes={"title": "Calculus"})
+        self.post.mentions.add(self.reader)
+        Reaction.objects.create(user=self.reader, post=self.post, reaction='like')
+
+    def _serialize(self, user):
+        request = RequestFactory().get('/api/posts/')
+        request.user = user
+        posts = list(Post.objects.select_related('author', 'category').prefetch_related('media', 'mentions'))
+        viewer = ViewerContext.for_posts(request, posts)
+        return serialize_posts(posts, {'request': request, 'viewer': viewer})[0]
+
+    def test_viewer_fields_merged_over_cached_fragment(self):
+        as_reader = self._serialize(self.reader)
+        self.assertEqual(as_reader['user_reaction'], 'like')
+        self.assertTrue(as_reader['mentions'][0]['is_me'])
+        self.assertFalse(as_reader['author_info']['is_me'])
+
+        as_author = self._serialize(self.author)
+        self.assertIsNone(as_author['user_reaction'])
+        self.assertTrue(as_author['author_info']['is_me'])
+        self.assertFalse(as_author['mentions'][0]['is_me'])
+
+        fresh = PostSerializer(self.post, context={}).data
+        self.assertEqual(as_author['attributes'], fresh['attributes'])
+        self.assertEqual(as_author['author_info']['posts_count'], fresh['author_info']['posts_count'])
+
+    def test_profile_pictures_are_absolute(self):
+        User.objects.filter(id=self.author.id).update(profile_picture='profiles/p.png')
+        self._serialize(self.reader)
+        cached = self._serialize(self.reader)
+        self.assertEqual(cached['author_info']['profile_picture'], 'http://testserver/media/profiles/p.png')
+
+        with override_settings(POST_FRAGMENT_CACHE=False):
+            self.assertEqual(self._serialize(self.reader)['author_info'], cached['author_info'])
+
+    def test_stale_mentions_do_not_fail(self):
+        self._serialize(self.reader)
+        # fragmentی که mention آن دیگر در پست نیست
+        key = post_fragments.versioned_keys({self.post.id: _fragment_scopes(self.post)})[self.post.id]
+        fragment = post_fragments.get_many([key])[key]
+        fragment['mentions'].append(dict(fragment['mentions'][0], id=999))
+        post_fragments.set_many({key: fragment})
+
+        as_reader = self._serialize(self.reader)
+        self.assertEqual([user['id'] for user in as_reader['mentions']], [self.reader.id, 999])
+        self.assertEqual([user['is_me'] for user in as_reader['mentions']], [True, False])
+
+    def test_invalidated_by_counters_and_profile_edits(self):
+        self._serialize(self.reader)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            adjust_counters(self.post.id, comments_count=3)
+        self.assertEqual(self._serialize(self.reader)['comments_count'], 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.bio = "Math teacher"
+            self.author.save()
+        self.assertEqual(self._serialize(self.reader)['author_info']['bio'], "Math teacher")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            UserFollow.objects.create(follower=self.reader, following=self.author)
+        as_reader = self._serialize(self.reader)
+        self.assertEqual(as_reader['author_info']['followers_count'], 1)
+        self.assertTrue(as_reader['author_info']['is_following'])
+
+
+class PostMediaMetadataTest(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=self.media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        author = User.objects.create_user(username="author", email="author@example.com", password="1234")
+        self.post = Post.objects.create(author=author)
+
+    def _png(self, size=(64, 48)):
+        buffer = BytesIO()
+        Image.new('RGB', size).save(buffer, format='PNG')
+        return SimpleUploadedFile("photo.png", buffer.getvalue(), content_type="image/png")
+
+    def test_metadata_recorded_on_upload(self):
+        upload = self._png()
+        media = PostMedia.objects.create(post=self.post, file=upload, media_type='image')
+
+        self.assertEqual((media.size, media.mime_type, media.width, media.height), (upload.size, 'image/png', 64, 48))
+        with self.assertNumQueries(0):
+            data = PostMediaSerializer(media).data
+        self.assertEqual(data['file_size'], upload.size)
+
+    def test_backfill(self):
+        media = PostMedia.objects.create(post=self.post, file=self._png((10, 20)), media_type='image')
+        PostMedia.objects.filter(id=media.id).update(size=0, mime_type='', width=None, height=None)
+
+        call_command('backfill_media_metadata', stdout=StringIO())
+
+        media.refresh_from_db()
+        self.assertGreater(media.size, 0)
+        self.assertEqual((media.mime_type, media.width, media.height), ('image/png', 10, 20))
+
+
+class ChunkedUploadTest(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            MEDIA_UPLOAD_TEMP_DIR=os.path.join(self.media_root, 'tmp'),
+        )
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        self.user = User.objects.create_user(username="uploader", email="uploader@example.com", password="1234")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        buffer = BytesIO()
+        Image.new('RGB', (30, 20)).save(buffer, format='PNG')
+        self.content = buffer.getvalue()
+
+    def _put(self, upload_id, chunk, offset):
+        return self.client.put(
+            f'/api/posts/uploads/{upload_id}/', chunk,
+            content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset)
+        )
+
+    def _upload(self):
+        response = self.client.post('/api/posts/uploads/', {
+            'filename': 'photo.png', 'size': len(self.content)
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        upload_id = response.data['upload']['upload_id']
+
+        half = len(self.content) // 2
+        self.assertEqual(self._put(upload_id, self.content[:half], 0).data['upload']['offset'], half)
+        # offset تکراری رد می‌شود و offset درست را برمی‌گرداند
+        conflict = self._put(upload_id, self.content[:half], 0)
+        self.assertEqual((conflict.status_code, conflict.data['upload']['offset']), (409, half))
+        self.assertEqual(self._put(upload_id, self.content[half:], half).status_code, 200)
+
+        response = self.client.post(f'/api/posts/uploads/{upload_id}/complete/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_chunked_upload_and_link(self):
+        data = self._upload()
+        self.assertEqual(data['sha256'], hashlib.sha256(self.content).hexdigest())
+        media = PostMedia.objects.get(id=data['media']['id'])
+        self.assertIsNone(media.post_id)
+        self.assertEqual((media.size, media.width, media.height), (len(self.content), 30, 20))
+        with media.file.open('rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+        response = self.client.post('/api/posts/', {
+            'category': 'textbooks', 'media_ids': [media.id]
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        media.refresh_from_db()
+        self.assertEqual(media.post_id, response.data['post']['id'])
+
+        # رسانه‌ی وصل‌شده دوباره قابل استفاده نیست
+        response = self.client.post('/api/posts/', {
+            'category': 'textbooks', 'media_ids': [media.id]
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_oversized_upload_is_rejected(self):
+        response = self.client.post('/api/posts/uploads/', {
+            'filename': 'lecture.mp4', 'size': 11 * 1024 * 1024
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(MediaUpload.objects.exists())
+
+    def test_failed_completion_can_be_retried(self):
+        response = self.client.post('/api/posts/uploads/', {
+            'filename': 'photo.png', 'size': len(self.content)
+        }, format='json')
+        upload_id = response.data['upload']['upload_id']
+        self._put(upload_id, self.content, 0)
+
+        with mock.patch.object(PostMedia.objects, 'create', side_effect=RuntimeError('db down')):
+            response = self.client.post(f'/api/posts/uploads/{upload_id}/complete/')
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(MediaUpload.objects.get(id=upload_id).status, 'uploading')
+        self.assertFalse(MediaBlob.objects.filter(ref_count__gt=0).exists())
+
+        response = self.client.post(f'/api/posts/uploads/{upload_id}/complete/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(MediaBlob.objects.get().ref_count, 1)
+
+    def test_cleanup_unattached_media(self):
+        media = PostMedia.objects.get(id=self._upload()['media']['id'])
+        path = media.file.path
+        PostMedia.objects.filter(id=media.id).update(created_at=timezone.now() - timedelta(days=2))
+
+        call_command('cleanup_media_uploads', stdout=StringIO())
+
+        self.assertFalse(PostMedia.objects.filter(id=media.id).exists())
+        # فایل فقط ارجاعش را از دست می‌دهد و gc_media_blobs آن را پاک می‌کند
+        self.assertEqual(MediaBlob.objects.get(name=media.file.name).ref_count, 0)
+        call_command('gc_media_blobs', '--grace-hours=0', stdout=StringIO())
+        self.assertFalse(os.path.exists(path))
+
+
+@override_settings(IMAGE_DERIVATIVE_WORKERS=0, IMAGE_THUMBNAIL_SIZE=50, IMAGE_VARIANT_WIDTHS=[100, 200, 800])
+class ImageVariantsTest(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=self.media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        self.author = User.objects.create_user(username="author", email="author@example.com", password="1234")
+        self.post = Post.objects.create(author=self.author)
+
+    def _png(self, size):
+        buffer = BytesIO()
+        Image.new('RGB', size).save(buffer, format='PNG')
+        return SimpleUploadedFile("photo.png", buffer.getvalue(), content_type="image/png")
+
+    def test_variants_rendered_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            media = PostMedia.objects.create(post=self.post, file=self._png((400, 300)), media_type='image')
+        media.refresh_from_db()
+
+        self.assertEqual(media.variants['source'], media.file.name)
+        self.assertEqual([item['width'] for item in media.variants['widths']], [100, 200])
+        self.assertEqual((media.variants['thumbnail']['width'], media.variants['thumbnail']['height']), (50, 50))
+
+        data = PostMediaSerializer(media).data
+        self.assertTrue(data['thumbnail'].endswith('.webp'))
+        self.assertEqual(data['srcset'].count('.webp'), 2)
+        self.assertIn(' 200w', data['srcset'])
+
+    def test_profile_picture_variants_replaced(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.profile_picture = self._png((60, 60))
+            self.author.save()
+        self.author.refresh_from_db()
+        old = self.author.profile_picture_variants
+        # تصویر کوچک‌تر از همه‌ی عرض‌ها فقط یک نسخه با اندازه‌ی خودش دارد
+        self.assertEqual([item['width'] for item in old['widths']], [60])
+        old_path = os.path.join(self.media_root, old['widths'][0]['name'])
+        self.assertTrue(os.path.exists(old_path))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.profile_picture = self._png((300, 300))
+            self.author.save()
+        self.author.refresh_from_db()
+
+        self.assertFalse(os.path.exists(old_path))
+        data = UserSerializer(self.author).data
+        self.assertIn(' 200w', data['profile_picture_srcset'])
+        self.assertTrue(data['profile_picture_thumbnail'].endswith('.webp'))
+
+
+class MediaBlobTest(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=self.media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        author = User.objects.create_user(username="author", email="author@example.com", password="1234")
+        self.post = Post.objects.create(author=author)
+
+    def _upload(self, content=b"lecture notes", name="notes.pdf"):
+        return PostMedia.objects.create(
+            post=self.post, file=SimpleUploadedFile(name, content, content_type="application/pdf"), media_type='file'
+        )
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self._upload()
+        second = self._upload(name="copy.pdf")
+
+        digest = hashlib.sha256(b"lecture notes").hexdigest()
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(first.file.name, f"blobs/{digest[:2]}/{digest[2:4]}/{digest}.pdf")
+        blob = MediaBlob.objects.get()
+        self.assertEqual((blob.ref_count, blob.size), (2, len(b"lecture notes")))
+        # کپی دوم پس از هش شدن دور ریخته می‌شود
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'blobs', 'tmp')), [])
+
+        path = first.file.path
+        first.delete()
+        self.post.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 0)
+        self.assertTrue(os.path.exists(path))
+
+        call_command('gc_media_blobs', '--grace-hours=0', stdout=StringIO())
+        self.assertFalse(MediaBlob.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_replaced_file_releases_old_blob(self):
+        admin = User.objects.create_user(username="admin", email="admin@example.com", password="1234")
+        format_obj = CategoryFormat(category="textbooks", created_by=admin)
+        format_obj.format_file.save("textbooks.json", ContentFile(b'{"year": "^[0-9]{4}$"}'))
+        old_name = format_obj.format_file.name
+
+        format_obj.format_file.save("textbooks.json", ContentFile(b'{"year": "^[0-9]{2}$"}'))
+
+        self.assertEqual(MediaBlob.objects.get(name=old_name).ref_count, 0)
+        self.assertEqual(MediaBlob.objects.get(name=format_obj.format_file.name).ref_count, 1)
+
+    def test_recount_and_orphan_files(self):
+        media = self._upload()
+        MediaBlob.objects.update(ref_count=5)
+        orphan = os.path.join(self.media_root, 'blobs', 'ff', 'ff', 'f' * 64)
+        os.makedirs(os.path.dirname(orphan))
+        open(orphan, 'wb').close()
+
+        call_command('gc_media_blobs', '--recount', '--grace-hours=0', stdout=StringIO())
+
+        self.assertEqual(MediaBlob.objects.get(name=media.file.name).ref_count, 1)
+        self.assertTrue(os.path.exists(media.file.path))
+        self.assertFalse(os.path.exists(orphan))
+
+    def test_same_content_with_different_extensions(self):
+        first = self._upload(name="a.jpg")
+        second = self._upload(name="b.jpeg")
+        self.assertEqual(second.file.name, first.file.name)
+        self.assertEqual(MediaBlob.objects.get().ref_count, 2)
+
+        # نسخه‌ی دوم که دو آپلود هم‌زمان ساخته‌اند با digest شناخته می‌شود و پاک نمی‌شود
+        twin = first.file.path[:-len('.jpg')] + '.jpeg'
+        shutil.copyfile(first.file.path, twin)
+        call_command('gc_media_blobs', '--grace-hours=0', stdout=StringIO())
+        self.assertTrue(os.path.exists(first.file.path))
+        self.assertTrue(os.path.exists(twin))
+
+        first.delete()
+        second.delete()
+        call_command('gc_media_blobs', '--grace-hours=0', stdout=StringIO())
+        self.assertFalse(MediaBlob.objects.exists())
+        self.assertFalse(os.path.exists(first.file.path))
+        self.assertFalse(os.path.exists(twin))
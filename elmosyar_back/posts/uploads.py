@@ -0,0 +1,169 @@
+import mimetypes
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Case, When, Value
+from django.utils.text import get_valid_filename
+
+from .models import MediaUpload, PostMedia
+from .media import probe_media
+from .storage import blob_digest
+
+
+# اندازه‌ی بلوکی که از بدنه‌ی درخواست یا فایل موقت خوانده می‌شود
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """A chunk or completion request that does not fit the upload's state"""
+
+
+class UploadOffsetMismatch(UploadError):
+    def __init__(self, expected):
+        super().__init__(f'Upload offset mismatch, expected {expected}')
+        self.expected = expected
+
+
+def media_type_for(content_type):
+    if content_type.startswith('image/'):
+        return 'image'
+    if content_type.startswith('video/'):
+        return 'video'
+    if content_type.startswith('audio/'):
+        return 'audio'
+    return 'file'
+
+
+def start_upload(user, filename, size, content_type=''):
+    os.makedirs(settings.MEDIA_UPLOAD_TEMP_DIR, exist_ok=True)
+    filename = get_valid_filename(os.path.basename(filename))[:255] or 'upload'
+    upload = MediaUpload.objects.create(
+        user=user,
+        filename=filename,
+        content_type=(content_type or mimetypes.guess_type(filename)[0] or '')[:100],
+        size=size,
+    )
+    open(upload.temp_path, 'wb').close()
+    return upload
+
+
+def write_chunk(upload, stream, offset, length=None):
+    """
+    یک تکه از بدنه‌ی درخواست را در فایل موقت می‌نویسد
+
+    The body is copied block by block from ``stream`` at ``offset``, which
+    must equal the bytes received so far. Nothing is held open in the
+    database while the client is sending: ``received`` is advanced at the
+    end with a conditional update, so of two racing chunks for the same
+    offset only one is accepted. A dropped connection keeps whatever
+    arrived, and the client resumes from the new offset.
+    """
+    if upload.status != 'uploading':
+        raise UploadError('Upload is already complete')
+    if offset != upload.received:
+        raise UploadOffsetMismatch(upload.received)
+
+    remaining = upload.size - offset
+    if length is not None and length > remaining:
+        raise UploadError('Chunk exceeds declared upload size')
+
+    written = 0
+    with open(upload.temp_path, 'r+b') as f:
+        f.seek(offset)
+        while written < remaining:
+            block = stream.read(min(STREAM_BLOCK_SIZE, remaining - written))
+            if not block:
+                break
+            f.write(block)
+            written += len(block)
+
+    if stream.read(1):
+        raise UploadError('Chunk exceeds declared upload size')
+
+    advanced = MediaUpload.objects.filter(
+        id=upload.id, status='uploading', received=offset
+    ).update(received=offset + written)
+    if not advanced:
+        upload.refresh_from_db(fields=['received', 'status'])
+        raise UploadOffsetMismatch(upload.received)
+
+    upload.received = offset + written
+    return written
+
+
+def complete_upload(upload):
+    """
+    Move a fully received upload into media storage and return its ``PostMedia``.
+
+    The temp file's headers are probed, then it is handed to the blob
+    storage, which hashes it while copying it in (a single read of the
+    whole file) and keeps only one copy of identical content. Only
+    the final ``PostMedia`` insert touches the database, so this should
+    run outside any transaction. If that insert fails the upload goes back
+    to ``uploading`` so ``complete`` can be retried; the blob reference is
+    rolled back with it and an unreferenced new file is left to
+    ``gc_media_blobs``. The media is not attached to a post;
+    ``posts_list_create`` links it through ``media_ids``.
+    """
+    if upload.status == 'complete' and upload.media_id:
+        return upload.media
+    if upload.received != upload.size:
+        raise UploadError(f'Upload incomplete: {upload.received}/{upload.size} bytes received')
+
+    # فقط یک درخواست complete فایل را منتقل می‌کند
+    claimed = MediaUpload.objects.filter(id=upload.id, status='uploading').update(status='finalizing')
+    if not claimed:
+        raise UploadError('Upload is already being completed')
+
+    media_type = media_type_for(upload.content_type)
+    media_field = PostMedia._meta.get_field('file')
+    try:
+        with open(upload.temp_path, 'rb') as f:
+            source = File(f, name=upload.filename)
+            metadata = probe_media(source, media_type, upload.content_type)
+            stored_name = media_field.storage.save(
+                media_field.generate_filename(None, upload.filename), source
+            )
+    except Exception:
+        MediaUpload.objects.filter(id=upload.id).update(status='uploading')
+        raise
+
+    try:
+        # ردیف رسانه، ارجاع blob و وضعیت آپلود با هم ثبت یا برگردانده می‌شوند
+        with transaction.atomic():
+            media = PostMedia.objects.create(
+                uploaded_by=upload.user, file=stored_name, media_type=media_type, **metadata
+            )
+            # نام blob همان SHA-256 محتواست که هنگام کپی حساب شد
+            upload.sha256 = blob_digest(stored_name) or ''
+            upload.status = 'complete'
+            upload.media = media
+            upload.save(update_fields=['sha256', 'status', 'media', 'updated_at'])
+    except Exception:
+        upload.status = 'uploading'
+        upload.media = None
+        upload.sha256 = ''
+        MediaUpload.objects.filter(id=upload.id).update(status='uploading')
+        raise
+    os.remove(upload.temp_path)
+    return media
+
+
+def link_media(post, media_ids, user):
+    """
+    Attach finished, unattached media of ``user`` to ``post``.
+
+    Media are ordered as listed. Returns the number of rows linked; a
+    mismatch with ``media_ids`` means some IDs were unknown, foreign or
+    already used.
+    """
+    if not media_ids:
+        return 0
+    return PostMedia.objects.filter(
+        id__in=media_ids, uploaded_by=user, post__isnull=True
+    ).update(
+        post=post,
+        order=Case(*[When(id=media_id, then=Value(i)) for i, media_id in enumerate(media_ids)]),
+    )
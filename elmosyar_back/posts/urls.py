@@ -16,6 +16,10 @@ urlpatterns = [
     path('saved/', views.saved_posts, name='saved_posts'),
     path('users/<str:username>/', views.user_posts, name='user_posts'),
 
+    path('uploads/', views.media_upload_start, name='media_upload_start'),
+    path('uploads/<uuid:upload_id>/', views.media_upload_chunk, name='media_upload_chunk'),
+    path('uploads/<uuid:upload_id>/complete/', views.media_upload_complete, name='media_upload_complete'),
+
     path('formats/upload/', views.upload_category_format, name='upload_category_format'),
     path('formats/<str:cat>/', views.get_format, name='get_format'),
     path('formats/<str:cat>/delete/', views.delete_category_format, name='delete_category_format'),
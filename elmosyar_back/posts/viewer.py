@@ -0,0 +1,80 @@
+from itertools import chain
+
+from .models import Post
+
+
+class ViewerContext:
+    """
+    وضعیت مخصوص بیننده (واکنش، ذخیره، فالو) برای یک صفحه از پست‌ها
+
+    Built once per request from the posts (and any extra users) about to be
+    serialized. Everything is loaded in three bulk queries: the viewer's
+    reactions to those posts, which of them the viewer saved, and the
+    viewer's follow edges to their authors and mentions. Serializers find it
+    under ``context['viewer']`` and fall back to a per-object query only for
+    objects that were not part of the page.
+    """
+
+    def __init__(self, user=None):
+        self.user = user
+        self._post_ids = set()
+        self._user_ids = set()
+        self._reactions = {}
+        self._saved_post_ids = set()
+        self._followed_user_ids = set()
+
+    @property
+    def is_authenticated(self):
+        return bool(self.user and self.user.is_authenticated)
+
+    @classmethod
+    def for_posts(cls, request, *post_groups, users=()):
+        from interactions.models import Reaction
+        from social.models import UserFollow
+
+        viewer = cls(getattr(request, 'user', None))
+        if not viewer.is_authenticated:
+            return viewer
+
+        posts = list(chain.from_iterable(post_groups))
+        viewer._post_ids = {post.id for post in posts}
+        viewer._user_ids = {user.id for user in users}
+        for post in posts:
+            if post.is_anonymous:
+                continue
+            viewer._user_ids.add(post.author_id)
+            # mentions معمولاً prefetch شده‌اند و کوئری جدیدی نمی‌زنند
+            viewer._user_ids.update(user.id for user in post.mentions.all())
+
+        if viewer._post_ids:
+            viewer._reactions = dict(
+                Reaction.objects.filter(user=viewer.user, post_id__in=viewer._post_ids)
+                .values_list('post_id', 'reaction')
+            )
+            viewer._saved_post_ids = set(
+                Post.saved_by.through.objects.filter(user_id=viewer.user.id, post_id__in=viewer._post_ids)
+                .values_list('post_id', flat=True)
+            )
+
+        if viewer._user_ids:
+            viewer._followed_user_ids = set(
+                UserFollow.objects.filter(follower=viewer.user, following_id__in=viewer._user_ids)
+                .values_list('following_id', flat=True)
+            )
+
+        return viewer
+
+    def knows_post(self, post_id):
+        return post_id in self._post_ids
+
+    def knows_user(self, user_id):
+        return user_id in self._user_ids
+
+    def reaction_for(self, post_id):
+        return self._reactions.get(post_id)
+
+    def has_saved(self, post_id):
+        return post_id in self._saved_post_ids
+
+    def is_following(self, user_id):
+        return user_id in self._followed_user_ids
@@ -4,17 +4,28 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework import status
 from django.shortcuts import get_object_or_404
 from django.db import transaction
-from django.core.paginator import Paginator
 from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
+import io
 import json
 import mimetypes
 import re
 
 import settings
-from .models import Post, PostMedia, CategoryFormat, Category
+from .models import Post, PostMedia, CategoryFormat, Category, MediaUpload
 from .serializers import PostSerializer, PostMediaSerializer, CategoryFormatSerializer
-from notifications.models import Notification
+from .counters import adjust_counters
+from .formats import format_registry, CompiledFormat
+from .search import build_attribute_search, filter_by_attribute_index, index_post_attributes
+from .viewer import ViewerContext
+from .fragments import serialize_posts, serialize_post
+from .uploads import (
+    start_upload, write_chunk, complete_upload, link_media, media_type_for,
+    UploadError, UploadOffsetMismatch,
+)
+from core.pagination import paginate, InvalidPagination
+from core.counts import bump_count_scopes
+from notifications.dispatch import NotificationBatch, notify
 
 from interactions.models import Comment
 from interactions.serializers import CommentSerializer
@@ -46,86 +57,31 @@ def apply_advanced_search_filter(queryset, search_json, category):
         if not category:
             raise ValidationError('Category is required for advanced search')
         
-        format_obj = CategoryFormat.objects.filter(category=category).first()
-        
-        if not format_obj:
-            raise ValidationError(f'No format found for category: {category}')
-        
         try:
-            with open(format_obj.format_file.path, 'r', encoding='utf-8') as f:
-                format_data = json.load(f)
+            category_format = format_registry.get(category)
         except Exception as e:
             log_error(f"Error reading format file: {str(e)}")
             raise ValidationError('Error reading format file')
         
-        format_keys = format_data.keys()
-
-        not_empty = True
-
-        matching_keys = {}
-
-        for key_regex in search_criteria.keys():
-            matching_keys[key_regex] = []
-            for attr_key in format_keys:
-                try:
-                    # تبدیل کلید format به استرینگ برای تطبیق با regex
-                    attr_key_str = str(attr_key)
-                    if re.match(key_regex, attr_key_str):
-                        matching_keys[key_regex].append(attr_key)
-                except re.error:
-                    log_error(f"Invalid regex pattern for key matching: {key_regex}")
-                    break
-            if matching_keys[key_regex] == []:
-                not_empty = False
-                break
+        if not category_format:
+            raise ValidationError(f'No format found for category: {category}')
         
-        if not not_empty:
-            log_info(f"Advanced search applied: 0 posts matched", None, {
-            'category': category,
-            'search_criteria': search_criteria,
-            'matched_posts': 0
+        attribute_query = build_attribute_search(search_criteria, category_format.keys)
+        
+        if attribute_query is None:
+            log_info(f"Advanced search applied: no format key matched", None, {
+                'category': category,
+                'search_criteria': search_criteria
             })
-            return queryset.filter(id__in=[])
-
-        filtered_posts = []
-        for post in queryset:
-            post_attributes = post.attributes or {}
-            match_all_criteria = True
-                
-            for regex_key, possible_keys in matching_keys.items():
-                match_all_criteria = False
-                for key in possible_keys:
-                    # تبدیل کلید به استرینگ فقط برای چک کردن وجود
-                    key_str = str(key)
-                    if key_str in post_attributes:
-                        value = post_attributes[key_str]
-                        # برای مقادیر مختلف، رفتارهای مختلف:
-                        if isinstance(value, (list, dict)):
-                            # لیست و دیکشنری را به JSON string تبدیل می‌کنیم
-                            value_str = json.dumps(value, ensure_ascii=False)
-                        elif value is None:
-                            value_str = ""
-                        else:
-                            # سایر انواع را به استرینگ تبدیل می‌کنیم
-                            value_str = str(value)
-                        
-                        # اعمال regex
-                        if re.match(search_criteria[regex_key], value_str):
-                            match_all_criteria = True
-                            break
-                if not match_all_criteria:
-                    break
-            
-            if match_all_criteria:
-                filtered_posts.append(post.id)
+            return queryset.none()
         
-        log_info(f"Advanced search applied: {len(filtered_posts)} posts matched", None, {
+        log_info(f"Advanced search applied", None, {
             'category': category,
-            'search_criteria': search_criteria,
-            'matched_posts': len(filtered_posts)
+            'search_criteria': search_criteria
         })
         
-        return queryset.filter(id__in=filtered_posts)
+        # تطبیق در خود دیتابیس انجام می‌شود و فقط صفحه‌ی درخواستی خوانده می‌شود
+        return queryset.filter(attribute_query)
         
     except json.JSONDecodeError:
         log_warning(f"Invalid JSON in advanced search: {search_json}")
@@ -138,6 +94,32 @@ def apply_advanced_search_filter(queryset, search_json, category):
         raise ValidationError('Error in advanced search')
 
 
+def apply_attribute_index_filter(queryset, filter_json, category):
+    """
+    Apply exact/prefix/range attribute filters answered by PostAttributeIndex
+    """
+    try:
+        filters = json.loads(filter_json)
+        
+        if not category:
+            raise ValidationError('Category is required for attribute filters')
+        
+        category_id = Category.objects.filter(name=category).values_list('id', flat=True).first()
+        if category_id is None:
+            return queryset.none()
+        
+        log_info(f"Attribute index filter applied", None, {
+            'category': category,
+            'attr_filter': filters
+        })
+        
+        return filter_by_attribute_index(queryset, filters, category_id)
+        
+    except json.JSONDecodeError:
+        log_warning(f"Invalid JSON in attribute filter: {filter_json}")
+        raise ValidationError('Invalid JSON in attr_filter parameter')
+
+
 def validate_post_attributes(attributes, category):
     """
     Validate post attributes based on category format
@@ -145,48 +127,16 @@ def validate_post_attributes(attributes, category):
     if not attributes or not category:
         return True, None
     
-    format_obj = CategoryFormat.objects.filter(category=category).first()
-    if not format_obj:
-        return True, None
-    
     try:
-        with open(format_obj.format_file.path, 'r', encoding='utf-8') as f:
-            format_data = json.load(f)
+        category_format = format_registry.get(category)
+        if not category_format:
+            return True, None
         
-        # یک کپی از attributes برای validation ایجاد می‌کنیم
-        # تا تغییرات روی رفرنس اصلی اعمال نشود
-        attrs_for_validation = {}
         for key, value in attributes.items():
-            # کلید را به استرینگ تبدیل می‌کنیم (فقط برای validation)
             key_str = str(key)
-            attrs_for_validation[key_str] = value
-        
-        for key_str, value in attrs_for_validation.items():
-            # کلید format_data هم به استرینگ تبدیل می‌کنیم برای تطبیق
-            format_keys = [str(k) for k in format_data.keys()]
-            if key_str in format_keys:
-                # پیدا کردن الگوی اصلی (با کلید اصلی)
-                original_key = None
-                for k in format_data.keys():
-                    if str(k) == key_str:
-                        original_key = k
-                        break
-                
-                if original_key:
-                    pattern = format_data[original_key]
-                    # آماده‌سازی مقدار برای validation
-                    if isinstance(value, (list, dict)):
-                        # لیست و دیکشنری را به JSON string تبدیل می‌کنیم
-                        value_to_check = json.dumps(value, ensure_ascii=False)
-                    elif value is None:
-                        value_to_check = ""
-                    else:
-                        # سایر انواع را به استرینگ تبدیل می‌کنیم
-                        value_to_check = str(value)
-                    
-                    if not re.match(pattern, value_to_check):
-                        log_warning(f"Attribute validation failed: {key_str}={value} doesn't match pattern")
-                        return False, f'Attribute "{key_str}" does not match format pattern'
+            if not category_format.matches(key_str, value):
+                log_warning(f"Attribute validation failed: {key_str}={value} doesn't match pattern")
+                return False, f'Attribute "{key_str}" does not match format pattern'
         
         return True, None
     except Exception as e:
@@ -201,61 +151,26 @@ def validate_post_update_attributes(post, attributes, category):
     if not category:
         return True, None
     
-    format_obj = CategoryFormat.objects.filter(category=category).first()
-    if not format_obj:
-        return True, None
-    
     try:
-        with open(format_obj.format_file.path, 'r', encoding='utf-8') as f:
-            format_data = json.load(f)
+        category_format = format_registry.get(category)
+        if not category_format:
+            return True, None
         
         if attributes is not None:
-            post_attributes = post.attributes or {}
-            
-            # یک کپی از merged attributes ایجاد می‌کنیم
+            # ادغام attributes فعلی پست با attributes جدید (با کلیدهای استرینگ)
             merged_attributes = {}
-            
-            # اول post_attributes را اضافه می‌کنیم
-            for key, value in post_attributes.items():
-                key_str = str(key)
-                merged_attributes[key_str] = value
-            
-            # سپس attributes جدید را اضافه می‌کنیم (با تبدیل کلیدها)
+            for key, value in (post.attributes or {}).items():
+                merged_attributes[str(key)] = value
             for key, value in attributes.items():
-                key_str = str(key)
-                merged_attributes[key_str] = value
-            
-            # لیست کلیدهای format_data به صورت استرینگ
-            format_keys_str = [str(k) for k in format_data.keys()]
+                merged_attributes[str(key)] = value
             
             for key_str, value in merged_attributes.items():
-                if key_str in format_keys_str:
-                    # پیدا کردن الگوی اصلی
-                    original_key = None
-                    for k in format_data.keys():
-                        if str(k) == key_str:
-                            original_key = k
-                            break
-                    
-                    if original_key:
-                        pattern = format_data[original_key]
-                        # آماده‌سازی مقدار برای validation
-                        if isinstance(value, (list, dict)):
-                            # لیست و دیکشنری را به JSON string تبدیل می‌کنیم
-                            value_to_check = json.dumps(value, ensure_ascii=False)
-                        elif value is None:
-                            value_to_check = ""
-                        else:
-                            # سایر انواع را به استرینگ تبدیل می‌کنیم
-                            value_to_check = str(value)
-                        
-                        if not re.match(pattern, value_to_check):
-                            log_warning(f"Update attribute validation failed: {key_str}={value}")
-                            return False, f'Attribute "{key_str}" does not match format pattern'
+                if not category_format.matches(key_str, value):
+                    log_warning(f"Update attribute validation failed: {key_str}={value}")
+                    return False, f'Attribute "{key_str}" does not match format pattern'
             
-            # بررسی وجود کلیدهای اجباری (با تبدیل به استرینگ)
-            for original_key, pattern in format_data.items():
-                key_str = str(original_key)
+            # بررسی وجود کلیدهای اجباری
+            for key_str in category_format.keys:
                 if key_str not in merged_attributes:
                     log_warning(f"Required attribute missing: {key_str}")
                     return False, f'Attribute "{key_str}" is required and cannot be removed'
@@ -269,6 +184,37 @@ def validate_post_update_attributes(post, attributes, category):
         return False, f'Error validating format: {str(e)}'
 
 
+def parse_media_ids(data):
+    """
+    شناسه‌های رسانه‌های آپلودشده از media_ids
+
+    Accepts a JSON list or repeated / comma-separated form values and
+    returns unique ids in their original order. Raises ``ValueError`` for
+    anything that is not an integer id.
+    """
+    if hasattr(data, 'getlist'):
+        raw = data.getlist('media_ids')
+    else:
+        raw = data.get('media_ids') or []
+        if not isinstance(raw, list):
+            raw = [raw]
+
+    media_ids = []
+    for value in raw:
+        parts = value.split(',') if isinstance(value, str) else [value]
+        for part in parts:
+            if isinstance(part, str):
+                part = part.strip()
+                if not part:
+                    continue
+            if isinstance(part, bool):
+                raise ValueError(part)
+            media_id = int(part)
+            if media_id not in media_ids:
+                media_ids.append(media_id)
+    return media_ids
+
+
 def can_user_modify_post(user, post):
     """
     بررسی می‌کند که آیا کاربر می‌تواند پست را ویرایش یا حذف کند
@@ -296,18 +242,23 @@ def posts_list_create(request):
         category_name = request.GET.get('category')
         username = request.GET.get('username')
         search_json = request.GET.get('search')
-        page = int(request.GET.get('page', 1))
+        attr_filter_json = request.GET.get('attr_filter')
+        page = request.GET.get('page', 1)
         per_page = min(int(request.GET.get('per_page', 20)), 100)
 
         posts = Post.objects.all()
+        # scopeهایی که total_count کش‌شده‌ی این لیست به آن‌ها وابسته است
+        count_scopes = [('posts', 'all')]
         
         if category_name:
             posts = posts.filter(category__name=category_name)
+            count_scopes = [('category', category_name)]
         
         if username:
             try:
                 user = User.objects.get(username=username)
                 posts = posts.filter(author=user)
+                count_scopes.append(('user', user.id))
                 posts = posts.exclude(category__anonymous=True)
             except User.DoesNotExist:
                 # کاربر وجود ندارد، لیست خالی برگردان
@@ -324,55 +275,96 @@ def posts_list_create(request):
                     'message': str(e)
                 }, status=status.HTTP_400_BAD_REQUEST)
         
+        if attr_filter_json:
+            try:
+                posts = apply_attribute_index_filter(posts, attr_filter_json, category_name)
+            except ValidationError as e:
+                log_warning(f"Attribute filter validation error: {str(e)}", request)
+                return Response({
+                    'success': False,
+                    'message': str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+        
         posts = posts.select_related('author', 'category').prefetch_related(
-            'media', 'mentions', 'reactions', 'saved_by'
+            'media', 'mentions'
         ).order_by('-created_at')
         
-        paginator = Paginator(posts, per_page)
         try:
-            posts_page = paginator.page(page)
-        except:
-            posts_page = paginator.page(1)
+            posts_page, pagination = paginate(request, posts, page, per_page, count_scopes=count_scopes)
+        except InvalidPagination as e:
+            log_warning(f"Invalid pagination: {str(e)}", request)
+            return Response({
+                'success': False,
+                'message': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
         
         log_api_request(f"Posts list retrieved", request, {
             'category': category_name,
             'username': username,
             'has_search': bool(search_json),
+            'has_attr_filter': bool(attr_filter_json),
             'page': page,
             'per_page': per_page,
-            'total_posts': paginator.count
+            'total_posts': pagination.get('total_count')
         })
         
-        serializer = PostSerializer(posts_page, many=True, context={'request': request})
+        viewer = ViewerContext.for_posts(request, posts_page)
+        posts_data = serialize_posts(posts_page, {'request': request, 'viewer': viewer})
         
         return Response({
             'success': True,
-            'posts': serializer.data,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total_pages': paginator.num_pages,
-                'total_count': paginator.count,
-                'has_next': posts_page.has_next(),
-                'has_previous': posts_page.has_previous(),
-            }
+            'posts': posts_data,
+            'pagination': pagination
         }, status=status.HTTP_200_OK)
     
     # POST - Create new post
+    staged_media = []
+    linked = False
     try:
+        try:
+            media_ids = parse_media_ids(request.data)
+        except ValueError:
+            return Response({
+                'success': False,
+                'message': 'media_ids must be a list of media IDs'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # فایل‌های multipart قبل از تراکنش در storage نوشته می‌شوند تا تراکنش
+        # ساخت پست فقط شناسه‌ی رسانه‌های آماده را به آن وصل کند
+        for f in request.FILES.getlist('media'):
+            mtype = media_type_for(f.content_type or mimetypes.guess_type(f.name)[0] or '')
+
+            if f.size > MAX_MEDIA_FILE_SIZE:
+                log_warning(f"Media file too large: {f.size} bytes, skipping", request, {
+                    'file_name': f.name,
+                    'max_allowed': MAX_MEDIA_FILE_SIZE
+                })
+                continue
+
+            staged_media.append(PostMedia.objects.create(uploaded_by=request.user, file=f, media_type=mtype))
+
         with transaction.atomic():
             mentions_raw = request.data.get('mentions', '').strip()
             parent_id = request.data.get('parent')
             category_name = request.data.get('category', '').strip()
             attributes = request.data.get('attributes', {})
 
-            if not request.FILES and not attributes:
+            if not request.FILES and not media_ids and not attributes:
                 log_warning("Post creation attempt without media or attributes", request)
                 return Response({
                     'success': False,
                     'message': 'Post media or attributes required'
                 }, status=status.HTTP_400_BAD_REQUEST)
 
+            if media_ids and PostMedia.objects.filter(
+                id__in=media_ids, uploaded_by=request.user, post__isnull=True
+            ).count() != len(media_ids):
+                log_warning("Post creation with unavailable media_ids", request, {'media_ids': media_ids})
+                return Response({
+                    'success': False,
+                    'message': 'Some media_ids are invalid or already attached to a post'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
             parent = None
             if parent_id:
                 parent = Post.objects.filter(id=parent_id).first()
@@ -421,66 +413,54 @@ def posts_list_create(request):
                 category=category,
                 attributes=attributes
             )
+            index_post_attributes(post)
+
+            if parent:
+                adjust_counters(parent.id, replies_count=1)
 
+            notifications = NotificationBatch(request.user)
             if mentions_raw:
                 usernames = [u.strip() for u in mentions_raw.split(',') if u.strip()]
-                mentioned_users = User.objects.filter(username__in=usernames)
+                mentioned_users = list(User.objects.filter(username__in=usernames))
+                post.mentions.add(*mentioned_users)
                 for mu in mentioned_users:
-                    post.mentions.add(mu)
-                    if mu != request.user:
-                        Notification.objects.create(
-                            recipient=mu,
-                            sender=request.user,
-                            notif_type='mention',
-                            post=post,
-                            message=f'{request.user.username} mentioned you in a post'
-                        )
+                    notifications.add(mu, 'mention', post=post,
+                                      message=f'{request.user.username} mentioned you in a post')
                 log_info(f"Post mentions added: {len(mentioned_users)} users", request, {
                     'mentioned_users': usernames
                 })
 
-            media_files = []
-            for f in request.FILES.getlist('media'):
-                ctype = f.content_type or mimetypes.guess_type(f.name)[0] or ''
-                if ctype.startswith('image/'):
-                    mtype = 'image'
-                elif ctype.startswith('video/'):
-                    mtype = 'video'
-                elif ctype.startswith('audio/'):
-                    mtype = 'audio'
-                else:
-                    mtype = 'file'
-                
-                if f.size > MAX_MEDIA_FILE_SIZE:
-                    log_warning(f"Media file too large: {f.size} bytes, skipping", request, {
-                        'filename': f.name,
-                        'max_allowed': MAX_MEDIA_FILE_SIZE
-                    })
-                    continue
-                    
-                PostMedia.objects.create(post=post, file=f, media_type=mtype)
-                media_files.append({
-                    'filename': f.name,
-                    'size': f.size,
-                    'type': mtype
-                })
+            all_media_ids = media_ids + [media.id for media in staged_media]
+            if link_media(post, all_media_ids, request.user) != len(all_media_ids):
+                transaction.set_rollback(True)
+                log_warning("Media was attached elsewhere during post creation", request)
+                return Response({
+                    'success': False,
+                    'message': 'Some media_ids are invalid or already attached to a post'
+                }, status=status.HTTP_409_CONFLICT)
 
-            log_audit(f"Post created successfully", request, {
-                'post_id': post.id,
-                'category': category_name,
-                'has_media': len(media_files) > 0,
-                'media_count': len(media_files),
-                'has_parent': parent is not None,
-                'parent_id': parent.id if parent else None,
-                'has_attributes': bool(attributes),
-                'is_anonymous_category': category.anonymous if category else False
-            })
+            # همه‌ی نوتیفیکیشن‌های منشن با یک INSERT
+            notifications.send()
 
-            serializer = PostSerializer(post, context={'request': request})
-            return Response({
-                'success': True,
-                'post': serializer.data
-            }, status=status.HTTP_201_CREATED)
+        linked = True
+
+        log_audit(f"Post created successfully", request, {
+            'post_id': post.id,
+            'category': category_name,
+            'has_media': bool(all_media_ids),
+            'media_count': len(all_media_ids),
+            'uploaded_media_count': len(media_ids),
+            'has_parent': parent is not None,
+            'parent_id': parent.id if parent else None,
+            'has_attributes': bool(attributes),
+            'is_anonymous_category': category.anonymous if category else False
+        })
+
+        serializer = PostSerializer(post, context={'request': request})
+        return Response({
+            'success': True,
+            'post': serializer.data
+        }, status=status.HTTP_201_CREATED)
 
     except Exception as e:
         log_error(f"Post creation failed: {str(e)}", request, {
@@ -491,6 +471,11 @@ def posts_list_create(request):
             'success': False,
             'message': 'Failed to create post'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    finally:
+        # پست ساخته نشد؛ فایل‌های ذخیره‌شده‌ی همین درخواست یتیم نمانند
+        if not linked:
+            for media in staged_media:
+                media.delete()
 
 
 @api_view(['GET'])
@@ -499,8 +484,7 @@ def post_detail(request, post_id):
     """Get single post details with comments and replies"""
     try:
         post = get_object_or_404(
-            Post.objects.select_related('author', 'category')
-            .prefetch_related('media', 'mentions', 'reactions', 'saved_by'),
+            Post.objects.select_related('author', 'category').prefetch_related('media', 'mentions'),
             id=post_id
         )
         
@@ -513,21 +497,24 @@ def post_detail(request, post_id):
             'is_anonymous_category': post.category.anonymous if post.category else False
         })
         
-        post_serializer = PostSerializer(post, context={'request': request})
-        data = post_serializer.data
+        comments = Comment.objects.filter(post=post).select_related('user').prefetch_related('likes').order_by('created_at')
+        replies = Post.objects.filter(parent=post).select_related('author', 'category').prefetch_related(
+            'media', 'mentions'
+        ).order_by('created_at')
+        
+        # وضعیت بیننده برای پست، پاسخ‌ها و نویسندگان کامنت‌ها یک‌جا بارگذاری می‌شود
+        viewer = ViewerContext.for_posts(request, [post], replies, users=[c.user for c in comments])
+        context = {'request': request, 'viewer': viewer}
+        
+        data = serialize_post(post, context)
         
         # برای کتگوری‌های ناشناس، اطلاعات author و mentions باید مخفی باشند
         # که این کار در سریالایزر انجام شده است
         
-        comments = Comment.objects.filter(post=post).select_related('user').prefetch_related('likes').order_by('created_at')
-        comment_serializer = CommentSerializer(comments, many=True, context={'request': request})
+        comment_serializer = CommentSerializer(comments, many=True, context=context)
         data['comments'] = comment_serializer.data
         
-        replies = Post.objects.filter(parent=post).select_related('author', 'category').prefetch_related(
-            'media', 'mentions', 'reactions'
-        ).order_by('created_at')
-        reply_serializer = PostSerializer(replies, many=True, context={'request': request})
-        data['replies'] = reply_serializer.data
+        data['replies'] = serialize_posts(replies, context)
         
         return Response({
             'success': True,
@@ -573,6 +560,11 @@ def delete_post(request, post_id):
             has_media = post.media.exists()
             is_anonymous = post.category.anonymous if post.category else False
             
+            if post.is_repost and post.original_post_id:
+                adjust_counters(post.original_post_id, reposts_count=-1)
+            if post.parent_id:
+                adjust_counters(post.parent_id, replies_count=-1)
+            
             post.delete()
             
             log_audit(f"Post deleted", request, {
@@ -653,6 +645,10 @@ def update_post(request, post_id):
                 old_category = post.category.name if post.category else None
                 
                 serializer.save()
+                index_post_attributes(post)
+                if old_category and old_category != (post.category.name if post.category else None):
+                    # سیگنال ذخیره فقط کتگوری جدید را بی‌اعتبار می‌کند
+                    bump_count_scopes(('category', old_category))
                 
                 changes = {}
                 if category_name and category_name != old_category:
@@ -735,19 +731,16 @@ def post_repost(request, post_id):
                 category=original_post.category,
                 attributes=original_post.attributes
             )
+            index_post_attributes(new_post)
+            adjust_counters(original_post.id, reposts_count=1)
             
             for mu in original_post.mentions.all():
                 new_post.mentions.add(mu)
             
             # فقط اگر پست اصلی در کتگوری معمولی باشد، نوتیفیکیشن ایجاد کن
             if not (original_post.category and original_post.category.anonymous):
-                Notification.objects.create(
-                    recipient=original_post.author,
-                    sender=request.user,
-                    notif_type='repost',
-                    post=original_post,
-                    message=f'{request.user.username} reposted your post'
-                )
+                notify(request.user, original_post.author, 'repost', post=original_post,
+                       message=f'{request.user.username} reposted your post')
             
             log_audit(f"Post reposted", request, {
                 'original_post_id': post_id,
@@ -775,14 +768,14 @@ def post_repost(request, post_id):
 @permission_classes([AllowAny])
 def posts_by_category(request, category_id):
     """Get posts by category/room with pagination"""
-    page = int(request.GET.get('page', 1))
+    page = request.GET.get('page', 1)
     per_page = min(int(request.GET.get('per_page', 20)), 100)
     
     posts = Post.objects.filter(
         category__name=category_id,
         parent=None
     ).select_related('author', 'category').prefetch_related(
-        'media', 'mentions', 'reactions'
+        'media', 'mentions'
     ).order_by('-created_at')
     
     # ✅ اصلاح شده: حذف فیلتر کردن پست‌های کتگوری ناشناس
@@ -790,33 +783,30 @@ def posts_by_category(request, category_id):
     # if request.user.is_authenticated:
     #     posts = posts.exclude(category__anonymous=True)
     
-    paginator = Paginator(posts, per_page)
     try:
-        posts_page = paginator.page(page)
-    except:
-        posts_page = paginator.page(1)
+        posts_page, pagination = paginate(request, posts, page, per_page, count_scopes=[('category', category_id)])
+    except InvalidPagination as e:
+        log_warning(f"Invalid pagination: {str(e)}", request)
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
     
     log_api_request(f"Posts by category viewed", request, {
         'category': category_id,
         'page': page,
         'per_page': per_page,
-        'total_posts': paginator.count
+        'total_posts': pagination.get('total_count')
     })
     
-    serializer = PostSerializer(posts_page, many=True, context={'request': request})
+    viewer = ViewerContext.for_posts(request, posts_page)
+    posts_data = serialize_posts(posts_page, {'request': request, 'viewer': viewer})
     
     return Response({
         'success': True,
-        'posts': serializer.data,
+        'posts': posts_data,
         'category': category_id,
-        'pagination': {
-            'page': page,
-            'per_page': per_page,
-            'total_pages': paginator.num_pages,
-            'total_count': paginator.count,
-            'has_next': posts_page.has_next(),
-            'has_previous': posts_page.has_previous(),
-        }
+        'pagination': pagination
     }, status=status.HTTP_200_OK)
 
 
@@ -826,47 +816,44 @@ def user_posts(request, username):
     """Get posts by specific user with pagination"""
     user = get_object_or_404(User, username=username)
     
-    page = int(request.GET.get('page', 1))
+    page = request.GET.get('page', 1)
     per_page = min(int(request.GET.get('per_page', 20)), 100)
     
     posts = Post.objects.filter(
         author=user,
         parent=None
     ).select_related('author', 'category').prefetch_related(
-        'media', 'mentions', 'reactions'
+        'media', 'mentions'
     ).order_by('-created_at')
     
     posts = posts.exclude(category__anonymous=True)
     
-    paginator = Paginator(posts, per_page)
     try:
-        posts_page = paginator.page(page)
-    except:
-        posts_page = paginator.page(1)
+        posts_page, pagination = paginate(request, posts, page, per_page, count_scopes=[('user', user.id)])
+    except InvalidPagination as e:
+        log_warning(f"Invalid pagination: {str(e)}", request)
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
     
     log_api_request(f"User posts viewed", request, {
         'target_user': username,
         'page': page,
         'per_page': per_page,
-        'total_posts': paginator.count
+        'total_posts': pagination.get('total_count')
     })
     
-    user_serializer = UserSerializer(user, context={'request': request})
-    posts_serializer = PostSerializer(posts_page, many=True, context={'request': request})
+    viewer = ViewerContext.for_posts(request, posts_page, users=[user])
+    context = {'request': request, 'viewer': viewer}
+    user_serializer = UserSerializer(user, context=context)
     
     return Response({
         'success': True,
-        'posts': posts_serializer.data,
+        'posts': serialize_posts(posts_page, context),
         'username': username,
         'user': user_serializer.data,
-        'pagination': {
-            'page': page,
-            'per_page': per_page,
-            'total_pages': paginator.num_pages,
-            'total_count': paginator.count,
-            'has_next': posts_page.has_next(),
-            'has_previous': posts_page.has_previous(),
-        }
+        'pagination': pagination
     }, status=status.HTTP_200_OK)
 
 
@@ -897,14 +884,15 @@ def post_thread(request, post_id):
             'is_anonymous_category': post.category.anonymous if post.category else False
         })
         
-        post_serializer = PostSerializer(post, context={'request': request})
-        data = post_serializer.data
-        
         replies = post.replies.select_related('author', 'category').prefetch_related(
-            'media', 'mentions', 'reactions'
+            'media', 'mentions'
         ).order_by('created_at')
-        replies_serializer = PostSerializer(replies, many=True, context={'request': request})
-        data['replies'] = replies_serializer.data
+        
+        viewer = ViewerContext.for_posts(request, [post], replies)
+        context = {'request': request, 'viewer': viewer}
+        
+        data = serialize_post(post, context)
+        data['replies'] = serialize_posts(replies, context)
         
         return Response({
             'success': True,
@@ -1016,45 +1004,204 @@ def unsave_post(request, post_id):
 @permission_classes([IsAuthenticated])
 def saved_posts(request):
     """Get user's saved posts with pagination"""
-    page = int(request.GET.get('page', 1))
+    page = request.GET.get('page', 1)
     per_page = min(int(request.GET.get('per_page', 20)), 100)
     
     saved_posts = request.user.saved_posts.filter(parent=None).select_related('author', 'category').prefetch_related(
-        'media', 'mentions', 'reactions'
+        'media', 'mentions'
     ).order_by('-created_at')
     
     # ✅ اصلاح شده: حذف فیلتر کردن پست‌های کتگوری ناشناس
     # کاربر می‌تواند پست‌های ذخیره شده در کتگوری ناشناس را هم ببیند
     # saved_posts = saved_posts.exclude(category__anonymous=True)
     
-    paginator = Paginator(saved_posts, per_page)
     try:
-        saved_posts_page = paginator.page(page)
-    except:
-        saved_posts_page = paginator.page(1)
+        saved_posts_page, pagination = paginate(request, saved_posts, page, per_page, count_scopes=[('saved', request.user.id)])
+    except InvalidPagination as e:
+        log_warning(f"Invalid pagination: {str(e)}", request)
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
     
     log_info(f"Saved posts viewed", request, {
         'page': page,
         'per_page': per_page,
-        'total_saved': paginator.count
+        'total_saved': pagination.get('total_count')
     })
     
-    serializer = PostSerializer(saved_posts_page, many=True, context={'request': request})
+    viewer = ViewerContext.for_posts(request, saved_posts_page)
+    posts_data = serialize_posts(saved_posts_page, {'request': request, 'viewer': viewer})
     
     return Response({
         'success': True,
-        'posts': serializer.data,
-        'pagination': {
-            'page': page,
-            'per_page': per_page,
-            'total_pages': paginator.num_pages,
-            'total_count': paginator.count,
-            'has_next': saved_posts_page.has_next(),
-            'has_previous': saved_posts_page.has_previous(),
-        }
+        'posts': posts_data,
+        'pagination': pagination
     }, status=status.HTTP_200_OK)
 
 
+# ════════════════════════════════════════════════════════════
+# 📤 Chunked Media Upload Endpoints
+# ════════════════════════════════════════════════════════════
+
+def _upload_state(upload):
+    return {
+        'upload_id': str(upload.id),
+        'filename': upload.filename,
+        'size': upload.size,
+        'offset': upload.received,
+        'status': upload.status,
+        'chunk_size': settings.MEDIA_UPLOAD_CHUNK_SIZE,
+    }
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def media_upload_start(request):
+    """Start a resumable media upload; chunks are then sent with PUT"""
+    try:
+        filename = str(request.data.get('filename', '')).strip()
+        content_type = str(request.data.get('content_type', '')).strip()
+
+        try:
+            size = int(request.data.get('size'))
+        except (TypeError, ValueError):
+            size = -1
+
+        if not filename or size <= 0:
+            log_warning("Media upload started without filename or size", request)
+            return Response({
+                'success': False,
+                'message': 'filename and a positive size are required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if size > MAX_MEDIA_FILE_SIZE:
+            # 'filename' یکی از فیلدهای LogRecord است و نباید در extra بیاید
+            log_warning(f"Media upload too large: {size} bytes", request, {
+                'file_name': filename,
+                'max_allowed': MAX_MEDIA_FILE_SIZE
+            })
+            return Response({
+                'success': False,
+                'message': f'File too large. Maximum size is {MAX_MEDIA_FILE_SIZE} bytes'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        upload = start_upload(request.user, filename, size, content_type)
+
+        log_info(f"Media upload started", request, {
+            'upload_id': str(upload.id),
+            'size': size,
+            'content_type': upload.content_type
+        })
+
+        return Response({
+            'success': True,
+            'upload': _upload_state(upload)
+        }, status=status.HTTP_201_CREATED)
+
+    except Exception as e:
+        log_error(f"Media upload start failed: {str(e)}", request)
+        return Response({
+            'success': False,
+            'message': 'Failed to start upload'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET', 'PUT'])
+@permission_classes([IsAuthenticated])
+def media_upload_chunk(request, upload_id):
+    """
+    GET: وضعیت آپلود و offset فعلی برای ادامه
+    PUT: ارسال یک تکه؛ بدنه‌ی خام درخواست با هدر Upload-Offset
+    """
+    upload = get_object_or_404(MediaUpload, id=upload_id, user=request.user)
+
+    if request.method == 'GET':
+        return Response({
+            'success': True,
+            'upload': _upload_state(upload)
+        })
+
+    try:
+        try:
+            offset = int(request.META.get('HTTP_UPLOAD_OFFSET', ''))
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return Response({
+                'success': False,
+                'message': 'Upload-Offset header is required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # بدنه مستقیم از stream خوانده می‌شود و هرگز کامل در حافظه نمی‌ماند
+        stream = request.stream or io.BytesIO()
+        try:
+            written = write_chunk(upload, stream, offset, length)
+        except UploadOffsetMismatch as e:
+            return Response({
+                'success': False,
+                'message': str(e),
+                'upload': _upload_state(upload)
+            }, status=status.HTTP_409_CONFLICT)
+        except UploadError as e:
+            log_warning(f"Rejected upload chunk: {str(e)}", request, {'upload_id': str(upload.id)})
+            return Response({
+                'success': False,
+                'message': str(e),
+                'upload': _upload_state(upload)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'success': True,
+            'written': written,
+            'upload': _upload_state(upload)
+        })
+
+    except Exception as e:
+        log_error(f"Upload chunk failed: {str(e)}", request, {'upload_id': str(upload_id)})
+        return Response({
+            'success': False,
+            'message': 'Failed to store chunk'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def media_upload_complete(request, upload_id):
+    """Finalize a fully received upload into media that can be passed as media_ids"""
+    upload = get_object_or_404(MediaUpload, id=upload_id, user=request.user)
+
+    try:
+        try:
+            media = complete_upload(upload)
+        except UploadError as e:
+            return Response({
+                'success': False,
+                'message': str(e),
+                'upload': _upload_state(upload)
+            }, status=status.HTTP_409_CONFLICT)
+
+        log_audit(f"Media upload completed", request, {
+            'upload_id': str(upload.id),
+            'media_id': media.id,
+            'size': media.size,
+            'sha256': upload.sha256
+        })
+
+        return Response({
+            'success': True,
+            'upload': _upload_state(upload),
+            'sha256': upload.sha256,
+            'media': PostMediaSerializer(media, context={'request': request}).data
+        })
+
+    except Exception as e:
+        log_error(f"Media upload completion failed: {str(e)}", request, {'upload_id': str(upload_id)})
+        return Response({
+            'success': False,
+            'message': 'Failed to complete upload'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 # ════════════════════════════════════════════════════════════
 # 📁 Category Format Endpoints
 # ════════════════════════════════════════════════════════════
@@ -1106,6 +1253,15 @@ def upload_category_format(request):
                 'message': 'Invalid JSON file'
             }, status=status.HTTP_400_BAD_REQUEST)
 
+        try:
+            CompiledFormat(category, format_data, None)
+        except (re.error, TypeError, AttributeError) as e:
+            log_warning(f"Invalid pattern in format file: {str(e)}", request)
+            return Response({
+                'success': False,
+                'message': 'Format file must be a JSON object of valid regex patterns'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
         format_obj, created = CategoryFormat.objects.update_or_create(
             category=category,
             defaults={
@@ -1113,6 +1269,7 @@ def upload_category_format(request):
                 'created_by': request.user
             }
         )
+        format_registry.invalidate(category)
 
         log_audit(f"Category format uploaded/updated", request, {
             'category': category,
@@ -1162,6 +1319,7 @@ def delete_category_format(request, cat):
             }, status=status.HTTP_404_NOT_FOUND)
 
         format_obj.delete()
+        format_registry.invalidate(cat)
         
         log_audit(f"Category format deleted", request, {'category': cat})
         
@@ -1183,18 +1341,8 @@ def delete_category_format(request, cat):
 def get_format(request, cat):
     """Get format file for a category (for all users)"""
     try:
-        format_obj = CategoryFormat.objects.filter(category=cat).first()
-        
-        if not format_obj or not format_obj.format_file:
-            log_warning(f"Format requested for non-existent category", request, {'category': cat})
-            return Response({
-                'success': False,
-                'message': f'No format found for category: {cat}'
-            }, status=status.HTTP_404_NOT_FOUND)
-
         try:
-            with open(format_obj.format_file.path, 'r', encoding='utf-8') as f:
-                format_data = json.load(f)
+            category_format = format_registry.get(cat)
         except Exception as e:
             log_error(f"Error reading format file: {str(e)}", request, {'category': cat})
             return Response({
@@ -1202,13 +1350,23 @@ def get_format(request, cat):
                 'message': 'Error reading format file'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+        if not category_format:
+            log_warning(f"Format requested for non-existent category", request, {'category': cat})
+            return Response({
+                'success': False,
+                'message': f'No format found for category: {cat}'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        format_data = category_format.data
+        last_updated = category_format.stamp[1]
+
         category_obj = Category.objects.filter(name=cat).first()
         is_anonymous = category_obj.anonymous if category_obj else False
 
         log_info(f"Format file retrieved", request, {
             'category': cat,
             'keys_count': len(format_data.keys()) if format_data else 0,
-            'last_updated': format_obj.updated_at,
+            'last_updated': last_updated,
             'is_anonymous': is_anonymous
         })
 
@@ -1216,7 +1374,7 @@ def get_format(request, cat):
             'success': True,
             'category': cat,
             'format': format_data,
-            'last_updated': format_obj.updated_at,
+            'last_updated': last_updated,
             'is_anonymous': is_anonymous
         }, status=status.HTTP_200_OK)
 
@@ -1231,11 +1389,8 @@ def get_format(request, cat):
 def get_format_data(cat):
     """Helper function to get format data from anywhere in the app"""
     try:
-        format_obj = CategoryFormat.objects.filter(category=cat).first()
-        if format_obj and format_obj.format_file:
-            with open(format_obj.format_file.path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return None
+        category_format = format_registry.get(cat)
+        return category_format.data if category_format else None
     except Exception as e:
         log_error(f"Error in get_format_data for {cat}: {str(e)}")
         return None
\ No newline at end of file
@@ -4,15 +4,46 @@ Django settings for elmosyar_back project.
 Optimized for Pure REST API - Allow all origins
 """
 
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 from pathlib import Path
-from decouple import config
+from decouple import config, Csv
+from django.core.exceptions import ImproperlyConfigured
 from datetime import timedelta
 
 # Build paths
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-LOG_DIR = os.path.join(BASE_DIR, 'logs')
+LOG_DIR = config('LOG_DIR', default=os.path.join(BASE_DIR, 'logs'))
+# تست‌ها لاگ‌ها و ایندکس‌ها را در پوشه‌ی موقت می‌نویسند تا درخت مخزن تمیز بماند
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+if TESTING:
+    LOG_DIR = tempfile.mkdtemp(prefix='elmosyar-test-logs-')
+    atexit.register(shutil.rmtree, LOG_DIR, True)
+
+# LOG_FORMAT: text (سطرهای ایموجی‌دار) | json (یک رکورد JSON در هر سطر، با کانتکست کامل)
+LOG_FORMATS = ('text', 'json')
+LOG_FORMAT = config('LOG_FORMAT', default='text')
+if LOG_FORMAT not in LOG_FORMATS:
+    raise ImproperlyConfigured(f"LOG_FORMAT must be one of: {', '.join(LOG_FORMATS)}")
+
+# نوشتن لاگ در پس‌زمینه: درخواست‌ها رکورد را در صف می‌گذارند و یک thread آن‌ها را دسته‌ای می‌نویسد
+# LOG_QUEUE_POLICY وقتی صف پر است: drop (دور انداختن فوری) | block (صبر تا LOG_QUEUE_BLOCK_TIMEOUT ثانیه)
+LOG_QUEUE_ENABLED = config('LOG_QUEUE_ENABLED', default=False, cast=bool)
+LOG_QUEUE_SIZE = config('LOG_QUEUE_SIZE', default=10000, cast=int)
+LOG_QUEUE_BATCH_SIZE = config('LOG_QUEUE_BATCH_SIZE', default=500, cast=int)
+LOG_QUEUE_POLICIES = ('drop', 'block')
+LOG_QUEUE_POLICY = config('LOG_QUEUE_POLICY', default='drop')
+if LOG_QUEUE_POLICY not in LOG_QUEUE_POLICIES:
+    raise ImproperlyConfigured(f"LOG_QUEUE_POLICY must be one of: {', '.join(LOG_QUEUE_POLICIES)}")
+LOG_QUEUE_BLOCK_TIMEOUT = config('LOG_QUEUE_BLOCK_TIMEOUT', default=0.5, cast=float)
+
+# حداکثر بایت‌های جدیدی که صفحه‌ی آمار لاگ در هر بار باز شدن به rollupها اضافه می‌کند؛
+# با 0 فقط دستور aggregate_log_stats آن‌ها را به‌روز می‌کند
+LOG_STATS_REFRESH_BYTES = config('LOG_STATS_REFRESH_BYTES', default=1024 * 1024, cast=int)
 
 LOGGING = {
     'version': 1,
@@ -81,6 +112,7 @@ if 'CODESPACE_NAME' in os.environ:
 # Apps
 INSTALLED_APPS = [
     # Local apps
+    "core",
     "accounts",
     "social",
     "posts",
@@ -204,6 +236,87 @@ SIMPLE_JWT = {
     'UPDATE_LAST_LOGIN': True,
 }
 
+# Cache
+# CACHE_BACKEND: locmem (جدا برای هر پروسس) | file | redis
+# برای اشتراک کش بین workerهای gunicorn از file یا redis استفاده کنید؛
+# redis به پکیج redis نیاز دارد. با REDIS_URL پیش‌فرض redis است و در حالت
+# غیر DEBUG، locmem هشدار core.W001 را در system checkها می‌دهد.
+REDIS_URL = config('REDIS_URL', default='')
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'elmosyar'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', os.path.join(BASE_DIR, 'cache')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', REDIS_URL or 'redis://127.0.0.1:6379/1'),
+}
+CACHE_BACKEND = config('CACHE_BACKEND', default='redis' if REDIS_URL else 'locmem')
+if CACHE_BACKEND not in CACHE_BACKENDS:
+    raise ImproperlyConfigured(f"CACHE_BACKEND must be one of: {', '.join(CACHE_BACKENDS)}")
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': config('CACHE_LOCATION', default=CACHE_BACKENDS[CACHE_BACKEND][1]),
+        'KEY_PREFIX': config('CACHE_KEY_PREFIX', default='elmosyar'),
+        'TIMEOUT': config('CACHE_TIMEOUT', default=300, cast=int),
+    }
+}
+
+# Cached pagination counts (seconds)
+COUNT_CACHE_TIMEOUT = config('COUNT_CACHE_TIMEOUT', default=60, cast=int)
+COUNT_ESTIMATE_TIMEOUT = config('COUNT_ESTIMATE_TIMEOUT', default=900, cast=int)
+
+# Cached post representations (seconds)
+# invalidation فقط کش همان پروسس را bump می‌کند، پس با locmem پیش‌فرض خاموش است
+POST_FRAGMENT_CACHE = config('POST_FRAGMENT_CACHE', default=CACHE_BACKEND != 'locmem', cast=bool)
+POST_FRAGMENT_TIMEOUT = config('POST_FRAGMENT_TIMEOUT', default=300, cast=int)
+
+# File delivery
+# FILE_DELIVERY_BACKEND: django (استریم از خود Django) | nginx (X-Accel-Redirect) | sendfile (X-Sendfile)
+# برای nginx باید location‌های internal با همین پیشوندها به MEDIA_ROOT و LOG_DIR اشاره کنند.
+FILE_DELIVERY_BACKENDS = ('django', 'nginx', 'sendfile')
+FILE_DELIVERY_BACKEND = config('FILE_DELIVERY_BACKEND', default='django')
+if FILE_DELIVERY_BACKEND not in FILE_DELIVERY_BACKENDS:
+    raise ImproperlyConfigured(f"FILE_DELIVERY_BACKEND must be one of: {', '.join(FILE_DELIVERY_BACKENDS)}")
+MEDIA_ACCEL_PREFIX = config('MEDIA_ACCEL_PREFIX', default='/protected/media/')
+LOG_ACCEL_PREFIX = config('LOG_ACCEL_PREFIX', default='/protected/logs/')
+
+# Chunked media uploads
+MEDIA_UPLOAD_TEMP_DIR = config('MEDIA_UPLOAD_TEMP_DIR', default=os.path.join(BASE_DIR, 'tmp', 'uploads'))
+MEDIA_UPLOAD_CHUNK_SIZE = config('MEDIA_UPLOAD_CHUNK_SIZE', default=1024 * 1024, cast=int)
+MEDIA_UPLOAD_EXPIRY_HOURS = config('MEDIA_UPLOAD_EXPIRY_HOURS', default=24, cast=int)
+
+# Image derivatives (thumbnails and WebP srcset variants)
+# IMAGE_DERIVATIVE_WORKERS=0 ساخت را داخل همان درخواست انجام می‌دهد
+IMAGE_DERIVATIVE_WORKERS = config('IMAGE_DERIVATIVE_WORKERS', default=2, cast=int)
+IMAGE_DERIVATIVE_QUEUE_SIZE = config('IMAGE_DERIVATIVE_QUEUE_SIZE', default=64, cast=int)
+IMAGE_THUMBNAIL_SIZE = config('IMAGE_THUMBNAIL_SIZE', default=200, cast=int)
+IMAGE_VARIANT_WIDTHS = config('IMAGE_VARIANT_WIDTHS', default='320,640,1280', cast=Csv(int))
+IMAGE_VARIANT_QUALITY = config('IMAGE_VARIANT_QUALITY', default=80, cast=int)
+
+# Notification dispatch
+# NOTIFICATION_DELIVERY: immediate (داخل همان تراکنش) | on_commit (بعد از commit شدن تراکنش درخواست)
+NOTIFICATION_DELIVERY_MODES = ('immediate', 'on_commit')
+NOTIFICATION_DELIVERY = config('NOTIFICATION_DELIVERY', default='immediate')
+if NOTIFICATION_DELIVERY not in NOTIFICATION_DELIVERY_MODES:
+    raise ImproperlyConfigured(f"NOTIFICATION_DELIVERY must be one of: {', '.join(NOTIFICATION_DELIVERY_MODES)}")
+# نوتیفیکیشن‌های هم‌نوع روی یک هدف (پست/کامنت) در این پنجره (ثانیه) در یک ردیف جمع می‌شوند؛ 0 یعنی خاموش
+NOTIFICATION_COALESCE_WINDOW = config('NOTIFICATION_COALESCE_WINDOW', default=3600, cast=int)
+NOTIFICATION_COALESCE_TYPES = config('NOTIFICATION_COALESCE_TYPES', default='like,like_comment,dislike_comment,repost', cast=Csv())
+# انواع کم‌اهمیت که به جای ارسال فوری در خلاصه‌ی دوره‌ای (send_notification_digests) می‌آیند
+NOTIFICATION_DIGEST_TYPES = config('NOTIFICATION_DIGEST_TYPES', default='', cast=Csv())
+
+# Push (Server-Sent Events روی /api/stream/، فقط با سرور ASGI)
+# PUSH_BROKER: inprocess (فقط همین پروسس) | redis (مشترک بین workerها، به پکیج redis نیاز دارد)
+PUSH_ENABLED = config('PUSH_ENABLED', default=True, cast=bool)
+PUSH_BROKERS = ('inprocess', 'redis')
+PUSH_BROKER = config('PUSH_BROKER', default='inprocess')
+if PUSH_BROKER not in PUSH_BROKERS:
+    raise ImproperlyConfigured(f"PUSH_BROKER must be one of: {', '.join(PUSH_BROKERS)}")
+PUSH_BROKER_URL = config('PUSH_BROKER_URL', default='redis://127.0.0.1:6379/2')
+# رویدادهای صف هر اتصال؛ بعد از پر شدن به کلاینت resync فرستاده می‌شود
+PUSH_QUEUE_SIZE = config('PUSH_QUEUE_SIZE', default=100, cast=int)
+PUSH_HEARTBEAT = config('PUSH_HEARTBEAT', default=15, cast=int)
+PUSH_RETRY_MS = config('PUSH_RETRY_MS', default=3000, cast=int)
+
 # Session settings for cross-origin
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_SAMESITE = 'Lax'
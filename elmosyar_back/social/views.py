@@ -4,14 +4,15 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework import status
 from django.shortcuts import get_object_or_404
 from django.db import transaction
-from django.db.models import F
-from django.core.paginator import Paginator
+from django.contrib.auth import get_user_model
+from core.pagination import paginate, InvalidPagination
 
 from accounts.serializers import UserSerializer
 from .models import UserFollow
-from notifications.models import Notification
+from notifications.dispatch import notify
 
-import settings
+
+User = get_user_model()
 
 # جایگزین کردن لاگر قدیمی
 from log_manager.log_config import log_info, log_error, log_warning, log_audit
@@ -26,7 +27,7 @@ def follow_user(request, username):
     """Follow a user"""
     try:
         with transaction.atomic():
-            user_to_follow = get_object_or_404(settings.AUTH_USER_MODEL, username=username)
+            user_to_follow = get_object_or_404(User, username=username)
             
             if user_to_follow == request.user:
                 log_warning(f"User attempted to follow themselves", request)
@@ -45,24 +46,9 @@ def follow_user(request, username):
             # Create follow relationship
             UserFollow.objects.create(follower=request.user, following=user_to_follow)
             
-            # Update counts using F() to prevent race condition
-            settings.AUTH_USER_MODEL.objects.filter(id=request.user.id).update(
-                following_count=F('following_count') + 1
-            )
-            settings.AUTH_USER_MODEL.objects.filter(id=user_to_follow.id).update(
-                followers_count=F('followers_count') + 1
-            )
-            
             # Create notification
-            Notification.objects.create(
-                recipient=user_to_follow,
-                sender=request.user,
-                notif_type='follow',
-                message=f'{request.user.username} started following you'
-            )
-            
-            # Refresh user to get updated counts
-            user_to_follow.refresh_from_db()
+            notify(request.user, user_to_follow, 'follow',
+                   message=f'{request.user.username} started following you')
             
             log_audit(f"User followed {username}", request, {
                 'target_user_id': user_to_follow.id,
@@ -89,7 +75,7 @@ def unfollow_user(request, username):
     """Unfollow a user"""
     try:
         with transaction.atomic():
-            user_to_unfollow = get_object_or_404(settings.AUTH_USER_MODEL, username=username)
+            user_to_unfollow = get_object_or_404(User, username=username)
             
             follow_relation = UserFollow.objects.filter(
                 follower=request.user, 
@@ -105,17 +91,6 @@ def unfollow_user(request, username):
             
             follow_relation.delete()
             
-            # Update counts using F() to prevent race condition
-            settings.AUTH_USER_MODEL.objects.filter(id=request.user.id).update(
-                following_count=F('following_count') - 1
-            )
-            settings.AUTH_USER_MODEL.objects.filter(id=user_to_unfollow.id).update(
-                followers_count=F('followers_count') - 1
-            )
-            
-            # Refresh user to get updated counts
-            user_to_unfollow.refresh_from_db()
-            
             log_audit(f"User unfollowed {username}", request, {
                 'target_user_id': user_to_unfollow.id,
                 'new_followers_count': user_to_unfollow.followers_count
@@ -139,22 +114,24 @@ def unfollow_user(request, username):
 @permission_classes([AllowAny])
 def user_followers(request, username):
     """Get user's followers with pagination"""
-    user = get_object_or_404(settings.AUTH_USER_MODEL, username=username)
+    user = get_object_or_404(User, username=username)
     
-    page = int(request.GET.get('page', 1))
+    page = request.GET.get('page', 1)
     per_page = min(int(request.GET.get('per_page', 50)), 100)
     
-    followers = user.followers.select_related('follower')
-    paginator = Paginator(followers, per_page)
-    
+    followers = UserFollow.objects.filter(following=user).select_related('follower')
     try:
-        followers_page = paginator.page(page)
-    except:
-        followers_page = paginator.page(1)
+        followers_page, pagination = paginate(request, followers, page, per_page, count_scopes=[('followers', user.id)])
+    except InvalidPagination as e:
+        log_warning(f"Invalid pagination: {str(e)}", request)
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
     
     log_info(f"Followers list viewed for {username} page {page}", request, {
         'target_user': username,
-        'total_followers': paginator.count,
+        'total_followers': pagination.get('total_count'),
         'page': page
     })
     
@@ -165,14 +142,7 @@ def user_followers(request, username):
     return Response({
         'success': True,
         'followers': serializer.data,
-        'pagination': {
-            'page': page,
-            'per_page': per_page,
-            'total_pages': paginator.num_pages,
-            'total_count': paginator.count,
-            'has_next': followers_page.has_next(),
-            'has_previous': followers_page.has_previous(),
-        }
+        'pagination': pagination
     }, status=status.HTTP_200_OK)
 
 
@@ -180,22 +150,24 @@ def user_followers(request, username):
 @permission_classes([AllowAny])
 def user_following(request, username):
     """Get users that this user is following with pagination"""
-    user = get_object_or_404(settings.AUTH_USER_MODEL, username=username)
+    user = get_object_or_404(User, username=username)
     
-    page = int(request.GET.get('page', 1))
+    page = request.GET.get('page', 1)
     per_page = min(int(request.GET.get('per_page', 50)), 100)
     
-    following = user.following.select_related('following')
-    paginator = Paginator(following, per_page)
-    
+    following = UserFollow.objects.filter(follower=user).select_related('following')
     try:
-        following_page = paginator.page(page)
-    except:
-        following_page = paginator.page(1)
+        following_page, pagination = paginate(request, following, page, per_page, count_scopes=[('following', user.id)])
+    except InvalidPagination as e:
+        log_warning(f"Invalid pagination: {str(e)}", request)
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
     
     log_info(f"Following list viewed for {username} page {page}", request, {
         'target_user': username,
-        'total_following': paginator.count,
+        'total_following': pagination.get('total_count'),
         'page': page
     })
     
@@ -206,12 +178,5 @@ def user_following(request, username):
     return Response({
         'success': True,
         'following': serializer.data,
-        'pagination': {
-            'page': page,
-            'per_page': per_page,
-            'total_pages': paginator.num_pages,
-            'total_count': paginator.count,
-            'has_next': following_page.has_next(),
-            'has_previous': following_page.has_previous(),
-        }
+        'pagination': pagination
     }, status=status.HTTP_200_OK)
\ No newline at end of file
@@ -5,11 +5,13 @@ Pure REST API - No HTML rendering
 """
 
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.http import JsonResponse
 
+from core.views import serve_media
+
 def api_root(request):
     return JsonResponse({
         'message': 'Welcome to Elmosyar API',
@@ -30,8 +32,10 @@ urlpatterns = [
     path('api/wallet/', include('wallet.urls')),
     path('api/logs/', include('log_manager.urls')),
     path('api/planner/', include('planner.urls')),
+
+    # رسانه‌ها در همه‌ی حالت‌ها؛ با FILE_DELIVERY_BACKEND به nginx یا Apache سپرده می‌شوند
+    re_path(rf"^{settings.MEDIA_URL.lstrip('/')}(?P<path>.+)$", serve_media, name='serve_media'),
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)